@@ -78,46 +78,13 @@ Create materialized views for complex analytics queries.
 Useful for owner dashboard statistics.
 */
 
--- Owner statistics view
-CREATE MATERIALIZED VIEW IF NOT EXISTS owner_stats AS
-SELECT 
-  p.id as owner_id,
-  p.full_name as owner_name,
-  COUNT(DISTINCT pg.id) as total_listings,
-  SUM(pg.views) as total_views,
-  SUM(pg.inquiries) as total_inquiries,
-  AVG(pg.average_rating) as avg_rating,
-  COUNT(DISTINCT r.id) as total_reviews,
-  SUM(pg.available_beds) as total_available_beds,
-  SUM(pg.total_beds) as total_beds
-FROM profiles p
-LEFT JOIN pg_listings pg ON pg.owner_id = p.id
-LEFT JOIN reviews r ON r.pg_id = pg.id
-WHERE p.role = 'owner'
-GROUP BY p.id, p.full_name;
-
--- Create index for fast lookups
-CREATE UNIQUE INDEX IF NOT EXISTS idx_owner_stats_owner_id ON owner_stats(owner_id);
-
--- Refresh function (call periodically or on-demand)
-CREATE OR REPLACE FUNCTION refresh_owner_stats()
-RETURNS void AS $$
-BEGIN
-  REFRESH MATERIALIZED VIEW CONCURRENTLY owner_stats;
-END;
-$$ LANGUAGE plpgsql;
-
--- Grant access
-GRANT SELECT ON owner_stats TO authenticated;
-
-/*
-USAGE:
-  -- Get stats for specific owner
-  SELECT * FROM owner_stats WHERE owner_id = 'UUID';
-  
-  -- Refresh stats (run daily via cron or manually)
-  SELECT refresh_owner_stats();
-*/
+-- Owner statistics: superseded by backend/CREATE_OWNER_STATS.sql, which keeps
+-- an `owner_stats` table up to date incrementally with triggers (no periodic
+-- refresh) and drops the materialized view that used to be defined here.
+--
+-- USAGE:
+--   SELECT * FROM owner_stats WHERE owner_id = 'UUID';
+--   SELECT refresh_owner_stats();  -- full recompute, only for reconciliation
 
 -- ============================================
 -- 3️⃣ INTELLIGENT NOTIFICATION THROTTLING (OPTIONAL)
@@ -0,0 +1,107 @@
+-- ============================================
+-- LEARNED CHATBOT ANSWERS
+-- ============================================
+-- Votes on chatbot answers, recorded by POST /api/ai/chatbot/feedback and
+-- read by the backend's FAQ index (chatbot_faq.py). An answer generated by
+-- the LLM is answered from the index - without an LLM call - once its
+-- helpful votes outnumber the unhelpful ones by CHATBOT_FAQ_MIN_ACCEPTS.
+--
+-- question_key hashes the normalized question with the page and role it was
+-- asked from; answer_key hashes the answer text, so different answers to the
+-- same question are counted separately and the best one wins.
+--
+-- Only the backend (service role) reads or writes these tables: questions
+-- are user-typed text and stay private.
+--
+-- Voting needs a signed-in user, and each user counts once per answer, so
+-- one client can't promote an answer by voting repeatedly with several
+-- feedback tokens for it.
+
+CREATE TABLE IF NOT EXISTS chatbot_answers (
+  question_key TEXT NOT NULL,
+  answer_key TEXT NOT NULL,
+  page TEXT NOT NULL,
+  user_role TEXT NOT NULL,
+  question TEXT NOT NULL,
+  answer TEXT NOT NULL,
+  suggested_actions JSONB DEFAULT '[]'::jsonb NOT NULL,
+  accepted INTEGER DEFAULT 0 NOT NULL,
+  rejected INTEGER DEFAULT 0 NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (question_key, answer_key)
+);
+
+-- The backend loads answers above a minimum number of helpful votes
+CREATE INDEX IF NOT EXISTS idx_chatbot_answers_accepted
+  ON chatbot_answers(accepted DESC);
+
+-- Earlier versions kept one row per feedback token (nonce); those votes have
+-- no voter, so the table is recreated per user
+DO $$
+BEGIN
+  IF EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = 'chatbot_feedback_votes' AND column_name = 'nonce'
+  ) THEN
+    DROP TABLE chatbot_feedback_votes;
+  END IF;
+END $$;
+DROP FUNCTION IF EXISTS public.record_chatbot_feedback(TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, JSONB, BOOLEAN);
+
+-- One row per user and answer, so neither replayed nor fresh tokens add votes
+CREATE TABLE IF NOT EXISTS chatbot_feedback_votes (
+  user_id UUID NOT NULL REFERENCES public.profiles(id) ON DELETE CASCADE,
+  question_key TEXT NOT NULL,
+  answer_key TEXT NOT NULL,
+  helpful BOOLEAN NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (user_id, question_key, answer_key)
+);
+
+-- Count one vote; returns false if the user already voted on this answer
+CREATE OR REPLACE FUNCTION public.record_chatbot_feedback(
+  p_user_id UUID,
+  p_question_key TEXT,
+  p_answer_key TEXT,
+  p_page TEXT,
+  p_user_role TEXT,
+  p_question TEXT,
+  p_answer TEXT,
+  p_suggested_actions JSONB,
+  p_helpful BOOLEAN
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+  INSERT INTO chatbot_feedback_votes (user_id, question_key, answer_key, helpful)
+  VALUES (p_user_id, p_question_key, p_answer_key, p_helpful)
+  ON CONFLICT (user_id, question_key, answer_key) DO NOTHING;
+
+  IF NOT FOUND THEN
+    RETURN FALSE;
+  END IF;
+
+  INSERT INTO chatbot_answers (
+    question_key, answer_key, page, user_role, question, answer, suggested_actions, accepted, rejected
+  ) VALUES (
+    p_question_key, p_answer_key, p_page, p_user_role, p_question, p_answer, COALESCE(p_suggested_actions, '[]'::jsonb),
+    CASE WHEN p_helpful THEN 1 ELSE 0 END,
+    CASE WHEN p_helpful THEN 0 ELSE 1 END
+  )
+  ON CONFLICT (question_key, answer_key) DO UPDATE
+  SET accepted = chatbot_answers.accepted + EXCLUDED.accepted,
+      rejected = chatbot_answers.rejected + EXCLUDED.rejected,
+      updated_at = NOW();
+
+  RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+ALTER TABLE chatbot_answers ENABLE ROW LEVEL SECURITY;
+ALTER TABLE chatbot_feedback_votes ENABLE ROW LEVEL SECURITY;
+
+REVOKE ALL ON FUNCTION public.record_chatbot_feedback(UUID, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, JSONB, BOOLEAN) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.record_chatbot_feedback(UUID, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, JSONB, BOOLEAN) TO service_role;
+
+COMMENT ON TABLE chatbot_answers IS 'Chatbot answers with user votes; well-rated ones are served from the backend FAQ index';
+COMMENT ON TABLE chatbot_feedback_votes IS 'Votes already counted towards chatbot_answers, one per user and answer';
@@ -0,0 +1,41 @@
+-- ============================================
+-- CHATBOT SESSIONS
+-- ============================================
+-- Conversation memory for /api/ai/chatbot, written by the backend
+-- (chat_sessions.py) shortly after every turn so a session can continue on
+-- any worker. Each row holds a bounded state - the last few messages and a
+-- digest of earlier questions - never the full transcript.
+--
+-- Rows past expires_at are ignored on read and deleted by
+-- purge_expired_chat_sessions(), which the backend calls about once per
+-- session TTL.
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+  id TEXT PRIMARY KEY,
+  turns INTEGER DEFAULT 0 NOT NULL,
+  topics JSONB DEFAULT '[]'::jsonb NOT NULL,
+  recent JSONB DEFAULT '[]'::jsonb NOT NULL,
+  expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_expires_at
+  ON chat_sessions(expires_at);
+
+CREATE OR REPLACE FUNCTION public.purge_expired_chat_sessions()
+RETURNS INTEGER AS $$
+DECLARE
+  removed INTEGER;
+BEGIN
+  DELETE FROM chat_sessions WHERE expires_at <= NOW();
+  GET DIAGNOSTICS removed = ROW_COUNT;
+  RETURN removed;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Conversations are private; only the backend (service role) touches them
+ALTER TABLE chat_sessions ENABLE ROW LEVEL SECURITY;
+
+REVOKE ALL ON FUNCTION public.purge_expired_chat_sessions() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.purge_expired_chat_sessions() TO service_role;
+
+COMMENT ON TABLE chat_sessions IS 'Bounded chatbot conversation memory, shared by backend workers';
@@ -0,0 +1,126 @@
+-- ============================================
+-- PRECOMPUTED LISTING INSIGHTS
+-- ============================================
+-- Written by the backend insight job (`python -m insights`), read by the
+-- /api/ai/sentiment-analysis and /api/ai/hidden-charges routes and by
+-- GET /api/insights/<pg_id>.
+--
+-- Every recompute adds a new version; older versions are kept with
+-- is_current = false so changes in a listing's analysis can be audited.
+-- source_hash is the hash of the exact prompt the result was computed from:
+-- the routes only serve a stored result when the prompt they would send
+-- today hashes the same.
+
+CREATE TABLE IF NOT EXISTS listing_insights (
+  pg_id UUID REFERENCES pg_listings(id) ON DELETE CASCADE NOT NULL,
+  kind TEXT CHECK (kind IN ('sentiment', 'hidden_charges')) NOT NULL,
+  version INTEGER NOT NULL,
+  is_current BOOLEAN DEFAULT TRUE NOT NULL,
+  source_hash TEXT NOT NULL,
+  result JSONB NOT NULL,
+  model TEXT,
+  prompt_version INTEGER NOT NULL,
+  source_updated_at TIMESTAMP WITH TIME ZONE,
+  computed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (pg_id, kind, version)
+);
+
+-- At most one current insight per listing and kind; also the read path
+CREATE UNIQUE INDEX IF NOT EXISTS idx_listing_insights_current
+  ON listing_insights(pg_id, kind) WHERE is_current;
+
+-- Where the job got to in pg_listings and reviews, as an (updated_at, id) cursor
+CREATE TABLE IF NOT EXISTS insight_watermarks (
+  source TEXT PRIMARY KEY CHECK (source IN ('pg_listings', 'reviews')),
+  watermark TIMESTAMP WITH TIME ZONE NOT NULL,
+  watermark_id UUID,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE insight_watermarks ADD COLUMN IF NOT EXISTS watermark_id UUID;
+
+-- Insights that failed to compute. The job retries them on later passes
+-- until `attempts` reaches INSIGHTS_MAX_ATTEMPTS; after that they stay here
+-- as dead letters (retried only when the listing changes again). A success
+-- deletes the row.
+CREATE TABLE IF NOT EXISTS insight_failures (
+  pg_id UUID REFERENCES pg_listings(id) ON DELETE CASCADE NOT NULL,
+  kind TEXT CHECK (kind IN ('sentiment', 'hidden_charges')) NOT NULL,
+  attempts INTEGER DEFAULT 1 NOT NULL,
+  last_error TEXT,
+  source_updated_at TIMESTAMP WITH TIME ZONE,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (pg_id, kind)
+);
+
+-- Store a new version and retire the previous one in one transaction
+CREATE OR REPLACE FUNCTION public.store_listing_insight(
+  p_pg_id UUID,
+  p_kind TEXT,
+  p_source_hash TEXT,
+  p_result JSONB,
+  p_model TEXT,
+  p_prompt_version INTEGER,
+  p_source_updated_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS INTEGER AS $$
+DECLARE
+  next_version INTEGER;
+BEGIN
+  -- Serialize concurrent writers for the same listing and kind
+  PERFORM pg_advisory_xact_lock(hashtext(p_pg_id::TEXT || ':' || p_kind));
+
+  SELECT COALESCE(MAX(version), 0) + 1 INTO next_version
+  FROM listing_insights
+  WHERE pg_id = p_pg_id AND kind = p_kind;
+
+  UPDATE listing_insights
+  SET is_current = FALSE
+  WHERE pg_id = p_pg_id AND kind = p_kind AND is_current;
+
+  INSERT INTO listing_insights (
+    pg_id, kind, version, is_current, source_hash, result, model, prompt_version, source_updated_at
+  ) VALUES (
+    p_pg_id, p_kind, next_version, TRUE, p_source_hash, p_result, p_model, p_prompt_version, p_source_updated_at
+  );
+
+  RETURN next_version;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Count one more failed attempt; returns the attempts so far
+CREATE OR REPLACE FUNCTION public.record_insight_failure(
+  p_pg_id UUID,
+  p_kind TEXT,
+  p_error TEXT,
+  p_source_updated_at TIMESTAMP WITH TIME ZONE
+)
+RETURNS INTEGER AS $$
+  INSERT INTO insight_failures (pg_id, kind, last_error, source_updated_at)
+  VALUES (p_pg_id, p_kind, LEFT(p_error, 1000), p_source_updated_at)
+  ON CONFLICT (pg_id, kind) DO UPDATE
+  SET attempts = insight_failures.attempts + 1,
+      last_error = EXCLUDED.last_error,
+      source_updated_at = EXCLUDED.source_updated_at,
+      updated_at = NOW()
+  RETURNING attempts;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+-- Insights are public like the listings they describe; only the backend writes
+ALTER TABLE listing_insights ENABLE ROW LEVEL SECURITY;
+ALTER TABLE insight_watermarks ENABLE ROW LEVEL SECURITY;
+ALTER TABLE insight_failures ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Anyone can read current insights" ON listing_insights;
+CREATE POLICY "Anyone can read current insights"
+  ON listing_insights FOR SELECT
+  USING (is_current);
+
+REVOKE ALL ON FUNCTION public.store_listing_insight(UUID, TEXT, TEXT, JSONB, TEXT, INTEGER, TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.store_listing_insight(UUID, TEXT, TEXT, JSONB, TEXT, INTEGER, TIMESTAMP WITH TIME ZONE) TO service_role;
+REVOKE ALL ON FUNCTION public.record_insight_failure(UUID, TEXT, TEXT, TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.record_insight_failure(UUID, TEXT, TEXT, TIMESTAMP WITH TIME ZONE) TO service_role;
+
+COMMENT ON TABLE listing_insights IS 'Versioned AI insights per listing, precomputed by the backend insight job';
+COMMENT ON TABLE insight_watermarks IS 'Progress of the insight job through pg_listings and reviews';
+COMMENT ON TABLE insight_failures IS 'Insights the job failed to compute: retry queue, then dead letters';
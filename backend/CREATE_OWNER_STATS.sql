@@ -0,0 +1,208 @@
+-- ============================================
+-- INCREMENTAL RATING AND OWNER STATISTICS
+-- ============================================
+-- Keeps listing ratings and per-owner totals up to date by applying the
+-- change of each write instead of recomputing from scratch:
+--
+--   reviews      -> pg_listings.total_reviews / rating_sum / average_rating
+--   pg_listings  -> owner_stats (listings, views, inquiries, reviews, ratings, beds)
+--
+-- A review insert/delete or rating change costs one single-row UPDATE of its
+-- listing, which in turn costs one single-row upsert of its owner's stats,
+-- however many reviews and listings there are. Vote count updates on reviews
+-- no longer touch pg_listings at all. Both triggers run as SECURITY DEFINER
+-- so a reviewer's write can update a listing and stats row they don't own.
+--
+-- Replaces the `owner_stats` materialized view from
+-- Extra_sql/OPTIONAL_IMPROVEMENTS.sql (which also over-counted views and
+-- inquiries once per review through its join). Read by
+-- GET /api/analytics/owner-stats and the analytics dashboard.
+--
+-- Migration for existing databases; supabase_schema.sql creates the same
+-- table, functions and triggers on a fresh install.
+--
+-- Safe to re-run. refresh_owner_stats() recomputes everything from the base
+-- tables; it is only needed after bulk changes made with triggers disabled.
+
+-- ============================================
+-- Listing ratings
+-- ============================================
+ALTER TABLE pg_listings ADD COLUMN IF NOT EXISTS rating_sum BIGINT DEFAULT 0 NOT NULL;
+
+CREATE OR REPLACE FUNCTION apply_pg_rating_delta(target_pg_id UUID, count_delta INTEGER, sum_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE pg_listings
+  SET
+    total_reviews = total_reviews + count_delta,
+    rating_sum = rating_sum + sum_delta,
+    average_rating = CASE WHEN total_reviews + count_delta > 0
+      THEN ((rating_sum + sum_delta)::NUMERIC / (total_reviews + count_delta))::NUMERIC(3,2)
+      ELSE 0 END
+  WHERE id = target_pg_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_pg_rating()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 1, NEW.rating);
+    RETURN NEW;
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM apply_pg_rating_delta(OLD.pg_id, -1, -OLD.rating);
+    RETURN OLD;
+  ELSIF OLD.pg_id = NEW.pg_id THEN
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 0, NEW.rating - OLD.rating);
+  ELSE
+    PERFORM apply_pg_rating_delta(OLD.pg_id, -1, -OLD.rating);
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 1, NEW.rating);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Only writes that change a rating or move a review fire the trigger
+DROP TRIGGER IF EXISTS update_pg_rating_on_review ON reviews;
+CREATE TRIGGER update_pg_rating_on_review AFTER INSERT OR DELETE ON reviews
+  FOR EACH ROW EXECUTE FUNCTION update_pg_rating();
+DROP TRIGGER IF EXISTS update_pg_rating_on_review_change ON reviews;
+CREATE TRIGGER update_pg_rating_on_review_change AFTER UPDATE OF rating, pg_id ON reviews
+  FOR EACH ROW
+  WHEN (OLD.rating IS DISTINCT FROM NEW.rating OR OLD.pg_id IS DISTINCT FROM NEW.pg_id)
+  EXECUTE FUNCTION update_pg_rating();
+
+-- ============================================
+-- Owner statistics
+-- ============================================
+DROP MATERIALIZED VIEW IF EXISTS owner_stats;
+
+CREATE TABLE IF NOT EXISTS owner_stats (
+  owner_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+  total_listings INTEGER DEFAULT 0 NOT NULL,
+  total_views BIGINT DEFAULT 0 NOT NULL,
+  total_inquiries BIGINT DEFAULT 0 NOT NULL,
+  total_reviews INTEGER DEFAULT 0 NOT NULL,
+  rating_sum BIGINT DEFAULT 0 NOT NULL,
+  -- Average over all of the owner's reviews (not an average of listing averages)
+  avg_rating NUMERIC(3, 2) GENERATED ALWAYS AS (
+    CASE WHEN total_reviews > 0 THEN (rating_sum::NUMERIC / total_reviews)::NUMERIC(3,2) ELSE 0 END
+  ) STORED,
+  total_available_beds INTEGER DEFAULT 0 NOT NULL,
+  total_beds INTEGER DEFAULT 0 NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Add (direction 1) or remove (direction -1) a listing's contribution to its owner's row
+CREATE OR REPLACE FUNCTION apply_owner_stats_delta(listing pg_listings, direction INTEGER)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO owner_stats AS s (
+    owner_id, total_listings, total_views, total_inquiries, total_reviews, rating_sum,
+    total_available_beds, total_beds
+  ) VALUES (
+    listing.owner_id,
+    direction,
+    direction * COALESCE(listing.views, 0),
+    direction * COALESCE(listing.inquiries, 0),
+    direction * COALESCE(listing.total_reviews, 0),
+    direction * COALESCE(listing.rating_sum, 0),
+    direction * COALESCE(listing.available_beds, 0),
+    direction * COALESCE(listing.total_beds, 0)
+  )
+  ON CONFLICT (owner_id) DO UPDATE SET
+    total_listings = s.total_listings + EXCLUDED.total_listings,
+    total_views = s.total_views + EXCLUDED.total_views,
+    total_inquiries = s.total_inquiries + EXCLUDED.total_inquiries,
+    total_reviews = s.total_reviews + EXCLUDED.total_reviews,
+    rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+    total_available_beds = s.total_available_beds + EXCLUDED.total_available_beds,
+    total_beds = s.total_beds + EXCLUDED.total_beds,
+    updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_owner_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM apply_owner_stats_delta(OLD, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM apply_owner_stats_delta(NEW, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS update_owner_stats_on_listing ON pg_listings;
+CREATE TRIGGER update_owner_stats_on_listing AFTER INSERT OR DELETE ON pg_listings
+  FOR EACH ROW EXECUTE FUNCTION update_owner_stats();
+DROP TRIGGER IF EXISTS update_owner_stats_on_listing_change ON pg_listings;
+CREATE TRIGGER update_owner_stats_on_listing_change
+  AFTER UPDATE OF owner_id, views, inquiries, total_reviews, rating_sum, available_beds, total_beds ON pg_listings
+  FOR EACH ROW
+  WHEN (
+    (OLD.owner_id, OLD.views, OLD.inquiries, OLD.total_reviews, OLD.rating_sum, OLD.available_beds, OLD.total_beds)
+    IS DISTINCT FROM
+    (NEW.owner_id, NEW.views, NEW.inquiries, NEW.total_reviews, NEW.rating_sum, NEW.available_beds, NEW.total_beds)
+  )
+  EXECUTE FUNCTION update_owner_stats();
+
+-- Full recompute from the base tables (backfill and reconciliation)
+CREATE OR REPLACE FUNCTION refresh_owner_stats()
+RETURNS VOID AS $$
+BEGIN
+  -- Lock out concurrent review/listing writes so no delta lands between the two steps
+  LOCK TABLE reviews, pg_listings IN SHARE ROW EXCLUSIVE MODE;
+
+  UPDATE pg_listings pg
+  SET
+    total_reviews = COALESCE(r.review_count, 0),
+    rating_sum = COALESCE(r.rating_total, 0),
+    average_rating = CASE WHEN COALESCE(r.review_count, 0) > 0
+      THEN (r.rating_total::NUMERIC / r.review_count)::NUMERIC(3,2) ELSE 0 END
+  FROM pg_listings base
+  LEFT JOIN (
+    SELECT pg_id, COUNT(*) AS review_count, SUM(rating) AS rating_total
+    FROM reviews
+    GROUP BY pg_id
+  ) r ON r.pg_id = base.id
+  WHERE pg.id = base.id
+    AND (pg.total_reviews, pg.rating_sum) IS DISTINCT FROM (COALESCE(r.review_count, 0), COALESCE(r.rating_total, 0));
+
+  DELETE FROM owner_stats;
+  INSERT INTO owner_stats (
+    owner_id, total_listings, total_views, total_inquiries, total_reviews, rating_sum,
+    total_available_beds, total_beds
+  )
+  SELECT
+    owner_id,
+    COUNT(*),
+    COALESCE(SUM(views), 0),
+    COALESCE(SUM(inquiries), 0),
+    COALESCE(SUM(total_reviews), 0),
+    COALESCE(SUM(rating_sum), 0),
+    COALESCE(SUM(available_beds), 0),
+    COALESCE(SUM(total_beds), 0)
+  FROM pg_listings
+  GROUP BY owner_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Backfill
+SELECT refresh_owner_stats();
+
+ALTER TABLE owner_stats ENABLE ROW LEVEL SECURITY;
+
+-- Every column is a sum of public pg_listings columns; only triggers write
+DROP POLICY IF EXISTS "Anyone can read owner stats" ON owner_stats;
+CREATE POLICY "Anyone can read owner stats"
+  ON owner_stats FOR SELECT
+  USING (true);
+
+REVOKE ALL ON FUNCTION refresh_owner_stats() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION refresh_owner_stats() TO service_role;
+
+COMMENT ON TABLE owner_stats IS 'Per-owner listing totals, maintained incrementally by triggers on pg_listings';
+COMMENT ON COLUMN pg_listings.rating_sum IS 'Sum of review ratings; average_rating = rating_sum / total_reviews';
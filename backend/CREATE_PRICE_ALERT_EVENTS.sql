@@ -0,0 +1,124 @@
+-- ============================================
+-- PRICE DROP ALERT EVENTS
+-- ============================================
+-- Moves price-drop alert evaluation out of the pg_listings UPDATE. The
+-- trigger from CREATE_PRICE_DROP_ALERTS.sql scanned and updated a listing's
+-- alerts inside every rent update, so a city-wide price change ran one
+-- alert scan, notification insert and alert update per listing in a single
+-- transaction. Now a rent drop only appends a row to rent_change_events.
+--
+-- The backend evaluator (`python -m price_alerts`) keeps every enabled,
+-- untriggered alert in memory, sorted by target price per listing. It reads
+-- the queue in pages, picks the alerts whose target_price >= new rent and
+-- fires them through fire_price_drop_alerts() - one call per few hundred
+-- alerts, which marks triggered_at and inserts the notifications in one
+-- statement - then deletes the events it handled.
+--
+-- fire_price_drop_alerts() re-checks every alert against the table, so an
+-- alert disabled, deleted or already triggered since the evaluator loaded it
+-- is skipped. price_drop_alerts.updated_at lets the evaluator pick up alert
+-- changes without reloading them all.
+--
+-- Run after CREATE_PRICE_DROP_ALERTS.sql. Safe to re-run.
+
+-- ============================================
+-- Alert changes
+-- ============================================
+ALTER TABLE public.price_drop_alerts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_price_drop_alerts_updated_at
+  ON public.price_drop_alerts(updated_at, id);
+
+DROP TRIGGER IF EXISTS update_price_drop_alerts_updated_at ON public.price_drop_alerts;
+CREATE TRIGGER update_price_drop_alerts_updated_at BEFORE UPDATE ON public.price_drop_alerts
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- ============================================
+-- Rent change queue
+-- ============================================
+CREATE TABLE IF NOT EXISTS public.rent_change_events (
+  id BIGSERIAL PRIMARY KEY,
+  -- No foreign key: a listing deleted before its event is handled simply matches no alerts
+  pg_id UUID NOT NULL,
+  owner_id UUID NOT NULL,
+  name TEXT NOT NULL,
+  old_rent INTEGER NOT NULL,
+  new_rent INTEGER NOT NULL,
+  changed_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION queue_rent_change_event()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO rent_change_events (pg_id, owner_id, name, old_rent, new_rent)
+  VALUES (NEW.id, NEW.owner_id, NEW.name, OLD.rent, NEW.rent);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Replaces the synchronous alert scan
+DROP TRIGGER IF EXISTS price_drop_alert_trigger ON pg_listings;
+DROP FUNCTION IF EXISTS notify_price_drop_alerts();
+
+DROP TRIGGER IF EXISTS rent_change_event_trigger ON pg_listings;
+CREATE TRIGGER rent_change_event_trigger
+  AFTER UPDATE OF rent ON pg_listings
+  FOR EACH ROW
+  WHEN (NEW.rent < OLD.rent)
+  EXECUTE FUNCTION queue_rent_change_event();
+
+-- ============================================
+-- Firing alerts
+-- ============================================
+-- p_matches: [{alert_id, pg_id, name, old_rent, new_rent}, ...]
+-- Returns the number of alerts triggered (= notifications created)
+CREATE OR REPLACE FUNCTION public.fire_price_drop_alerts(p_matches JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+  fired INTEGER;
+BEGIN
+  WITH matches AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_matches)
+      AS m(alert_id UUID, pg_id UUID, name TEXT, old_rent INTEGER, new_rent INTEGER)
+  ),
+  claimed AS (
+    UPDATE price_drop_alerts pda
+    SET triggered_at = NOW(), last_checked_at = NOW()
+    FROM matches m
+    JOIN pg_listings pg ON pg.id = m.pg_id
+    WHERE pda.id = m.alert_id
+      AND pda.pg_id = m.pg_id
+      AND pda.is_enabled = TRUE
+      AND pda.triggered_at IS NULL
+      AND m.new_rent <= pda.target_price
+      -- Excludes owner to prevent self-notifications
+      AND pda.user_id <> pg.owner_id
+    RETURNING pda.user_id, m.pg_id, m.name, m.old_rent, m.new_rent
+  )
+  INSERT INTO notifications (user_id, type, title, message, payload)
+  SELECT
+    user_id,
+    'price_drop',
+    'Price Drop Alert!',
+    'The rent at ' || name || ' dropped from ₹' || old_rent || ' to ₹' || new_rent,
+    jsonb_build_object(
+      'pg_id', pg_id,
+      'old_price', old_rent,
+      'new_price', new_rent
+    )
+  FROM claimed;
+
+  GET DIAGNOSTICS fired = ROW_COUNT;
+  RETURN fired;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Only the backend (service role) reads the queue or fires alerts
+ALTER TABLE public.rent_change_events ENABLE ROW LEVEL SECURITY;
+
+REVOKE ALL ON FUNCTION public.fire_price_drop_alerts(JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.fire_price_drop_alerts(JSONB) TO service_role;
+
+COMMENT ON TABLE public.rent_change_events IS 'Rent drops waiting for the price-drop alert evaluator (python -m price_alerts)';
+COMMENT ON COLUMN public.price_drop_alerts.updated_at IS 'Last change to the alert; the evaluator refreshes its copy from here';
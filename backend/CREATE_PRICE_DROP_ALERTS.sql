@@ -67,6 +67,8 @@ CREATE POLICY "Users can delete their own price alerts"
 -- ============================================
 -- TRIGGER FUNCTION: Notify users of price drops
 -- ============================================
+-- Superseded by CREATE_PRICE_ALERT_EVENTS.sql, which queues rent drops for
+-- the backend evaluator (python -m price_alerts) instead
 CREATE OR REPLACE FUNCTION notify_price_drop_alerts()
 RETURNS TRIGGER AS $$
 BEGIN
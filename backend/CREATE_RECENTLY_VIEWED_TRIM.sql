@@ -0,0 +1,45 @@
+-- ============================================
+-- RECENTLY VIEWED TRIM FUNCTION
+-- ============================================
+-- Called by the backend once per flush of buffered recently-viewed writes.
+-- Keeps only the newest `keep_count` rows for each of the given users so the
+-- table doesn't grow without bound.
+
+CREATE OR REPLACE FUNCTION public.trim_recently_viewed(
+  user_ids UUID[],
+  keep_count INTEGER DEFAULT 20
+)
+RETURNS INTEGER AS $$
+DECLARE
+  removed INTEGER;
+BEGIN
+  DELETE FROM recently_viewed rv
+  USING (
+    SELECT user_id, pg_id
+    FROM (
+      SELECT
+        user_id,
+        pg_id,
+        ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY viewed_at DESC) AS rn
+      FROM recently_viewed
+      WHERE user_id = ANY(user_ids)
+    ) ranked
+    WHERE ranked.rn > keep_count
+  ) stale
+  WHERE rv.user_id = stale.user_id
+    AND rv.pg_id = stale.pg_id;
+
+  GET DIAGNOSTICS removed = ROW_COUNT;
+  RETURN removed;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Composite index so the per-user ranking is an index scan
+CREATE INDEX IF NOT EXISTS idx_recently_viewed_user_date
+  ON recently_viewed(user_id, viewed_at DESC);
+
+-- Only the backend (service role) should call this
+REVOKE ALL ON FUNCTION public.trim_recently_viewed(UUID[], INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.trim_recently_viewed(UUID[], INTEGER) TO service_role;
+
+COMMENT ON FUNCTION public.trim_recently_viewed IS 'Trim recently_viewed to the newest keep_count rows per user';
@@ -0,0 +1,32 @@
+-- ============================================
+-- RESPONSE WATERMARKS
+-- ============================================
+-- GET /api/reports and GET /api/verification/documents tag their responses
+-- with an ETag built from the row count and newest updated_at of the rows
+-- they return (http_cache.table_watermark). A poll whose If-None-Match still
+-- matches is answered with 304 after a single-row read, instead of the full
+-- read, profile join and serialization.
+--
+-- Adds updated_at to both tables, kept current by the same trigger function
+-- as profiles, pg_listings and reviews (supabase_schema.sql already has
+-- these columns for new projects). Until this runs, the routes fall back to
+-- ETags hashed from the response body.
+--
+-- Safe to re-run.
+
+ALTER TABLE content_reports ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL;
+ALTER TABLE verification_documents ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_reports_updated ON content_reports(updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_verification_updated ON verification_documents(updated_at DESC);
+
+DROP TRIGGER IF EXISTS update_content_reports_updated_at ON content_reports;
+CREATE TRIGGER update_content_reports_updated_at BEFORE UPDATE ON content_reports
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_verification_documents_updated_at ON verification_documents;
+CREATE TRIGGER update_verification_documents_updated_at BEFORE UPDATE ON verification_documents
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON COLUMN content_reports.updated_at IS 'Last change to the report; part of the /api/reports ETag';
+COMMENT ON COLUMN verification_documents.updated_at IS 'Last change to the document; part of the /api/verification/documents ETag';
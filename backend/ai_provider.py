@@ -1,26 +1,114 @@
-from dotenv import load_dotenv
-import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
 import json
+import os
+import threading
+import time
+
+import llm_json
+import metrics
+import resilience
+import settings
+import singleflight
+import tracing
+
+llm_structured_results = metrics.registry.counter(
+    'smartstay_llm_structured_total',
+    'Structured (JSON) LLM calls, by endpoint and outcome (valid, repaired, discarded)',
+    ('endpoint', 'outcome')
+)
+llm_served = metrics.registry.counter(
+    'smartstay_llm_served_total',
+    'LLM calls by endpoint and the model that served them (hedged=true when the hedge won)',
+    ('endpoint', 'model', 'hedged')
+)
+llm_hedges = metrics.registry.counter(
+    'smartstay_llm_hedges_total',
+    'Hedge requests sent because the primary model exceeded its latency percentile',
+    ('endpoint', 'model')
+)
+
+# Identical JSON calls in flight at the same time share one upstream request
+_in_flight = singleflight.Group('ai')
+
+REPAIR_PROMPT = """The JSON below does not match the required schema.
+
+ERRORS:
+{errors}
+
+SCHEMA:
+{schema}
+
+JSON:
+{output}
+
+Return ONLY the corrected JSON object. Keep every value that is already valid; fix or fill in only what the errors mention."""
+
+
+# Which model tier serves each endpoint. "fast" is a small model for short,
+# forgiving answers; "quality" a larger one where the output is the product.
+ENDPOINT_TIERS = {
+    'chatbot': 'fast',
+    'sentiment': 'fast',
+    'repair': 'fast',
+    'description': 'quality',
+    'hidden_charges': 'quality',
+    'recommendations': 'quality',
+}
 
-load_dotenv()
+# Latency samples kept per model for the hedging percentile
+LATENCY_WINDOW = 256
+MIN_HEDGE_SAMPLES = 20
 
 
 class AIProvider:
-    """Groq-only AI adapter. Default model is `llama-3.1-8b-instant`.
+    """Groq-only AI adapter with per-endpoint model routing.
 
-    Uses the Groq SDK with chat.completions.create() API.
+    Uses the Groq SDK with chat.completions.create() API. Each call names its
+    endpoint; ENDPOINT_TIERS maps it to GROQ_MODEL_FAST (default
+    `llama-3.1-8b-instant`) or GROQ_MODEL_QUALITY (default
+    `llama-3.3-70b-versatile`). When a call runs past the GROQ_HEDGE_PERCENTILE
+    latency of its model, a second request goes to the other tier's model and
+    whichever answers first wins. `smartstay_llm_served_total` shows which
+    model served each endpoint and whether the hedge won.
+
+    `generate_json()` asks for Groq's JSON mode (response_format=json_object),
+    validates the result against a schema from llm_schemas and makes one cheap
+    repair call before giving up, so a slightly malformed answer is fixed
+    rather than thrown away.
     """
 
     def __init__(self):
         self.provider = 'groq'
         self.client = None
-        self.model_name = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
+        self._latencies = {}
+        self._latency_lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self.configure(settings.get())
+        # Pick up a new key or model on settings reload (SIGHUP)
+        settings.on_reload(self.configure)
+
+    def configure(self, config):
+        self.models = {'fast': config.groq_model_fast, 'quality': config.groq_model_quality}
+        self.model_name = self.models['fast']
+        self.hedge_percentile = config.groq_hedge_percentile
+        # Switched off per model if it rejects response_format
+        self.json_mode = config.groq_json_mode
+        self._json_unsupported = set()
 
         try:
             import groq
-            GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-            if GROQ_API_KEY:
-                self.client = groq.Groq(api_key=GROQ_API_KEY)
+            if config.groq_api_key:
+                # The circuit breaker handles persistent failures; SDK-level
+                # retries with backoff would only stretch the tail
+                self.client = groq.Groq(
+                    api_key=config.groq_api_key,
+                    timeout=config.groq_timeout,
+                    max_retries=config.groq_max_retries
+                )
             else:
                 self.client = None
         except Exception as e:
@@ -30,27 +118,208 @@ class AIProvider:
     def is_configured(self) -> bool:
         return self.client is not None
 
-    def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7) -> str:
-        if not self.is_configured():
-            raise RuntimeError('Groq client not configured. Set GROQ_API_KEY and install SDK')
+    def model_for(self, endpoint: str) -> str:
+        return self.models[ENDPOINT_TIERS.get(endpoint, 'fast')]
 
-        try:
-            # Groq SDK uses chat.completions.create()
+    def routes(self) -> dict:
+        """Endpoint -> model table (shown on /health)."""
+        return {endpoint: self.model_for(endpoint) for endpoint in ENDPOINT_TIERS}
+
+    def _alternate(self, model: str) -> str:
+        other = self.models['quality'] if model == self.models['fast'] else self.models['fast']
+        return other if other != model else None
+
+    # ---- latency tracking / hedging ----------------------------------------
+
+    def _record_latency(self, model: str, seconds: float):
+        with self._latency_lock:
+            samples = self._latencies.get(model)
+            if samples is None:
+                samples = self._latencies[model] = deque(maxlen=LATENCY_WINDOW)
+            samples.append(seconds)
+
+    def hedge_delay(self, model: str):
+        """Seconds to wait before hedging, or None if hedging is off/unknown."""
+        if not self.hedge_percentile:
+            return None
+        with self._latency_lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created lazily and per process so it survives gunicorn's preload fork
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv('GROQ_HEDGE_WORKERS', 32)),
+                        thread_name_prefix='ai-hedge'
+                    )
+                    self._executor_pid = pid
+        return self._executor
+
+    def _submit(self, fn, *args):
+        # Each thread needs its own copy of the request context (trace spans)
+        return self._pool().submit(contextvars.copy_context().run, fn, *args)
+
+    # ---- calls ---------------------------------------------------------------
+
+    def _request(self, model: str, endpoint: str, role: str, prompt: str, max_tokens: int,
+                 temperature: float, response_format: dict = None):
+        extra = {'response_format': response_format} if response_format else {}
+        start = time.perf_counter()
+        # Groq SDK uses chat.completions.create()
+        with tracing.span('ai.generate', kind='client', model=model, endpoint=endpoint, role=role,
+                          max_tokens=max_tokens, json_mode=bool(response_format)) as span, \
+                resilience.groq.call(), \
+                metrics.upstream_call('groq', model):
             response = self.client.chat.completions.create(
-                model=self.model_name,
+                model=model,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **extra
             )
-            
-            # Extract text from response
-            return response.choices[0].message.content
-            
+            usage = getattr(response, 'usage', None)
+            span.set_attribute('llm.completion_tokens', getattr(usage, 'completion_tokens', None))
+        self._record_latency(model, time.perf_counter() - start)
+        metrics.record_llm_usage(model, usage)
+
+        # Extract text from response
+        return response.choices[0].message.content
+
+    def _complete(self, prompt: str, max_tokens: int, temperature: float, response_format: dict = None,
+                  endpoint: str = None) -> str:
+        if not self.is_configured():
+            raise RuntimeError('Groq client not configured. Set GROQ_API_KEY and install SDK')
+
+        endpoint = endpoint or 'unknown'
+        model = self.model_for(endpoint)
+        alternate = self._alternate(model)
+        delay = self.hedge_delay(model) if alternate else None
+        if delay is None:
+            text = self._request(model, endpoint, 'primary', prompt, max_tokens, temperature, response_format)
+            llm_served.inc(endpoint=endpoint, model=model, hedged='false')
+            return text
+
+        args = (prompt, max_tokens, temperature, response_format)
+        primary = self._submit(self._request, model, endpoint, 'primary', *args)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            llm_served.inc(endpoint=endpoint, model=model, hedged='false')
+            return primary.result()
+
+        if response_format and alternate in self._json_unsupported:
+            args = (prompt, max_tokens, temperature, None)
+        futures = {primary: model, self._submit(self._request, alternate, endpoint, 'hedge', *args): alternate}
+        llm_hedges.inc(endpoint=endpoint, model=model)
+        first_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text = future.result()
+                except Exception as e:
+                    # A rejected hedge (rate limit, open circuit) just means waiting on the primary
+                    if future is primary or first_error is None:
+                        first_error = e
+                    continue
+                served = futures[future]
+                llm_served.inc(endpoint=endpoint, model=served, hedged='true' if future is not primary else 'false')
+                return text
+        raise first_error
+
+    def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7, endpoint: str = None) -> str:
+        try:
+            return self._complete(prompt, max_tokens, temperature, endpoint=endpoint)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Groq API error: {str(e)}")
+
+    def _complete_json(self, prompt: str, max_tokens: int, temperature: float, endpoint: str) -> str:
+        """One call in JSON mode; returns the raw text even if Groq rejected it."""
+        model = self.model_for(endpoint)
+        if not self.json_mode or model in self._json_unsupported:
+            return self.generate(prompt, max_tokens, temperature, endpoint=endpoint)
+        try:
+            return self._complete(prompt, max_tokens, temperature, {'type': 'json_object'}, endpoint=endpoint)
+        except RuntimeError:
+            raise
         except Exception as e:
+            body = getattr(e, 'body', None)
+            error = body.get('error', body) if isinstance(body, dict) else {}
+            if not isinstance(error, dict):
+                error = {}
+            # Groq validates JSON mode server-side and returns 400 with the
+            # model's output attached; that output is usually one repair away
+            if error.get('code') == 'json_validate_failed' and error.get('failed_generation'):
+                return error['failed_generation']
+            if getattr(e, 'status_code', None) == 400 and 'response_format' in str(e):
+                print(f"JSON mode not supported by {model}, falling back to plain prompts")
+                self._json_unsupported.add(model)
+                return self.generate(prompt, max_tokens, temperature, endpoint=endpoint)
             raise RuntimeError(f"Groq API error: {str(e)}")
 
+    def generate_json(self, prompt: str, schema: dict, endpoint: str = 'unknown',
+                      max_tokens: int = 1024, temperature: float = 0.7, repair: bool = True,
+                      coalesce: bool = True):
+        """Generate a JSON object that validates against `schema`.
+
+        Invalid output gets one repair call at temperature 0. Raises
+        llm_json.InvalidLLMOutput (a json.JSONDecodeError) if that fails too,
+        so routes keep their existing JSONDecodeError fallbacks.
+
+        With `coalesce`, concurrent calls with the same prompt and parameters
+        share one upstream call (see singleflight.py). The prompt is built
+        from the normalized request payload, so it is the coalescing key.
+        """
+        if coalesce:
+            flight_key = singleflight.key(endpoint, prompt, max_tokens, temperature, repair)
+            return _in_flight.do(
+                flight_key,
+                lambda: self.generate_json(prompt, schema, endpoint, max_tokens, temperature, repair, coalesce=False),
+                name=endpoint
+            )
+
+        text = self._complete_json(prompt, max_tokens, temperature, endpoint)
+        value, errors = self._check(text, schema)
+        if not errors:
+            llm_structured_results.inc(endpoint=endpoint, outcome='valid')
+            return value
+
+        if repair:
+            repair_prompt = REPAIR_PROMPT.format(
+                errors='\n'.join(f'- {e}' for e in errors[:10]),
+                schema=json.dumps(schema, separators=(',', ':')),
+                output=(text or '')[:6000],
+            )
+            with tracing.span('ai.repair', endpoint=endpoint, errors=len(errors)):
+                text = self._complete_json(repair_prompt, max_tokens, 0, 'repair')
+            value, errors = self._check(text, schema)
+            if not errors:
+                llm_structured_results.inc(endpoint=endpoint, outcome='repaired')
+                return value
+
+        llm_structured_results.inc(endpoint=endpoint, outcome='discarded')
+        raise llm_json.InvalidLLMOutput(errors, text or '')
+
+    @staticmethod
+    def _check(text: str, schema: dict):
+        """Return (parsed value, validation errors)."""
+        try:
+            value = llm_json.parse(text)
+        except json.JSONDecodeError as e:
+            return None, [f'not valid JSON: {e.msg}']
+        return value, llm_json.validate(value, schema)
+
 
 # Singleton instance
 ai = AIProvider()
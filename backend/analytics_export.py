@@ -0,0 +1,178 @@
+"""Streaming export of an owner's `pg_metrics` rows.
+
+GET /api/analytics/export hands owners the raw daily metrics of their
+listings for their own BI tools. Nothing is collected in memory: rows are
+read from PostgREST in pages of ANALYTICS_EXPORT_PAGE_SIZE and each page is
+encoded and sent before the next one is requested, so an export holds one
+page at a time whether it covers a month or five years.
+
+Pages are read with a keyset on the (pg_id, date) primary key rather than
+an offset, so every page costs the same however deep into the export it
+is. Listings are queried in groups of LISTINGS_PER_QUERY to keep URLs
+short; the output is ordered by listing, then date.
+
+Formats:
+
+    csv       header row, one line per row
+    ndjson    one JSON object per line
+    parquet   one row group per page (only when pyarrow is installed)
+"""
+from datetime import date
+from urllib.parse import quote
+import csv
+import importlib.util
+import io
+import json
+import os
+
+from dotenv import load_dotenv
+
+import metrics
+import settings
+import upstream
+
+load_dotenv()
+
+pa = pq = None
+if importlib.util.find_spec('pyarrow') is not None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except Exception as e:
+        print(f"pyarrow unavailable, analytics export limited to CSV and NDJSON: {e}")
+
+PAGE_SIZE = int(os.getenv('ANALYTICS_EXPORT_PAGE_SIZE', 5000))
+LISTINGS_PER_QUERY = 100
+COLUMNS = ('pg_id', 'pg_name', 'date', 'views', 'inquiries', 'saves', 'clicks')
+METRIC_COLUMNS = ('views', 'inquiries', 'saves', 'clicks')
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+if pq is not None:
+    FORMATS['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+
+export_rows = metrics.registry.counter(
+    'smartstay_analytics_export_rows_total',
+    'pg_metrics rows streamed by /api/analytics/export, by format',
+    ('format',)
+)
+
+
+def parse_date(value):
+    """ISO date from a query parameter (None if absent); raises ValueError if malformed."""
+    return date.fromisoformat(value).isoformat() if value else None
+
+
+def _get(path: str) -> list:
+    config = settings.get()
+    response = upstream.get(config.rest_url(path), headers=config.supabase_headers(), timeout=30)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path.split('?')[0]} failed: {response.status_code} {response.text}")
+    return response.json()
+
+
+def owner_listings(owner_id: str) -> dict:
+    """{pg_id: name} for an owner's listings, sorted by id."""
+    return {pg['id']: pg['name']
+            for pg in _get(f'pg_listings?owner_id=eq.{quote(owner_id)}&select=id,name&order=id.asc')}
+
+
+def metric_pages(listings: dict, start: str = None, end: str = None, page_size: int = PAGE_SIZE):
+    """Yield lists of export rows (dicts with COLUMNS), one per PostgREST page."""
+    pg_ids = list(listings)
+    period = (f'&date=gte.{start}' if start else '') + (f'&date=lte.{end}' if end else '')
+    for i in range(0, len(pg_ids), LISTINGS_PER_QUERY):
+        ids = ','.join(pg_ids[i:i + LISTINGS_PER_QUERY])
+        after = ''
+        while True:
+            page = _get(f'pg_metrics?select=pg_id,date,{",".join(METRIC_COLUMNS)}&pg_id=in.({ids}){period}{after}'
+                        f'&order=pg_id.asc,date.asc&limit={page_size}')
+            if page:
+                yield [{'pg_id': row['pg_id'], 'pg_name': listings.get(row['pg_id'], ''), 'date': row['date'],
+                        **{column: row.get(column) or 0 for column in METRIC_COLUMNS}} for row in page]
+            if len(page) < page_size:
+                break
+            last = page[-1]
+            after = f'&or=(pg_id.gt.{last["pg_id"]},and(pg_id.eq.{last["pg_id"]},date.gt.{last["date"]}))'
+
+
+# ---- encoders -----------------------------------------------------------------
+
+def _csv(pages):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(pages):
+    for page in pages:
+        yield ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in page).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def _parquet(pages):
+    schema = pa.schema([
+        ('pg_id', pa.string()), ('pg_name', pa.string()), ('date', pa.date32()),
+        *((column, pa.int64()) for column in METRIC_COLUMNS),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for page in pages:
+            columns = {column: [row[column] for row in page] for column in COLUMNS}
+            columns['date'] = [date.fromisoformat(value) for value in columns['date']]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    # Footer, written on close
+    yield sink.drain()
+
+
+ENCODERS = {'csv': _csv, 'ndjson': _ndjson, 'parquet': _parquet}
+
+
+def stream(listings: dict, fmt: str, start: str = None, end: str = None):
+    """Encoded export of `listings`' metrics as an iterator of byte chunks."""
+    def counted():
+        for page in metric_pages(listings, start, end):
+            export_rows.inc(len(page), format=fmt)
+            yield page
+
+    try:
+        for chunk in ENCODERS[fmt](counted()):
+            if chunk:
+                yield chunk
+    except Exception as e:
+        # Headers are already sent; aborting the transfer tells the client it is incomplete
+        print(f"Error streaming analytics export: {str(e)}")
+        raise
@@ -1,12 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import json
-import requests
+import re
+import uuid
 
 # AI adapter
 from ai_provider import ai
+import analytics_export
+import auth
+import chat_sessions
+import chatbot_faq
+import document_previews
+import geo_index
+import http_cache
+import insights
+import llm_schemas
+import metrics
+import prompt_budget
+import resilience
+import search_index
+import settings
+import tracing
+import upstream
+from recently_viewed import buffer as recently_viewed_buffer, cache as recently_viewed_cache
 
 # Load environment variables
 load_dotenv()
@@ -14,16 +32,38 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:8080", "http://localhost:5173"])
+metrics.init_app(app)
+tracing.init_app(app)
+http_cache.init_app(app)
+
+
+def is_uuid(value) -> bool:
+    """Whether `value` is a UUID string, as every Supabase row id is."""
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
 
 # ============================================
 # AI ENDPOINTS
 # ============================================
 
+def ai_unavailable(error):
+    """503 for AI routes while the provider is rate limited or its circuit is open"""
+    response = jsonify({"error": "AI service is busy, please try again shortly"})
+    response.status_code = 503
+    if error.retry_after:
+        response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response
+
+
 @app.route('/api/ai/sentiment-analysis', methods=['POST'])
 def sentiment_analysis():
     """
     Analyze sentiment from reviews of a PG listing
-    Expected input: { "reviews": [...], "pg_name": "..." }
+    Expected input: { "reviews": [...], "pg_name": "...", "pg_id": "..." }
+    With pg_id, the precomputed analysis is served when it was made from the same reviews (see insights.py)
     """
     try:
         if not ai.is_configured():
@@ -36,70 +76,24 @@ def sentiment_analysis():
         print(f"Received {len(reviews)} reviews for sentiment analysis")
         
         if not reviews:
-            return jsonify({
-                "overall_sentiment": "neutral",
-                "positive_count": 0,
-                "negative_count": 0,
-                "neutral_count": 0,
-                "insights": "No reviews available yet.",
-                "keywords": {"positive": [], "negative": []}
-            })
-        
-        # Create prompt for Gemini - check multiple possible field names
-        reviews_text = "\n".join([
-            f"- {r.get('review_text', r.get('text', r.get('comment', '')))}" 
-            for r in reviews
-        ])
-        
-        prompt = f"""Analyze the following reviews for {pg_name} and provide a comprehensive sentiment analysis.
-
-Reviews:
-{reviews_text}
-
-Please provide:
-1. Overall sentiment (positive/negative/neutral)
-2. Count of positive, negative, and neutral reviews
-3. Key insights (2-3 bullet points)
-4. Top 3 positive keywords and top 3 negative keywords
-
-Return ONLY a valid JSON object with this exact structure:
-{{
-  "overall_sentiment": "positive/negative/neutral",
-  "positive_count": <number>,
-  "negative_count": <number>,
-  "neutral_count": <number>,
-  "insights": "<2-3 sentence summary>",
-  "keywords": {{
-    "positive": ["keyword1", "keyword2", "keyword3"],
-    "negative": ["keyword1", "keyword2", "keyword3"]
-  }}
-}}"""
-        
-        response_text = ai.generate(prompt)
-        print(f"AI Response: {response_text[:200]}...")  # Log first 200 chars
-        result_text = response_text.strip()
-        
-        # Remove markdown code blocks if present
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
+            return jsonify(insights.EMPTY_SENTIMENT)
         
-        result_text = result_text.strip()
+        prompt = insights.sentiment_prompt(reviews, pg_name)
+        if data.get('pg_id'):
+            result = insights.precomputed(data['pg_id'], 'sentiment', prompt)
+            if result is not None:
+                return jsonify(result)
         
-        if not result_text:
-            print("ERROR: Empty response from AI")
-            return jsonify({"error": "AI returned empty response"}), 500
-        
-        result = json.loads(result_text)
+        # JSON mode + schema validation, with one repair pass on bad output
+        result = insights.analyze('sentiment', prompt)
         return jsonify(result)
         
     except json.JSONDecodeError as e:
         print(f"JSON Parse Error: {str(e)}")
-        print(f"Response text was: {response_text if 'response_text' in locals() else 'N/A'}")
+        print(f"Response text was: {e.doc[:500] or 'N/A'}")
         return jsonify({"error": f"Invalid JSON from AI: {str(e)}"}), 500
+    except resilience.UpstreamUnavailable as e:
+        return ai_unavailable(e)
     except Exception as e:
         print(f"Error in sentiment analysis: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -109,202 +103,27 @@ Return ONLY a valid JSON object with this exact structure:
 def detect_hidden_charges():
     """
     Detect potential hidden charges from PG listing details
-    Expected input: { "description": "...", "rent": 8500, "deposit": 5000, ... }
+    Expected input: { "description": "...", "rent": 8500, "deposit": 5000, ..., "pg_id": "..." }
+    With pg_id, the precomputed report is served when it was made from the same details (see insights.py)
     """
     try:
         if not ai.is_configured():
             return jsonify({"error": "AI provider not configured"}), 500
         
         data = request.json
-        description = data.get('description', '')
-        rent = data.get('rent', 0)
-        deposit = data.get('deposit', 0)
-        amenities = data.get('amenities', [])
-        rules = data.get('rules', '')
-        maintenance_charges = data.get('maintenanceCharges', '')
-        electricity_charges = data.get('electricityCharges', '')
-        food_included = data.get('foodIncluded', False)
-        
-        # Prepare comprehensive listing text
-        amenities_text = ', '.join(amenities) if amenities else 'Not specified'
-        
-        # Format additional charge information
-        maintenance_text = f"₹{maintenance_charges}/month" if maintenance_charges and str(maintenance_charges).strip() and str(maintenance_charges) != '0' else "Not specified"
-        electricity_text = electricity_charges if electricity_charges and str(electricity_charges).strip() else "Not specified"
-        food_text = "Yes, food is included" if food_included else "Not specified"
-        
-        # Check what information is actually provided
-        has_description = bool(description and len(description.strip()) > 20)
-        has_amenities = bool(amenities and len(amenities) > 0)
-        has_rules = bool(rules and len(str(rules).strip()) > 10)
-        
-        prompt = f"""You are analyzing a PG (Paying Guest) listing for transparency and potential hidden charges.
-
-COMPLETE LISTING INFORMATION:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Monthly Rent: ₹{rent}
-Security Deposit: ₹{deposit}
-
-Amenities Provided: {amenities_text}
-
-**MAINTENANCE CHARGES:** {maintenance_text}
-**ELECTRICITY CHARGES:** {electricity_text}
-**FOOD AVAILABILITY:** {food_text}
-
-Property Description:
-{description if description else 'No description provided'}
-
-House Rules & Terms:
-{rules if rules else 'No rules specified'}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-SCORING GUIDELINES - BE FAIR AND REASONABLE:
-
-START WITH BASE SCORE:
-- Has rent and deposit clearly stated: +40 points (baseline)
-- Has amenities list with 3+ items: +15 points
-- Has detailed description (50+ words): +15 points  
-- Has rules/terms specified: +10 points
-
-DEDUCT FOR MISSING CRITICAL INFORMATION:
-- No mention of electricity (included/extra): -5 to -10 points
-- No mention of maintenance: -5 to -10 points
-- No mention of food availability: -3 to -7 points (less critical)
-- No mention of parking: -3 to -5 points (less critical)
-- Vague or ambiguous cost terms: -5 to -10 points
-
-FINAL SCORE RANGES:
-- 80-100: Excellent - All major costs clearly stated, minimal unknowns
-- 60-79: Good - Most information clear, minor details missing
-- 40-59: Fair - Basic info provided but several items unclear
-- 20-39: Poor - Many important details missing
-- 0-19: Very Poor - Minimal information, high risk
-
-IMPORTANT ANALYSIS RULES:
-1. If an amenity is LISTED (e.g., "Wi-Fi" in amenities), assume it's INCLUDED unless stated otherwise
-2. Common amenities like Wi-Fi, Hot Water, TV typically mean they're provided - don't flag as hidden
-3. Only flag as "hidden charge" if there's reason to believe it costs extra but isn't mentioned
-4. Give CREDIT for what IS provided - don't just focus on what's missing
-5. A listing with clear rent, deposit, and good amenities list should score AT LEAST 60/100
-
-Return ONLY valid JSON:
-{{
-  "risk_level": "low/medium/high",
-  "potential_hidden_charges": [
-    {{"charge": "specific charge name", "reason": "why you believe this might be extra/hidden"}}
-  ],
-  "missing_information": ["only truly missing cost details"],
-  "questions_to_ask": ["specific questions about legitimately unclear items"],
-  "transparency_score": <number 0-100>
-}}
-
-BE REASONABLE: If the listing has rent, deposit, amenities list, and a description, the score should be 60+ unless there are serious red flags.
-
-CRITICAL INSTRUCTION: Your response MUST be ONLY the JSON object above. NO explanations, NO markdown, NO extra text before or after. Start your response with {{ and end with }}. Do NOT write "Here's the analysis" or any other commentary."""
-        
-        response_text = ai.generate(prompt, temperature=0)
-        
-        # Debug logging
-        if not response_text or not response_text.strip():
-            print("ERROR: AI returned empty response")
-            print(f"Prompt was: {prompt[:200]}...")
-            raise ValueError("AI returned empty response")
-        
-        result_text = response_text.strip()
-        print(f"AI Response (first 200 chars): {result_text[:200]}")
-        
-        # Remove markdown code blocks and headers
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        # Remove common AI response prefixes
-        prefixes_to_remove = [
-            "Here's the analysis:",
-            "Based on the provided listing, here's the analysis:",
-            "Based on the listing:",
-            "Here is the analysis:",
-            "Analysis:",
-        ]
-        for prefix in prefixes_to_remove:
-            if result_text.startswith(prefix):
-                result_text = result_text[len(prefix):].strip()
-                break
-        
-        # Extract JSON if there's extra text
-        result_text = result_text.strip()
-        if '{' in result_text and '}' in result_text:
-            start = result_text.find('{')
-            end = result_text.rfind('}') + 1
-            result_text = result_text[start:end]
-        else:
-            print(f"ERROR: No JSON found in response: {result_text}")
-            raise ValueError("No valid JSON in AI response")
-        
-        result = json.loads(result_text)
-        
-        # Validate and sanitize response
-        if not isinstance(result, dict):
-            result = {}
-        
-        # Ensure risk_level is valid
-        risk_level = result.get('risk_level', 'medium')
-        if risk_level not in ['low', 'medium', 'high']:
-            risk_level = 'medium'
-        result['risk_level'] = risk_level
-        
-        # Ensure transparency_score is valid (0-100)
-        transparency_score = result.get('transparency_score', 50)
-        try:
-            transparency_score = float(transparency_score)
-            transparency_score = max(0, min(100, transparency_score))
-        except (ValueError, TypeError):
-            transparency_score = 50
-        result['transparency_score'] = int(transparency_score)
-        
-        # Ensure arrays exist and are valid
-        if 'potential_hidden_charges' not in result or not isinstance(result['potential_hidden_charges'], list):
-            result['potential_hidden_charges'] = []
-        
-        # Validate charge objects
-        valid_charges = []
-        for charge in result['potential_hidden_charges']:
-            if isinstance(charge, dict) and 'charge' in charge and 'reason' in charge:
-                valid_charges.append({
-                    'charge': str(charge['charge']),
-                    'reason': str(charge['reason'])
-                })
-        result['potential_hidden_charges'] = valid_charges
-        
-        if 'missing_information' not in result or not isinstance(result['missing_information'], list):
-            result['missing_information'] = []
-        result['missing_information'] = [str(x) for x in result['missing_information'] if x]
-        
-        if 'questions_to_ask' not in result or not isinstance(result['questions_to_ask'], list):
-            result['questions_to_ask'] = []
-        result['questions_to_ask'] = [str(x) for x in result['questions_to_ask'] if x]
-        
-        # Ensure at least some questions
-        if len(result['questions_to_ask']) < 3:
-            default_questions = [
-                "Are there any additional charges apart from rent and deposit?",
-                "What utilities are included in the rent?",
-                "Is there a maintenance fee, and what does it cover?"
-            ]
-            for q in default_questions:
-                if q not in result['questions_to_ask']:
-                    result['questions_to_ask'].append(q)
-                if len(result['questions_to_ask']) >= 3:
-                    break
-        
+        prompt = insights.hidden_charges_prompt(data)
+        if data.get('pg_id'):
+            result = insights.precomputed(data['pg_id'], 'hidden_charges', prompt)
+            if result is not None:
+                return jsonify(result)
+        
+        # Validated and sanitized into the shape the UI expects
+        result = insights.analyze('hidden_charges', prompt)
         return jsonify(result)
         
     except json.JSONDecodeError as e:
         print(f"JSON Parse Error in hidden charge detection: {str(e)}")
-        print(f"Response text was: {response_text if 'response_text' in locals() else 'N/A'}")
+        print(f"Response text was: {e.doc[:500] or 'N/A'}")
         # Return a safe fallback response
         return jsonify({
             "risk_level": "medium",
@@ -321,8 +140,6 @@ CRITICAL INSTRUCTION: Your response MUST be ONLY the JSON object above. NO expla
     except Exception as e:
         print(f"Error in hidden charge detection: {str(e)}")
         print(f"Error type: {type(e).__name__}")
-        if 'response_text' in locals():
-            print(f"Response was: {response_text[:500] if response_text else 'EMPTY'}")
         # Return fallback response instead of 500 error
         return jsonify({
             "risk_level": "medium",
@@ -338,6 +155,43 @@ CRITICAL INSTRUCTION: Your response MUST be ONLY the JSON object above. NO expla
         })
 
 
+@app.route('/api/insights/<pg_id>', methods=['GET'])
+def get_listing_insights(pg_id):
+    """
+    Current precomputed insights for a listing (written by `python -m insights`)
+    Returns: { "sentiment": {"result": {...}, "version": 3, "computed_at": "..."}, "hidden_charges": {...} }
+    """
+    try:
+        if not settings.get().supabase_configured:
+            return jsonify({"error": "Supabase not configured"}), 500
+        
+        current = insights.current(pg_id)
+        return jsonify({
+            kind: {key: value for key, value in row.items() if key not in ('kind', 'source_hash')}
+            for kind, row in current.items()
+        })
+        
+    except Exception as e:
+        print(f"Error fetching insights: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def demo_travel_response(service, from_coords=None, to_coords=None):
+    """Estimated travel modes used when OpenRouteService is unconfigured or unavailable"""
+    result = {
+        "modes": [
+            {"mode": "walking", "duration": 15, "distance": 1200},
+            {"mode": "cycling", "duration": 8, "distance": 1500},
+            {"mode": "driving", "duration": 5, "distance": 2100}
+        ],
+        "service": service
+    }
+    if from_coords is not None:
+        result["from"] = from_coords
+        result["to"] = to_coords
+    return jsonify(result)
+
+
 @app.route('/api/ai/travel-time', methods=['POST'])
 def estimate_travel_time():
     """
@@ -355,22 +209,20 @@ def estimate_travel_time():
         to_address = data.get('to_address')
         modes = data.get('modes', ['foot-walking', 'cycling-regular', 'driving-car'])
         
-        OPENROUTE_API_KEY = os.getenv('OPENROUTE_API_KEY')
+        config = settings.get()
+        OPENROUTE_BASE_URL = config.openroute_base_url
         
-        if not OPENROUTE_API_KEY or OPENROUTE_API_KEY == 'your_openroute_api_key_here':
-            return jsonify({
-                "modes": [
-                    {"mode": "walking", "duration": 15, "distance": 1200},
-                    {"mode": "cycling", "duration": 8, "distance": 1500},
-                    {"mode": "driving", "duration": 5, "distance": 2100}
-                ],
-                "service": "Demo Mode - Add OPENROUTE_API_KEY to .env"
-            })
+        if not config.openroute_api_key:
+            return demo_travel_response("Demo Mode - Add OPENROUTE_API_KEY to .env")
+        
+        # Circuit open after repeated failures: don't wait on timeouts
+        if not resilience.openrouteservice.available():
+            return demo_travel_response("Demo Mode - OpenRouteService temporarily unavailable")
         
         # Geocode addresses if provided
         if from_address and to_address:
-            geocode_url = "https://api.openrouteservice.org/geocode/search"
-            headers = {"Authorization": OPENROUTE_API_KEY}
+            geocode_url = f"{OPENROUTE_BASE_URL}/geocode/search"
+            headers = config.openroute_headers
             
             # Helper function to try geocoding with fallback addresses
             def geocode_with_fallback(address, label):
@@ -390,7 +242,7 @@ def estimate_travel_time():
                 for addr in addresses_to_try:
                     try:
                         print(f"Trying to geocode {label}: {addr}")
-                        response = requests.get(
+                        response = upstream.get(
                             geocode_url,
                             params={"text": addr, "size": 1},
                             headers=headers,
@@ -405,6 +257,8 @@ def estimate_travel_time():
                                 result = {'lng': coords[0], 'lat': coords[1]}
                                 print(f"{label} coords: {result}")
                                 return result
+                    except resilience.UpstreamUnavailable:
+                        raise
                     except Exception as e:
                         print(f"Error geocoding {label} with '{addr}': {str(e)}")
                         continue
@@ -427,10 +281,10 @@ def estimate_travel_time():
         if not to_coords.get('lat') or not to_coords.get('lng'):
             return jsonify({"error": "Missing 'to' coordinates"}), 400
         
-        if OPENROUTE_API_KEY and OPENROUTE_API_KEY != 'your_openroute_api_key_here':
+        if config.openroute_api_key:
             # Real API implementation
             results = []
-            base_url = "https://api.openrouteservice.org/v2/directions"
+            base_url = f"{OPENROUTE_BASE_URL}/v2/directions"
             
             # Map frontend modes to OpenRouteService profiles
             mode_mapping = {
@@ -442,10 +296,7 @@ def estimate_travel_time():
                 'driving': 'driving-car'
             }
             
-            headers = {
-                "Authorization": OPENROUTE_API_KEY,
-                "Content-Type": "application/json"
-            }
+            headers = config.openroute_headers
             
             for mode in modes:
                 try:
@@ -459,7 +310,7 @@ def estimate_travel_time():
                         ]
                     }
                     
-                    response = requests.post(url, json=payload, headers=headers, timeout=10)
+                    response = upstream.post(url, json=payload, headers=headers, timeout=10)
                     
                     if response.status_code == 200:
                         route_data = response.json()
@@ -481,6 +332,9 @@ def estimate_travel_time():
                     else:
                         print(f"OpenRouteService API error for {mode}: {response.status_code}")
                         
+                except resilience.UpstreamUnavailable as e:
+                    print(f"Skipping remaining modes: {str(e)}")
+                    break
                 except Exception as e:
                     print(f"Error fetching route for {mode}: {str(e)}")
                     continue
@@ -494,29 +348,11 @@ def estimate_travel_time():
                 })
         
         # Fallback: Return estimated data if no API key or API fails
-        return jsonify({
-            "modes": [
-                {
-                    "mode": "walking",
-                    "duration": 15,
-                    "distance": 1200
-                },
-                {
-                    "mode": "cycling",
-                    "duration": 8,
-                    "distance": 1500
-                },
-                {
-                    "mode": "driving",
-                    "duration": 5,
-                    "distance": 2100
-                }
-            ],
-            "service": "OpenRouteService (Demo Mode - Add API key to .env)",
-            "from": from_coords,
-            "to": to_coords
-        })
+        return demo_travel_response("OpenRouteService (Demo Mode - Add API key to .env)", from_coords, to_coords)
         
+    except resilience.UpstreamUnavailable as e:
+        print(f"Travel time fallback: {str(e)}")
+        return demo_travel_response("Demo Mode - OpenRouteService temporarily unavailable")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -552,11 +388,13 @@ Write a 3-4 sentence description that:
 
 Return only the description text, no JSON."""
         
-        response_text = ai.generate(prompt)
+        response_text = ai.generate(prompt, endpoint='description')
         description = response_text.strip()
 
         return jsonify({"description": description})
 
+    except resilience.UpstreamUnavailable as e:
+        return ai_unavailable(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -593,17 +431,31 @@ def personalized_recommendations():
         if not available_pgs:
             return jsonify({"recommendations": []})
         
-        # Limit to top 50 PGs to avoid token limits
-        pgs_sample = available_pgs[:50]
-        
         # Format PG data for AI
-        pgs_text = "\n".join([
-            f"- PG #{pg.get('id')}: {pg.get('name')} | Rent: ₹{pg.get('rent')} | "
-            f"Amenities: {', '.join(pg.get('amenities', [])[:5])} | "
-            f"Location: {pg.get('address', {}).get('area', 'N/A')} | "
-            f"Rating: {pg.get('average_rating', 0)}/5"
-            for pg in pgs_sample
-        ])
+        def pg_line(pg):
+            return (
+                f"- PG #{pg.get('id')}: {pg.get('name')} | Rent: ₹{pg.get('rent')} | "
+                f"Amenities: {', '.join(pg.get('amenities', [])[:5])} | "
+                f"Location: {(pg.get('address') or {}).get('area', 'N/A')} | "
+                f"Rating: {pg.get('average_rating', 0)}/5"
+            )
+        
+        # Fit as many PGs as the token budget allows, in-budget ones first;
+        # the rest are sampled by a stable hash of the id
+        budget_range = preferences.get('budget', {})
+        
+        def outside_budget(pg):
+            try:
+                rent = float(pg.get('rent') or 0)
+            except (TypeError, ValueError):
+                return 1
+            return int(not budget_range.get('min', 0) <= rent <= budget_range.get('max', float('inf')))
+        
+        pgs_sample = prompt_budget.select_within_budget(
+            available_pgs, pg_line, prompt_budget.budget('recommendations'),
+            endpoint='recommendations', priority=outside_budget, key=lambda pg: pg.get('id')
+        )
+        pgs_text = "\n".join(pg_line(pg) for pg in pgs_sample)
         
         recently_viewed = user_history.get('recently_viewed', [])[:5]
         saved_pgs = user_history.get('saved_pgs', [])[:5]
@@ -643,44 +495,20 @@ Exact format:
 }}"""
         
         # Increase max_tokens for longer response with 5 recommendations
-        response_text = ai.generate(prompt, max_tokens=2048)
-        result_text = response_text.strip()
-        
-        # Remove markdown code blocks
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        result_text = result_text.strip()
-        
-        # Try to extract valid JSON even if response is truncated
-        try:
-            result = json.loads(result_text)
-        except json.JSONDecodeError:
-            # If parsing fails, try to find the JSON object
-            import re
-            json_match = re.search(r'\{[\s\S]*\}', result_text)
-            if json_match:
-                try:
-                    result = json.loads(json_match.group())
-                except:
-                    raise
-            else:
-                raise
+        result = ai.generate_json(prompt, llm_schemas.RECOMMENDATIONS, endpoint='recommendations', max_tokens=2048)
         
         return jsonify(result)
         
     except json.JSONDecodeError as e:
         print(f"JSON Parse Error in recommendations: {str(e)}")
-        print(f"Raw AI response: {response_text[:500] if 'response_text' in locals() else 'N/A'}")
+        print(f"Raw AI response: {e.doc[:500] or 'N/A'}")
         # Return empty recommendations as fallback
         return jsonify({
             "recommendations": [],
             "error": "AI response formatting issue. Please try again."
         }), 200
+    except resilience.UpstreamUnavailable as e:
+        return ai_unavailable(e)
     except Exception as e:
         print(f"Error in personalized recommendations: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -692,29 +520,38 @@ def chatbot_support():
     Customer support chatbot using AI
     Expected input: { 
         "message": "user question",
+        "session_id": "<session_id from the previous response>",
         "chat_history": [{"role": "user", "content": "..."}, {"role": "bot", "content": "..."}],
         "context": {"current_page": "home", "user_role": "user"}
     }
+    Every response carries a session_id; sending it back with the next message
+    replaces chat_history, which is only needed by clients without one (see
+    chat_sessions.py). Common questions are answered from the FAQ index (source "faq") without
+    calling the AI (see chatbot_faq.py). Other answers include a
+    feedback_token for POST /api/ai/chatbot/feedback.
     """
+    session = None
     try:
-        if not ai.is_configured():
-            return jsonify({"error": "AI provider not configured"}), 500
-        
         data = request.json
         user_message = data.get('message', '')
-        chat_history = data.get('chat_history', [])
         context = data.get('context', {})
         
         if not user_message:
             return jsonify({"error": "Message is required"}), 400
         
-        # Build conversation context
-        history_text = ""
-        if chat_history:
-            history_text = "\n".join([
-                f"{'User' if msg.get('role') == 'user' else 'Bot'}: {msg.get('content', '')}"
-                for msg in chat_history[-5:]  # Last 5 messages
-            ])
+        session = chat_sessions.store.get_or_create(data.get('session_id'), data.get('chat_history', []))
+        chat_history = list(session.recent)
+        
+        answer = chatbot_faq.faq.lookup(user_message, context, chat_history)
+        if answer is not None:
+            chat_sessions.store.record(session, user_message, answer['response'])
+            return jsonify({**answer, "session_id": session.token})
+        
+        if not ai.is_configured():
+            return jsonify({"error": "AI provider not configured"}), 500
+        
+        # Build conversation context: recent turns verbatim, older ones as a digest
+        history_text = session.render(prompt_budget.budget('chatbot_history'))
         
         current_page = context.get('current_page', 'unknown')
         user_role = context.get('user_role', 'guest')
@@ -745,18 +582,14 @@ Return ONLY valid JSON:
 
 Suggested actions are optional quick-reply buttons like "Search PGs", "View Dashboard", "Contact Support"."""
         
-        response_text = ai.generate(prompt)
-        result_text = response_text.strip()
-        
-        # Remove markdown code blocks
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        result = json.loads(result_text.strip())
+        result = ai.generate_json(prompt, llm_schemas.CHATBOT, endpoint='chatbot')
+        # Answers to follow-ups depend on the conversation, so only standalone ones can be learned
+        if chatbot_faq.standalone(user_message, chat_history):
+            token = chatbot_faq.feedback_token(user_message, result, context, 'llm')
+            if token:
+                result['feedback_token'] = token
+        chat_sessions.store.record(session, user_message, result['response'])
+        result['session_id'] = session.token
         return jsonify(result)
         
     except json.JSONDecodeError as e:
@@ -764,23 +597,78 @@ Suggested actions are optional quick-reply buttons like "Search PGs", "View Dash
         # Fallback response
         return jsonify({
             "response": "I'm here to help! You can ask me about finding PGs, understanding features, or using the platform.",
-            "suggested_actions": ["Search PGs", "View Dashboard"]
+            "suggested_actions": ["Search PGs", "View Dashboard"],
+            **({"session_id": session.token} if session else {})
+        })
+    except resilience.UpstreamUnavailable as e:
+        print(f"Chatbot fallback: {str(e)}")
+        return jsonify({
+            "response": "I'm having trouble answering right now. You can still search PGs or browse your dashboard while I catch up.",
+            "suggested_actions": ["Search PGs", "View Dashboard"],
+            **({"session_id": session.token} if session else {})
         })
     except Exception as e:
         print(f"Error in chatbot: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/ai/chatbot/feedback', methods=['POST'])
+def chatbot_feedback():
+    """
+    Vote on a chatbot answer; well-rated answers are then served from the FAQ index
+    Expected input: {
+        "feedback_token": "<feedback_token from /api/ai/chatbot>",
+        "helpful": true
+    }
+    Headers: Authorization: Bearer <Supabase access token of the voter>
+    Each user's vote on an answer counts once; "recorded" is false for a repeat.
+    """
+    try:
+        data = request.json or {}
+        if not isinstance(data.get('helpful'), bool):
+            return jsonify({"error": "helpful must be true or false"}), 400
+
+        payload = chatbot_faq.read_feedback_token(data.get('feedback_token'))
+        if payload is None:
+            return jsonify({"error": "Invalid or expired feedback token"}), 400
+
+        try:
+            voter = auth.user_id(auth.bearer_token(request))
+        except auth.Unauthorized as e:
+            return jsonify({"error": str(e)}), 401
+
+        recorded = chatbot_faq.record_feedback(payload, data['helpful'], voter)
+        return jsonify({"success": True, "recorded": recorded})
+
+    except resilience.UpstreamUnavailable as e:
+        print(f"Chatbot feedback unavailable: {str(e)}")
+        response = jsonify({"error": "Feedback is temporarily unavailable, please try again shortly"})
+        response.status_code = 503
+        if e.retry_after:
+            response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+        return response
+    except Exception as e:
+        print(f"Error recording chatbot feedback: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "ai_provider_configured": ai.is_configured(),
-        "ai_provider": os.getenv('AI_PROVIDER', 'groq')
+        "ai_provider": settings.get().ai_provider,
+        "ai_models": ai.routes()
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint (per-process metrics)"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
 # ============================================
 # RECENTLY VIEWED ENDPOINTS
 # ============================================
@@ -798,40 +686,186 @@ def add_recently_viewed():
         
         if not user_id or not pg_id:
             return jsonify({"error": "user_id and pg_id are required"}), 400
+        if not is_uuid(user_id) or not is_uuid(pg_id):
+            return jsonify({"error": "user_id and pg_id must be UUIDs"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+        if not settings.get().service_role_configured:
+            return jsonify({"error": "Supabase not configured"}), 500
+        
+        # Buffered and flushed as one multi-row upsert (see recently_viewed.py)
+        viewed_at = recently_viewed_buffer.record(user_id, pg_id)
+        recently_viewed_cache.touch(user_id, pg_id, viewed_at)
         
-        if not SUPABASE_URL or not SUPABASE_KEY:
+        return jsonify({"success": True, "message": "Added to recently viewed"})
+            
+    except Exception as e:
+        print(f"Error adding recently viewed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/recently-viewed', methods=['GET'])
+def get_recently_viewed():
+    """
+    Get the signed-in user's recently viewed PGs, newest first
+    Query params: ?user_id=...&limit=10
+    Headers: Authorization: Bearer <Supabase access token of that user>
+    Served from a short-lived per-user cache (see recently_viewed.py).
+    """
+    try:
+        user_id = request.args.get('user_id')
+        
+        if not user_id:
+            return jsonify({"error": "user_id required"}), 400
+        
+        try:
+            limit = int(request.args.get('limit', 10))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        
+        if not settings.get().supabase_configured:
             return jsonify({"error": "Supabase not configured"}), 500
         
-        # Upsert into recently_viewed (will update viewed_at if exists)
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'resolution=merge-duplicates'
-        }
+        try:
+            access_token = auth.bearer_token(request)
+            if auth.user_id(access_token) != user_id:
+                return jsonify({"error": "Not allowed to read another user's history"}), 403
+        except auth.Unauthorized as e:
+            return jsonify({"error": str(e)}), 401
         
-        payload = {
-            'user_id': user_id,
-            'pg_id': pg_id,
-            'viewed_at': 'now()'
-        }
+        return jsonify({"items": recently_viewed_cache.get(user_id, access_token, limit)})
         
-        response = requests.post(
-            f'{SUPABASE_URL}/rest/v1/recently_viewed',
-            headers=headers,
-            json=payload
+    except Exception as e:
+        print(f"Error fetching recently viewed: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+# ============================================
+# SEARCH ENDPOINTS
+# ============================================
+
+def _csv_arg(name):
+    return [v for v in (x.strip() for x in request.args.get(name, '').split(',')) if v]
+
+
+def _number_arg(name):
+    value = request.args.get(name)
+    return float(value) if value not in (None, '') else None
+
+
+def _search_filters():
+    """Structured filters shared by /api/search and /api/nearby (raises ValueError)"""
+    return {
+        "city": request.args.get('city'),
+        "area": request.args.get('area'),
+        "gender": _csv_arg('gender'),
+        "room_type": _csv_arg('room_type'),
+        "amenities": _csv_arg('amenities'),
+        "min_rent": _number_arg('min_rent'),
+        "max_rent": _number_arg('max_rent'),
+        "available": request.args.get('available') == 'true',
+        "verified": request.args.get('verified') == 'true',
+        "facets": request.args.get('facets', 'true') != 'false'
+    }
+
+
+@app.route('/api/search', methods=['GET'])
+def search_listings():
+    """
+    Faceted search over active PG listings, served from an in-memory index
+    Query params: ?q=koramangala wifi&city=Pune&area=Kothrud&gender=boys,any&room_type=single,double
+                  &amenities=Wi-Fi,Food&min_rent=5000&max_rent=12000&available=true
+                  &verified=true&sort=relevance|rating|rent_asc|rent_desc|newest&page=1&per_page=20
+    `q` matches name, area and description (typo tolerant); results then
+    default to sort=relevance and carry a "score".
+    Returns: { "results": [...], "total": 123, "page": 1, "per_page": 20, "facets": {...} }
+    """
+    try:
+        if not settings.get().supabase_configured:
+            return jsonify({"error": "Supabase not configured"}), 500
+        
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+            filters = _search_filters()
+        except ValueError:
+            return jsonify({"error": "page, per_page, min_rent and max_rent must be numbers"}), 400
+        
+        q = request.args.get('q', '').strip()[:200]
+        result = search_index.listings.search(
+            q=q or None,
+            sort=request.args.get('sort', 'relevance' if q else 'rating'),
+            offset=(page - 1) * per_page,
+            limit=per_page,
+            **filters
         )
+        result.update({"page": page, "per_page": per_page})
+        return jsonify(result)
         
-        if response.status_code in [200, 201]:
-            return jsonify({"success": True, "message": "Added to recently viewed"})
+    except Exception as e:
+        print(f"Error searching listings: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/nearby', methods=['GET'])
+def nearby_listings():
+    """
+    PG listings near a point or a named college/landmark, nearest first
+    Query params: ?lat=18.5293&lng=73.8565  OR  ?college=COEP Technological University, Pune
+                  &radius_km=3  (all listings within the radius, paged)
+                  OR &k=10     (the 10 nearest listings that pass the filters; default)
+                  plus any /api/search filter, &sort=distance|rating|rent_asc|...&page=1&per_page=20
+    Returns: { "results": [... with "distance_m"], "total": 42, "radius_m": 3000,
+               "center": {"lat": ..., "lng": ...}, "facets": {...} }
+    """
+    try:
+        if not settings.get().supabase_configured:
+            return jsonify({"error": "Supabase not configured"}), 500
+        
+        try:
+            lat = _number_arg('lat')
+            lng = _number_arg('lng')
+            radius_km = _number_arg('radius_km')
+            k = min(100, max(1, int(request.args.get('k', 10))))
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+            filters = _search_filters()
+        except ValueError:
+            return jsonify({"error": "lat, lng, radius_km, k, page, per_page and rents must be numbers"}), 400
+        
+        college = request.args.get('college', '').strip()[:200]
+        if lat is None or lng is None:
+            if not college:
+                return jsonify({"error": "Pass lat and lng, or college"}), 400
+            center = geo_index.locate(college)
+            if not center:
+                return jsonify({"error": f"Could not locate: {college}"}), 400
+            lat, lng = center['lat'], center['lng']
+        elif not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({"error": "lat/lng out of range"}), 400
+        
+        sort = request.args.get('sort', 'distance')
+        if radius_km is not None:
+            result = search_index.listings.nearby(
+                lat, lng, radius_m=max(0.0, radius_km) * 1000, sort=sort,
+                offset=(page - 1) * per_page, limit=per_page, **filters
+            )
+            result.update({"page": page, "per_page": per_page})
         else:
-            return jsonify({"error": response.text}), response.status_code
-            
+            result = search_index.listings.nearby(lat, lng, k=k, sort=sort, **filters)
+            result["k"] = k
+        result["center"] = {"lat": lat, "lng": lng}
+        return jsonify(result)
+        
+    except resilience.UpstreamUnavailable as e:
+        response = jsonify({"error": "Location service is busy, please pass lat/lng or try again shortly"})
+        response.status_code = 503
+        if e.retry_after:
+            response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+        return response
     except Exception as e:
-        print(f"Error adding recently viewed: {str(e)}")
+        print(f"Error finding nearby listings: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
@@ -839,35 +873,39 @@ def add_recently_viewed():
 # MODERATION / CONTENT REPORTS ENDPOINTS
 # ============================================
 
+def _reports_filters():
+    status = request.args.get('status')
+    content_type = request.args.get('content_type')
+    filters = ''
+    if status:
+        filters += f'&status=eq.{status}'
+    if content_type:
+        filters += f'&content_type=eq.{content_type}'
+    return filters
+
+
 @app.route('/api/reports', methods=['GET'])
+@http_cache.conditional(lambda: http_cache.table_watermark('content_reports', _reports_filters()))
 def get_reports():
     """
     Get all content reports (admin only)
     Query params: ?status=pending&content_type=listing
+    ETag from the reports' count and newest updated_at; a matching If-None-Match gets 304 after a one-row read
     """
     try:
-        status = request.args.get('status')
-        content_type = request.args.get('content_type')
-        
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers()
         
         url = f'{SUPABASE_URL}/rest/v1/content_reports?select=*,reporter:profiles!reporter_id(full_name)&order=created_at.desc'
+        url += _reports_filters()
         
-        if status:
-            url += f'&status=eq.{status}'
-        if content_type:
-            url += f'&content_type=eq.{content_type}'
-        
-        response = requests.get(url, headers=headers)
+        response = upstream.get(url, headers=headers)
         
         if response.status_code == 200:
-            return jsonify(response.json())
+            reports = response.json()
+            http_cache.record_watermark(reports)
+            return jsonify(reports)
         else:
             return jsonify({"error": response.text}), response.status_code
             
@@ -888,17 +926,11 @@ def create_report():
         if not all(k in data for k in required):
             return jsonify({"error": "Missing required fields"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers(write=True)
         
-        response = requests.post(
+        response = upstream.post(
             f'{SUPABASE_URL}/rest/v1/content_reports',
             headers=headers,
             json=data
@@ -929,18 +961,12 @@ def review_report(report_id):
         if not action or not admin_id:
             return jsonify({"error": "action and admin_id required"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers(write=True)
         
         # Get report details first
-        report_response = requests.get(
+        report_response = upstream.get(
             f'{SUPABASE_URL}/rest/v1/content_reports?id=eq.{report_id}',
             headers=headers
         )
@@ -958,7 +984,7 @@ def review_report(report_id):
             'resolved_at': 'now()'
         }
         
-        response = requests.patch(
+        response = upstream.patch(
             f'{SUPABASE_URL}/rest/v1/content_reports?id=eq.{report_id}',
             headers=headers,
             json=update_data
@@ -970,13 +996,13 @@ def review_report(report_id):
             content_id = report['content_id']
             
             if content_type == 'listing':
-                requests.patch(
+                upstream.patch(
                     f'{SUPABASE_URL}/rest/v1/pg_listings?id=eq.{content_id}',
                     headers=headers,
                     json={'status': 'removed'}
                 )
             elif content_type == 'review':
-                requests.patch(
+                upstream.patch(
                     f'{SUPABASE_URL}/rest/v1/reviews?id=eq.{content_id}',
                     headers=headers,
                     json={'is_flagged': True}
@@ -991,7 +1017,7 @@ def review_report(report_id):
             'payload': {'report_id': report_id}
         }
         
-        requests.post(
+        upstream.post(
             f'{SUPABASE_URL}/rest/v1/notifications',
             headers=headers,
             json=notification_data
@@ -1008,51 +1034,114 @@ def review_report(report_id):
 # DOCUMENT VERIFICATION ENDPOINTS
 # ============================================
 
+DOCUMENT_EXTENSIONS = ('pdf', 'jpg', 'jpeg', 'png')
+
+
+def safe_document_name(file_name) -> str:
+    """`file_name` reduced to a storage-safe basename; None if its extension isn't allowed."""
+    base = str(file_name).replace('\\', '/').rsplit('/', 1)[-1]
+    stem, dot, extension = base.rpartition('.')
+    extension = extension.lower()
+    if not dot or extension not in DOCUMENT_EXTENSIONS:
+        return None
+    stem = re.sub(r'[^A-Za-z0-9_-]+', '_', stem).strip('_')[:80] or 'document'
+    return f'{stem}.{extension}'
+
+
 @app.route('/api/verification/upload-url', methods=['POST'])
 def get_upload_url():
     """
     Generate a signed upload URL for verification documents
-    Expected input: { "owner_id": "...", "file_name": "...", "content_type": "image/jpeg" }
-    Returns: { "upload_url": "...", "file_path": "..." }
+    Expected input: { "owner_id": "...", "file_name": "...", "content_type": "image/jpeg", "file_size": 123456 }
+    Headers: Authorization: Bearer <Supabase access token of that owner>
+    Returns: { "upload_url": "...", "token": "...", "file_path": "...", "resumable": {...} }
+
+    Signing uses the service role, so the caller must be the owner whose
+    folder the upload goes to; file_name is reduced to a safe basename with
+    an allowed extension (pdf, jpg, jpeg, png).
+
+    Only the storage signing endpoint is called here - the backend never writes
+    the object itself. The client PUTs the file straight to `upload_url`, or uses
+    the TUS endpoint in `resumable` for large files (e.g. scanned PDF licenses).
     """
     try:
         data = request.json
         owner_id = data.get('owner_id')
         file_name = data.get('file_name')
         content_type = data.get('content_type', 'application/pdf')
+        try:
+            file_size = int(data.get('file_size') or 0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "file_size must be an integer"}), 400
         
         if not owner_id or not file_name:
             return jsonify({"error": "owner_id and file_name required"}), 400
+        if not is_uuid(owner_id):
+            return jsonify({"error": "owner_id must be a UUID"}), 400
+        if file_size < 0:
+            return jsonify({"error": "file_size must not be negative"}), 400
+        safe_name = safe_document_name(file_name)
+        if safe_name is None:
+            return jsonify({"error": f"file_name must end in .{', .'.join(DOCUMENT_EXTENSIONS)}"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        
+        try:
+            if auth.user_id(auth.bearer_token(request)) != owner_id:
+                return jsonify({"error": "Not allowed to upload to another owner's documents"}), 403
+        except auth.Unauthorized as e:
+            return jsonify({"error": str(e)}), 401
         
         # Generate unique file path
-        import uuid
         from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_path = f"verification/{owner_id}/{timestamp}_{uuid.uuid4().hex[:8]}_{file_name}"
+        file_path = f"verification/{owner_id}/{timestamp}_{uuid.uuid4().hex[:8]}_{safe_name}"
         
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-        }
+        # Signing needs insert rights on the bucket; prefer the service role key
+        headers = config.supabase_headers('storage')
         
-        # Create signed upload URL
-        response = requests.post(
-            f'{SUPABASE_URL}/storage/v1/object/verification-docs/{file_path}',
-            headers={**headers, 'Content-Type': content_type},
-            data=b''  # Empty file to create placeholder
+        # Ask storage for a signed upload token (no object I/O)
+        response = upstream.post(
+            f'{SUPABASE_URL}/storage/v1/object/upload/sign/verification-docs/{file_path}',
+            headers=headers,
+            timeout=10
         )
         
-        if response.status_code in [200, 201]:
-            return jsonify({
-                "file_path": file_path,
-                "upload_url": f'{SUPABASE_URL}/storage/v1/object/verification-docs/{file_path}',
-                "public_url": f'{SUPABASE_URL}/storage/v1/object/public/verification-docs/{file_path}'
-            })
-        else:
+        if response.status_code not in [200, 201]:
             return jsonify({"error": response.text}), response.status_code
+        
+        # Response looks like {"url": "/object/upload/sign/<bucket>/<path>?token=..."}
+        signed_path = response.json().get('url', '')
+        token = signed_path.split('token=', 1)[1] if 'token=' in signed_path else None
+        if not token:
+            return jsonify({"error": "Storage did not return an upload token"}), 502
+        
+        result = {
+            "file_path": file_path,
+            "token": token,
+            "upload_url": f'{SUPABASE_URL}/storage/v1{signed_path}',
+            "upload_method": "PUT",
+            "content_type": content_type,
+            "public_url": f'{SUPABASE_URL}/storage/v1/object/public/verification-docs/{file_path}'
+        }
+        
+        # Large files go through the TUS resumable endpoint in fixed-size chunks
+        # so a slow connection doesn't time out a single multi-MB request.
+        if data.get('resumable') or file_size >= config.resumable_upload_threshold:
+            result["resumable"] = {
+                "endpoint": f'{SUPABASE_URL}/storage/v1/upload/resumable/sign',
+                "headers": {"x-signature": token},
+                # Supabase only accepts 6MB chunks on the resumable endpoint
+                "chunk_size": 6 * 1024 * 1024,
+                "metadata": {
+                    "bucketName": "verification-docs",
+                    "objectName": file_path,
+                    "contentType": content_type
+                }
+            }
+        
+        return jsonify(result)
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1071,23 +1160,23 @@ def create_verification_document():
         if not all(k in data for k in required):
             return jsonify({"error": "Missing required fields"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers(write=True)
         
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
-        
-        response = requests.post(
+        response = upstream.post(
             f'{SUPABASE_URL}/rest/v1/verification_documents',
             headers=headers,
             json=data
         )
         
         if response.status_code in [200, 201]:
+            # Render thumbnails / first-page previews off the request thread
+            document_previews.schedule_previews(
+                SUPABASE_URL,
+                config.storage_key,
+                data['file_url']
+            )
             return jsonify(response.json()[0])
         else:
             return jsonify({"error": response.text}), response.status_code
@@ -1096,35 +1185,52 @@ def create_verification_document():
         return jsonify({"error": str(e)}), 500
 
 
+def _documents_filters():
+    owner_id = request.args.get('owner_id')
+    status = request.args.get('status')
+    filters = ''
+    if owner_id:
+        filters += f'&owner_id=eq.{owner_id}'
+    if status:
+        filters += f'&status=eq.{status}'
+    return filters
+
+
 @app.route('/api/verification/documents', methods=['GET'])
+@http_cache.conditional(lambda: http_cache.table_watermark('verification_documents', _documents_filters()))
 def get_verification_documents():
     """
     Get verification documents (filtered by owner_id or status)
     Query params: ?owner_id=...&status=pending
+    ETag from the documents' count and newest updated_at; a matching If-None-Match gets 304 after a one-row read
     """
     try:
-        owner_id = request.args.get('owner_id')
-        status = request.args.get('status')
-        
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers()
         
         url = f'{SUPABASE_URL}/rest/v1/verification_documents?select=*,owner:profiles!owner_id(full_name)&order=created_at.desc'
+        url += _documents_filters()
         
-        if owner_id:
-            url += f'&owner_id=eq.{owner_id}'
-        if status:
-            url += f'&status=eq.{status}'
-        
-        response = requests.get(url, headers=headers)
+        response = upstream.get(url, headers=headers)
         
         if response.status_code == 200:
-            return jsonify(response.json())
+            documents = response.json()
+            http_cache.record_watermark(documents)
+            # Previews live at deterministic paths next to the original, in a private bucket
+            if config.service_role_configured:
+                try:
+                    urls = document_previews.preview_urls(
+                        SUPABASE_URL,
+                        config.supabase_headers('service', write=True),
+                        [doc.get('file_url') for doc in documents],
+                        config.preview_url_ttl
+                    )
+                    for doc, doc_urls in zip(documents, urls):
+                        doc.update(doc_urls)
+                except Exception as e:
+                    print(f"Error signing document previews: {str(e)}")
+            return jsonify(documents)
         else:
             return jsonify({"error": response.text}), response.status_code
             
@@ -1147,18 +1253,12 @@ def review_verification_document(doc_id):
         if not status or not admin_id or status not in ['approved', 'rejected']:
             return jsonify({"error": "Invalid status or missing admin_id"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-            'Prefer': 'return=representation'
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers(write=True)
         
         # Get document to find owner
-        doc_response = requests.get(
+        doc_response = upstream.get(
             f'{SUPABASE_URL}/rest/v1/verification_documents?id=eq.{doc_id}',
             headers=headers
         )
@@ -1176,7 +1276,7 @@ def review_verification_document(doc_id):
             'reviewed_at': 'now()'
         }
         
-        response = requests.patch(
+        response = upstream.patch(
             f'{SUPABASE_URL}/rest/v1/verification_documents?id=eq.{doc_id}',
             headers=headers,
             json=update_data
@@ -1184,7 +1284,7 @@ def review_verification_document(doc_id):
         
         # If approved, update owner's is_verified status
         if status == 'approved':
-            requests.patch(
+            upstream.patch(
                 f'{SUPABASE_URL}/rest/v1/profiles?id=eq.{document["owner_id"]}',
                 headers=headers,
                 json={'is_verified': True}
@@ -1199,7 +1299,7 @@ def review_verification_document(doc_id):
             'payload': {'document_id': doc_id}
         }
         
-        requests.post(
+        upstream.post(
             f'{SUPABASE_URL}/rest/v1/notifications',
             headers=headers,
             json=notification_data
@@ -1233,20 +1333,15 @@ def increment_metric():
         if metric not in ['views', 'inquiries', 'saves', 'clicks']:
             return jsonify({"error": "Invalid metric type"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-            'Content-Type': 'application/json',
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers(write=True)
         
         from datetime import datetime
         today = datetime.now().strftime('%Y-%m-%d')
         
         # Try to get existing record for today
-        get_response = requests.get(
+        get_response = upstream.get(
             f'{SUPABASE_URL}/rest/v1/pg_metrics?pg_id=eq.{pg_id}&date=eq.{today}',
             headers=headers
         )
@@ -1256,14 +1351,14 @@ def increment_metric():
             existing = get_response.json()[0]
             new_value = existing[metric] + 1
             
-            requests.patch(
+            upstream.patch(
                 f'{SUPABASE_URL}/rest/v1/pg_metrics?pg_id=eq.{pg_id}&date=eq.{today}',
                 headers=headers,
                 json={metric: new_value}
             )
         else:
             # Create new record
-            requests.post(
+            upstream.post(
                 f'{SUPABASE_URL}/rest/v1/pg_metrics',
                 headers={**headers, 'Prefer': 'resolution=merge-duplicates'},
                 json={
@@ -1280,11 +1375,53 @@ def increment_metric():
         return jsonify({"error": str(e)}), 500
 
 
+_OWNER_STATS_FIELDS = ('total_listings', 'total_views', 'total_inquiries', 'total_reviews', 'avg_rating',
+                       'total_available_beds', 'total_beds')
+
+
+def _owner_stats(owner_id):
+    """Lifetime totals for an owner from `owner_stats` (kept current by triggers, see CREATE_OWNER_STATS.sql)"""
+    config = settings.get()
+    response = upstream.get(
+        config.rest_url(f'owner_stats?owner_id=eq.{owner_id}&select={",".join(_OWNER_STATS_FIELDS)}'),
+        headers=config.supabase_headers(),
+        timeout=5
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch owner stats: {response.status_code} {response.text}")
+    rows = response.json()
+    stats = rows[0] if rows else {field: 0 for field in _OWNER_STATS_FIELDS}
+    # NUMERIC comes back as a string from PostgREST
+    stats['avg_rating'] = float(stats.get('avg_rating') or 0)
+    return stats
+
+
+@app.route('/api/analytics/owner-stats', methods=['GET'])
+def get_owner_stats():
+    """
+    Lifetime totals across an owner's listings (listings, views, inquiries, reviews, rating, beds)
+    Query params: ?owner_id=...
+    One row read: the totals are maintained incrementally in the database.
+    """
+    try:
+        owner_id = request.args.get('owner_id')
+        if not owner_id:
+            return jsonify({"error": "owner_id required"}), 400
+        return jsonify({"owner_id": owner_id, **_owner_stats(owner_id)})
+
+    except Exception as e:
+        print(f"Error fetching owner stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/analytics/dashboard', methods=['GET'])
+@http_cache.conditional()
 def get_analytics_dashboard():
     """
     Get analytics dashboard data
     Query params: ?owner_id=...&days=30
+    "lifetime" holds the owner's all-time totals from owner_stats (null if unavailable)
+    ETag from the response content: an unchanged dashboard is answered with 304 and no body
     """
     try:
         owner_id = request.args.get('owner_id')
@@ -1293,16 +1430,12 @@ def get_analytics_dashboard():
         if not owner_id:
             return jsonify({"error": "owner_id required"}), 400
         
-        SUPABASE_URL = os.getenv('SUPABASE_URL')
-        SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-        
-        headers = {
-            'apikey': SUPABASE_KEY,
-            'Authorization': f'Bearer {SUPABASE_KEY}',
-        }
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        headers = config.supabase_headers()
         
         # Get owner's PG listings
-        pgs_response = requests.get(
+        pgs_response = upstream.get(
             f'{SUPABASE_URL}/rest/v1/pg_listings?owner_id=eq.{owner_id}&select=id,name',
             headers=headers
         )
@@ -1313,6 +1446,12 @@ def get_analytics_dashboard():
         pgs = pgs_response.json()
         pg_ids = [pg['id'] for pg in pgs]
         
+        try:
+            lifetime = _owner_stats(owner_id)
+        except Exception as e:
+            print(f"Error fetching owner stats: {str(e)}")
+            lifetime = None
+        
         if not pg_ids:
             return jsonify({
                 "total_views": 0,
@@ -1320,7 +1459,8 @@ def get_analytics_dashboard():
                 "total_saves": 0,
                 "total_clicks": 0,
                 "daily_metrics": [],
-                "top_performing": []
+                "top_performing": [],
+                "lifetime": lifetime
             })
         
         # Get metrics for last N days
@@ -1330,7 +1470,7 @@ def get_analytics_dashboard():
         
         metrics_url = f'{SUPABASE_URL}/rest/v1/pg_metrics?pg_id=in.({",".join(pg_ids)})&date=gte.{start_date.strftime("%Y-%m-%d")}&order=date.desc'
         
-        metrics_response = requests.get(metrics_url, headers=headers)
+        metrics_response = upstream.get(metrics_url, headers=headers)
         
         if metrics_response.status_code != 200:
             return jsonify({"error": "Failed to fetch metrics"}), 500
@@ -1389,7 +1529,8 @@ def get_analytics_dashboard():
             "total_saves": total_saves,
             "total_clicks": total_clicks,
             "daily_metrics": daily_metrics,
-            "top_performing": top_performing
+            "top_performing": top_performing,
+            "lifetime": lifetime
         })
         
     except Exception as e:
@@ -1397,11 +1538,62 @@ def get_analytics_dashboard():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/analytics/export', methods=['GET'])
+def export_analytics():
+    """
+    Download the raw daily metrics of an owner's listings
+    Query params: ?owner_id=...&format=csv|ndjson|parquet&start=YYYY-MM-DD&end=YYYY-MM-DD
+    Streamed page by page (see analytics_export.py); parquet needs pyarrow on the server.
+    """
+    try:
+        owner_id = request.args.get('owner_id')
+        fmt = request.args.get('format', 'csv').lower()
+
+        if not owner_id:
+            return jsonify({"error": "owner_id required"}), 400
+        if fmt not in analytics_export.FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(analytics_export.FORMATS)}"}), 400
+        try:
+            start = analytics_export.parse_date(request.args.get('start'))
+            end = analytics_export.parse_date(request.args.get('end'))
+        except ValueError:
+            return jsonify({"error": "start and end must be dates (YYYY-MM-DD)"}), 400
+
+        listings = analytics_export.owner_listings(owner_id)
+        mimetype, extension = analytics_export.FORMATS[fmt]
+        return Response(
+            stream_with_context(analytics_export.stream(listings, fmt, start, end)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="pg_metrics_{owner_id}.{extension}"'}
+        )
+
+    except Exception as e:
+        print(f"Error exporting analytics: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def shutdown_background_work():
+    """Flush in-memory write buffers and stop background pools (graceful shutdown)."""
+    try:
+        recently_viewed_buffer.flush()
+    except Exception as e:
+        print(f"Error flushing recently viewed buffer: {str(e)}")
+    chat_sessions.store.flush()
+    document_previews.shutdown(wait=False)
+    tracing.exporter.flush()
+
+
 if __name__ == '__main__':
+    # Development server only - use `gunicorn -c gunicorn.conf.py wsgi:app` in production
     print("Starting SmartStay AI Backend...")
-    print(f"AI provider configured: {ai.is_configured()} (provider={os.getenv('AI_PROVIDER', 'groq')})")
+    print(f"AI provider configured: {ai.is_configured()} (provider={settings.get().ai_provider})")
     if ai.is_configured():
         print("✅ AI provider initialized successfully")
     else:
         print("⚠️  Warning: AI provider not configured. Set GROQ_API_KEY or GEMINI_API_KEY in .env")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    for problem in settings.get().warnings():
+        print(f"⚠️  {problem}")
+    # `kill -HUP <pid>` re-reads .env without a restart
+    settings.install_reload_signal()
+    debug = os.getenv('FLASK_DEBUG', '0') == '1'
+    app.run(debug=debug, use_reloader=debug, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
@@ -0,0 +1,65 @@
+"""Identify the Supabase user behind a request.
+
+Routes that read a user's own data take the caller's Supabase access token
+(`Authorization: Bearer <access_token>`, as supabase-js holds it) and check
+it against GoTrue's /auth/v1/user. Verified tokens are remembered for
+AUTH_TOKEN_CACHE_TTL seconds, so a dashboard's burst of reads costs one
+verification rather than one per request.
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import settings
+import upstream
+
+load_dotenv()
+
+TOKEN_CACHE_TTL = float(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_SIZE = 10000
+
+# sha256(token) -> (user_id, expires_at)
+_verified = OrderedDict()
+_lock = threading.Lock()
+
+
+class Unauthorized(Exception):
+    pass
+
+
+def bearer_token(request) -> str:
+    """The access token from an `Authorization: Bearer` header; raises Unauthorized if absent."""
+    scheme, _, token = (request.headers.get('Authorization') or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        raise Unauthorized('Authorization: Bearer <access token> required')
+    return token.strip()
+
+
+def user_id(access_token: str) -> str:
+    """The id of the user an access token belongs to; raises Unauthorized if it isn't valid."""
+    key = hashlib.sha256(access_token.encode()).hexdigest()
+    now = time.monotonic()
+    with _lock:
+        cached = _verified.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+    config = settings.get()
+    response = upstream.get(f'{config.supabase_url}/auth/v1/user', headers=config.user_headers(access_token),
+                            timeout=5)
+    if response.status_code in (401, 403):
+        raise Unauthorized('Invalid or expired access token')
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to verify access token: {response.status_code} {response.text}")
+    verified = response.json()['id']
+
+    with _lock:
+        _verified[key] = (verified, now + TOKEN_CACHE_TTL)
+        _verified.move_to_end(key)
+        while len(_verified) > TOKEN_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return verified
@@ -0,0 +1,172 @@
+"""Micro-benchmark for llm_json.parse against the per-route parsing it replaced.
+
+Builds a corpus of realistic and adversarial LLM responses from 1KB to 100KB
+(markdown fences, chatty prefixes and suffixes, braces inside strings, deep
+nesting, trailing commas, output truncated by the token limit) and reports
+mean parse time and failure rate for each parser and size. A parse fails when
+it raises or returns anything but the embedded value (for truncated output:
+a prefix of it).
+
+    python -m benchmarks.bench_llm_json
+    python -m benchmarks.bench_llm_json --sizes 1 10 100 --repeat 200
+
+tests/test_llm_json_bench.py runs the same corpus under pytest with time limits
+for llm_json.parse; this script is for the side-by-side comparison.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_json  # noqa: E402
+
+
+# ---- parsers being compared -------------------------------------------------
+
+def _strip_fences(text: str) -> str:
+    result_text = text.strip()
+    if result_text.startswith('```json'):
+        result_text = result_text[7:]
+    if result_text.startswith('```'):
+        result_text = result_text[3:]
+    if result_text.endswith('```'):
+        result_text = result_text[:-3]
+    return result_text.strip()
+
+
+def legacy_fence_strip(text: str):
+    """sentiment_analysis / chatbot_support before llm_json."""
+    return json.loads(_strip_fences(text))
+
+
+def legacy_find_rfind(text: str):
+    """detect_hidden_charges before llm_json."""
+    result_text = _strip_fences(text)
+    if '{' in result_text and '}' in result_text:
+        result_text = result_text[result_text.find('{'):result_text.rfind('}') + 1]
+    return json.loads(result_text)
+
+
+def legacy_greedy_regex(text: str):
+    """personalized_recommendations before llm_json."""
+    result_text = _strip_fences(text)
+    try:
+        return json.loads(result_text)
+    except json.JSONDecodeError:
+        match = re.search(r'\{[\s\S]*\}', result_text)
+        if not match:
+            raise
+        return json.loads(match.group())
+
+
+PARSERS = {
+    'llm_json.parse': llm_json.parse,
+    'legacy fence strip': legacy_fence_strip,
+    'legacy find/rfind': legacy_find_rfind,
+    'legacy greedy regex': legacy_greedy_regex,
+}
+
+
+# ---- corpus -------------------------------------------------------------------
+
+def _payload(size_bytes: int, rng: random.Random) -> dict:
+    recs = []
+    while len(json.dumps({'recommendations': recs})) < size_bytes:
+        recs.append({
+            'pg_id': f'{rng.randrange(1 << 32):08x}',
+            'match_score': rng.randint(40, 99),
+            'match_reasons': ['Within budget', 'Has Wi-Fi {fast}', 'Near "college" gate', 'Meals: veg/non-veg'],
+            'notes': {'electricity': 'extra, billed [monthly]', 'deposit': '2 months'},
+        })
+    return {'recommendations': recs}
+
+
+def build_corpus(size_kb: int, seed: int = 11) -> list:
+    """[(shape, response text, embedded value, whether the response is truncated)]"""
+    rng = random.Random(seed + size_kb)
+    payload = _payload(size_kb * 1024, rng)
+    body = json.dumps(payload, indent=2)
+    deep = {'level': 0}
+    node = deep
+    for i in range(1, 200):
+        node['child'] = {'level': i, 'text': 'nested } ] { ['}
+        node = node['child']
+    deep_payload = {'deep': deep, 'pad': 'x' * (size_kb * 1024)}
+    deep_body = json.dumps(deep_payload)
+    return [
+        ('clean', body, payload, False),
+        ('fenced', f'```json\n{body}\n```', payload, False),
+        ('prefixed', f"Here's the analysis:\n{body}", payload, False),
+        ('suffixed', f'{body}\n\nLet me know if you need anything else! {{happy to help}}', payload, False),
+        ('prose braces first', f'Scores use the format {{score}} out of 100.\n{body}', payload, False),
+        ('deep nesting', deep_body, deep_payload, False),
+        ('trailing commas', re.sub(r'(\}|\])(\s*)(\]|\})', r'\1,\2\3', body), payload, False),
+        ('truncated', body[: int(len(body) * 0.9)], payload, True),
+        ('truncated in string', body[: body.rfind('Near \\"') + 9], payload, True),
+    ]
+
+
+def is_prefix(value, full) -> bool:
+    """Whether `value` is `full` cut short: containers may miss trailing items."""
+    if isinstance(full, dict):
+        return isinstance(value, dict) and all(key in full and is_prefix(item, full[key])
+                                               for key, item in value.items())
+    if isinstance(full, list):
+        return (isinstance(value, list) and len(value) <= len(full)
+                and all(is_prefix(item, expected) for item, expected in zip(value, full)))
+    return value == full
+
+
+def correct(value, expected, truncated: bool) -> bool:
+    if not truncated:
+        return value == expected
+    # Salvaged output must keep the complete elements, not just the outer brackets
+    return is_prefix(value, expected) and len(value.get('recommendations', [])) > 1
+
+
+# ---- runner -------------------------------------------------------------------
+
+def bench(parser, text: str, expected, truncated: bool, repeat: int):
+    try:
+        ok = correct(parser(text), expected, truncated)
+    except (ValueError, RecursionError):
+        ok = False
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parser(text)
+        except (ValueError, RecursionError):
+            pass
+    return ok, (time.perf_counter() - start) / repeat
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100], help='Payload sizes in KB')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        corpus = build_corpus(size)
+        print(f'\n== {size}KB responses ({len(corpus)} shapes) ==')
+        print(f"{'parser':<22}{'mean us':>12}{'failures':>12}   failed shapes")
+        for name, fn in PARSERS.items():
+            total = 0.0
+            failed = []
+            for shape, text, expected, truncated in corpus:
+                ok, elapsed = bench(fn, text, expected, truncated, args.repeat)
+                total += elapsed
+                if not ok:
+                    failed.append(shape)
+            mean_us = total / len(corpus) * 1e6
+            print(f'{name:<22}{mean_us:>12.1f}{len(failed):>8}/{len(corpus):<3}   {", ".join(failed)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Benchmark for the price-drop alert evaluator (price_alerts.PriceAlertEvaluator).
+
+Simulates a city-wide price update: every listing in one city (default 5000
+of 20000 listings) cuts its rent by 5-20%, queueing one rent change event
+each, while users hold alerts on listings across all cities. The evaluator
+drains the queue against in-memory tables that charge --rtt seconds per
+Supabase round trip, and the benchmark reports time spent building the
+alert book, evaluating events, and in round trips, next to the round trips
+a per-event lookup would need.
+
+    python -m benchmarks.bench_price_alerts
+    python -m benchmarks.bench_price_alerts --listings 50000 --alerts 200000 --rtt 0.05
+"""
+from bisect import bisect_right
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import price_alerts  # noqa: E402
+from benchmarks.bench_search import CITIES, make_listing  # noqa: E402
+
+
+class SimulatedEvaluator(price_alerts.PriceAlertEvaluator):
+    """Evaluator whose Supabase calls hit in-memory tables, each costing one round trip."""
+
+    def __init__(self, alerts: list, events: list, rtt: float, **kwargs):
+        super().__init__(**kwargs)
+        self.rtt = rtt
+        self.round_trips = 0
+        self.rpc_rows = 0
+        self.alerts = {alert['id']: alert for alert in alerts}
+        self.alert_keys = sorted((alert['updated_at'], alert['id']) for alert in alerts)
+        self.events = events
+        self.listing_owners = {event['pg_id']: event['owner_id'] for event in events}
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def _get(self, path: str) -> list:
+        self._round_trip()
+        if path.startswith('rent_change_events'):
+            return self.events[:price_alerts.PAGE_SIZE]
+        start = 0 if self._cursor is None else bisect_right(self.alert_keys, self._cursor)
+        rows = []
+        for key in self.alert_keys[start:]:
+            alert = self.alerts[key[1]]
+            if self._cursor is None and (not alert['is_enabled'] or alert['triggered_at']):
+                continue
+            rows.append(dict(alert))
+            if len(rows) == price_alerts.PAGE_SIZE:
+                break
+        return rows
+
+    def _fire(self, matches: list) -> int:
+        self._round_trip()
+        self.rpc_rows += len(matches)
+        fired = 0
+        for match in matches:
+            alert = self.alerts[match['alert_id']]
+            if (alert['is_enabled'] and not alert['triggered_at'] and match['new_rent'] <= alert['target_price']
+                    and alert['user_id'] != self.listing_owners.get(match['pg_id'])):
+                alert['triggered_at'] = 'now'
+                fired += 1
+        return fired
+
+    def _ack(self, event_ids: list):
+        for _ in range(0, len(event_ids), price_alerts.ACK_BATCH):
+            self._round_trip()
+        handled = set(event_ids)
+        self.events = [event for event in self.events if event['id'] not in handled]
+
+
+def make_alerts(listings: list, count: int, rng: random.Random) -> list:
+    alerts = []
+    for i in range(count):
+        pg = rng.choice(listings)
+        alerts.append({
+            'id': f'{i:08d}-0000-0000-0000-00000000a1e7',
+            'user_id': f'{rng.randrange(count // 2 + 1):08d}-0000-0000-0000-000000000001',
+            'pg_id': pg['id'],
+            # Most targets sit a little under the current rent
+            'target_price': int(pg['rent'] * rng.uniform(0.7, 1.0)),
+            'is_enabled': rng.random() < 0.9,
+            'triggered_at': None,
+            'updated_at': f'2026-01-{1 + i % 28:02d}T00:00:00+00:00',
+        })
+    return alerts
+
+
+def city_wide_update(listings: list, city: str, rng: random.Random) -> list:
+    events = []
+    for pg in listings:
+        if pg['address']['city'] != city:
+            continue
+        new_rent = int(pg['rent'] * (1 - rng.uniform(0.05, 0.2)))
+        events.append({'id': len(events) + 1, 'pg_id': pg['id'], 'owner_id': pg['owner_id'], 'name': pg['name'],
+                       'old_rent': pg['rent'], 'new_rent': new_rent})
+    return events
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=20_000)
+    parser.add_argument('--alerts', type=int, default=100_000)
+    parser.add_argument('--cities', type=int, default=4, help='listings are spread over this many cities')
+    parser.add_argument('--rtt', type=float, default=0.02, help='seconds per Supabase round trip')
+    parser.add_argument('--fire-batch', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(11)
+    cities = CITIES[:args.cities]
+    listings = []
+    for i in range(args.listings):
+        pg = make_listing(i, rng)
+        pg['address']['city'] = cities[i % len(cities)]
+        pg['owner_id'] = f'{i % 2000:08d}-0000-0000-0000-00000000000f'
+        listings.append(pg)
+    alerts = make_alerts(listings, args.alerts, rng)
+    events = city_wide_update(listings, cities[0], rng)
+    print(f'{len(listings)} listings, {len(alerts)} alerts, city-wide update of {len(events)} listings '
+          f'in {cities[0]}, {args.rtt * 1000:.0f} ms per round trip')
+
+    evaluator = SimulatedEvaluator(alerts, events, args.rtt, fire_batch=args.fire_batch)
+    start = time.perf_counter()
+    evaluator.refresh_alerts()
+    load_time = time.perf_counter() - start
+    load_trips = evaluator.round_trips
+    print(f'Alert book: {len(evaluator.book)} armed alerts loaded in {load_time:.2f}s ({load_trips} round trips)')
+
+    # Pure evaluation cost: match every event against the book without firing
+    start = time.perf_counter()
+    matches = evaluator.evaluate(events)
+    evaluate_time = time.perf_counter() - start
+    print(f'Evaluate: {len(events)} events -> {len(matches)} matches in {evaluate_time * 1000:.1f} ms '
+          f'({evaluate_time / max(1, len(events)) * 1e6:.1f} us/event)')
+
+    evaluator.round_trips = 0
+    start = time.perf_counter()
+    counts = evaluator.run_once()
+    pass_time = time.perf_counter() - start
+    print(f'Pass: {counts["events"]} events, {counts["fired"]} alerts fired in {pass_time:.2f}s '
+          f'({evaluator.round_trips} round trips, {evaluator.rpc_rows} alerts sent to the RPC)')
+    print(f'Per-event lookup and update would need >= {2 * len(events)} round trips '
+          f'(~{2 * len(events) * args.rtt:.1f}s at this latency)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Micro-benchmark for the in-memory search index (search_index.FacetIndex).
+
+Builds a synthetic catalog (default 100k listings) and reports build time,
+incremental update cost and per-query latency for a mix of selective and
+broad queries, with and without facet counts.
+
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --listings 20000 --repeat 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import FacetIndex  # noqa: E402
+
+CITIES = ['Pune', 'Bangalore', 'Delhi', 'Mumbai', 'Hyderabad', 'Chennai', 'Kolkata', 'Noida', 'Indore', 'Jaipur']
+AMENITIES = ['Wi-Fi', 'Food', 'Hot Water', 'Laundry', 'AC', 'Parking', 'Gym', 'Power Backup',
+             'Housekeeping', 'CCTV', 'Study Room', 'Refrigerator', 'TV', 'Geyser', 'Lift']
+
+
+def make_listing(i: int, rng: random.Random) -> dict:
+    city = rng.choice(CITIES)
+    return {
+        'id': f'{i:08d}-0000-0000-0000-000000000000',
+        'name': f'PG {i}',
+        'address': {'city': city, 'area': f'{city} Area {rng.randrange(40)}'},
+        'gender': rng.choice(['boys', 'girls', 'any']),
+        'room_type': rng.choice(['single', 'double', 'triple', 'quad']),
+        'rent': rng.randrange(3000, 25000, 50),
+        'amenities': rng.sample(AMENITIES, rng.randrange(2, 9)),
+        'images': [],
+        'is_available': rng.random() < 0.7,
+        'available_beds': rng.randrange(0, 6),
+        'is_verified': rng.random() < 0.4,
+        'average_rating': round(rng.uniform(1, 5), 2),
+        'total_reviews': rng.randrange(200),
+        'created_at': f'2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}T00:00:00+00:00',
+    }
+
+
+QUERIES = {
+    'city + gender + rent': dict(city='Pune', gender=['boys', 'any'], min_rent=6000, max_rent=12000),
+    'city + area + amenities': dict(city='Bangalore', area='Bangalore Area 7', amenities=['Wi-Fi', 'Food']),
+    'rent range only (broad)': dict(min_rent=5000, max_rent=20000, sort='rent_asc'),
+    'everything, page 50': dict(offset=49 * 20),
+    'available + verified, newest': dict(available=True, verified=True, sort='newest'),
+    'no match': dict(city='Atlantis'),
+}
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(5)
+    listings = [make_listing(i, rng) for i in range(args.listings)]
+
+    index = FacetIndex()
+    start = time.perf_counter()
+    index.build(listings)
+    index.rebuild_derived()
+    print(f'Built index of {len(index)} listings in {time.perf_counter() - start:.2f}s')
+
+    updates = [dict(listings[rng.randrange(len(listings))], rent=rng.randrange(3000, 25000)) for _ in range(100)]
+    start = time.perf_counter()
+    for row in updates:
+        index.upsert(row)
+    upsert_ms = (time.perf_counter() - start) / len(updates) * 1000
+    start = time.perf_counter()
+    index.rebuild_derived()
+    print(f'Incremental upsert: {upsert_ms:.3f} ms/row, derived rebuild: '
+          f'{(time.perf_counter() - start) * 1000:.0f} ms per refresh batch\n')
+
+    print(f"{'query':<32}{'results':>9}{'p50 ms':>9}{'p99 ms':>9}{'+facets p50':>13}")
+    for name, query in QUERIES.items():
+        total = index.search(facets=False, **query)['total']
+        plain = timed(lambda: index.search(facets=False, **query), args.repeat)
+        faceted = timed(lambda: index.search(facets=True, **query), args.repeat)
+        print(f'{name:<32}{total:>9}{statistics.median(plain) * 1000:>9.3f}'
+              f'{plain[int(len(plain) * 0.99) - 1] * 1000:>9.3f}{statistics.median(faceted) * 1000:>13.3f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
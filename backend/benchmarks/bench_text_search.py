@@ -0,0 +1,116 @@
+"""Benchmark for the in-process text search (text_search.TextIndex).
+
+Builds a synthetic catalog, then reports index build time, snapshot write
+and map times (what a new worker pays instead of a full load) and per-query
+latency for exact, misspelled and prefix queries.
+
+With --postgres, the same queries are also sent to the `search_pgs_fulltext`
+RPC from Extra_sql/OPTIONAL_IMPROVEMENTS.sql on the Supabase project in
+.env, for comparison with the Postgres full-text path (latency there
+includes the network round trip, which is what the API would pay too).
+
+    python -m benchmarks.bench_text_search
+    python -m benchmarks.bench_text_search --listings 20000 --postgres
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_search import make_listing  # noqa: E402
+import text_search  # noqa: E402
+
+AREAS = ['Koramangala', 'Indiranagar', 'Whitefield', 'HSR Layout', 'Marathahalli', 'Electronic City',
+         'Kothrud', 'Hinjewadi', 'Viman Nagar', 'Baner', 'Andheri', 'Powai', 'Karol Bagh', 'Laxmi Nagar']
+WORDS = ['spacious', 'clean', 'homely', 'food', 'wifi', 'metro', 'college', 'quiet', 'furnished',
+         'balcony', 'laundry', 'security', 'girls', 'boys', 'students', 'working', 'professionals']
+
+QUERIES = {
+    'exact area': 'Koramangala',
+    'area + words': 'Whitefield furnished balcony',
+    'typo': 'koramangla',
+    'typos': 'indranagar homley',
+    'prefix (typeahead)': 'marath',
+    'common word': 'clean',
+}
+
+
+def make_document(i: int, rng: random.Random) -> dict:
+    listing = make_listing(i, rng)
+    area = rng.choice(AREAS)
+    listing['address']['area'] = area
+    listing['name'] = f"{rng.choice(['Sai', 'Shree', 'Green', 'Royal', 'Sunrise'])} {rng.choice(['Residency', 'Comforts', 'Homes', 'Stay'])}"
+    listing['description'] = f"{' '.join(rng.sample(WORDS, 8))} PG in {area}, near {rng.choice(AREAS)}."
+    return listing
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples
+
+
+def postgres_search(query: str):
+    import settings
+    import upstream
+
+    config = settings.get()
+    response = upstream.post(
+        config.rest_url('rpc/search_pgs_fulltext'),
+        headers=config.supabase_headers(write=True),
+        json={'search_query': query},
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--listings', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--postgres', action='store_true', help='also time search_pgs_fulltext on Supabase')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(11)
+    documents = [make_document(i, rng) for i in range(args.listings)]
+
+    index = text_search.TextIndex()
+    start = time.perf_counter()
+    for doc in documents:
+        index.add(doc)
+    print(f'Indexed {len(index)} listings in {time.perf_counter() - start:.2f}s')
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.idx')
+    start = time.perf_counter()
+    text_search.write_snapshot(path, index)
+    print(f'Snapshot written in {time.perf_counter() - start:.2f}s ({os.path.getsize(path) / 1e6:.1f} MB)')
+    start = time.perf_counter()
+    mapped, _ = text_search.read_snapshot(path)
+    print(f'Snapshot mapped in {(time.perf_counter() - start) * 1000:.0f} ms\n')
+
+    header = f"{'query':<22}{'matches':>9}{'memory p50':>12}{'mapped p50':>12}"
+    print(header + (f"{'postgres p50':>14}" if args.postgres else ''))
+    for name, query in QUERIES.items():
+        matches = len(index.search(query))
+        memory = statistics.median(timed(lambda: index.search(query), args.repeat)) * 1000
+        on_disk = statistics.median(timed(lambda: mapped.search(query), args.repeat)) * 1000
+        line = f'{name:<22}{matches:>9}{memory:>10.2f}ms{on_disk:>10.2f}ms'
+        if args.postgres:
+            postgres = statistics.median(timed(lambda: postgres_search(query), min(args.repeat, 20))) * 1000
+            line += f'{postgres:>12.2f}ms'
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
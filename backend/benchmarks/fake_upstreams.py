@@ -0,0 +1,316 @@
+"""Local stand-ins for Groq, OpenRouteService and Supabase used by the benchmarks.
+
+One threaded HTTP server answers all three APIs on different path prefixes:
+
+    POST /openai/v1/chat/completions      Groq chat completions (OpenAI format)
+    GET  /geocode/search                  OpenRouteService geocoding
+    POST /v2/directions/<profile>         OpenRouteService directions
+    *    /rest/v1/<table>, /rest/v1/rpc/* Supabase PostgREST
+    GET  /auth/v1/user                    Supabase Auth (the bearer token is the user id)
+    POST /storage/v1/object/upload/sign/* Supabase Storage signing
+    POST /storage/v1/object/sign/<bucket>  Supabase Storage batch download signing
+
+Latency and error rates are configurable per upstream so benchmarks can
+reproduce slow or flaky providers. Responses are canned but shaped like the
+real APIs, enough for every route in app.py to take its normal code path.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+UPSTREAMS = ('groq', 'ors', 'supabase')
+
+
+def _listing(i: int) -> dict:
+    cities = ['Pune', 'Bangalore', 'Delhi', 'Mumbai']
+    areas = ['Kothrud', 'Koramangala', 'Karol Bagh', 'Andheri', 'Hinjewadi', 'Viman Nagar']
+    amenities = ['Wi-Fi', 'Food', 'Hot Water', 'Laundry', 'AC', 'Parking', 'Gym', 'Power Backup']
+    return {
+        'id': str(uuid.UUID(int=i + 1)),
+        'owner_id': str(uuid.UUID(int=10_000 + i % 50)),
+        'name': f'Sunrise PG {i}',
+        'description': f'Comfortable PG number {i} close to college with friendly staff and clean rooms.',
+        'address': {'area': areas[i % len(areas)], 'city': cities[i % len(cities)]},
+        'latitude': 18.5 + (i % 100) * 0.001,
+        'longitude': 73.8 + (i % 97) * 0.001,
+        'gender': ['boys', 'girls', 'any'][i % 3],
+        'room_type': ['single', 'double', 'triple', 'quad'][i % 4],
+        'rent': 4000 + (i * 137) % 12000,
+        'deposit': 10000,
+        'amenities': [a for j, a in enumerate(amenities) if (i >> j) & 1],
+        'images': [],
+        'is_available': i % 5 != 0,
+        'available_beds': i % 4,
+        'is_verified': i % 3 == 0,
+        'status': 'active',
+        'average_rating': round(3 + (i % 20) / 10, 1),
+        'total_reviews': i % 40,
+        'created_at': f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00+00:00',
+        'updated_at': '2026-01-01T00:00:00+00:00',
+    }
+
+
+LLM_RESPONSES = {
+    'sentiment': {
+        'overall_sentiment': 'positive', 'positive_count': 3, 'negative_count': 1, 'neutral_count': 1,
+        'insights': 'Residents like the food and cleanliness; Wi-Fi is occasionally slow.',
+        'keywords': {'positive': ['clean', 'food', 'staff'], 'negative': ['wifi', 'noise', 'water']},
+    },
+    'hidden_charges': {
+        'risk_level': 'low',
+        'potential_hidden_charges': [{'charge': 'Electricity', 'reason': 'Not stated whether included'}],
+        'missing_information': ['Electricity billing'],
+        'questions_to_ask': ['Is electricity included?', 'Is there a maintenance fee?', 'Is food included?'],
+        'transparency_score': 72,
+    },
+    'recommendations': {
+        'recommendations': [
+            {'pg_id': str(uuid.UUID(int=i + 1)), 'match_score': 90 - i * 5, 'match_reasons': ['Within budget', 'Has Wi-Fi']}
+            for i in range(5)
+        ],
+    },
+    'chatbot': {
+        'response': 'You can search PGs from the home page and filter by budget, gender and amenities.',
+        'suggested_actions': ['Search PGs', 'View Dashboard'],
+    },
+}
+
+
+def _llm_content(prompt: str) -> str:
+    # Chatbot first: its prompt mentions the other features by name
+    if 'SmartStay Assistant' in prompt:
+        return json.dumps(LLM_RESPONSES['chatbot'])
+    if 'sentiment analysis' in prompt:
+        return json.dumps(LLM_RESPONSES['sentiment'])
+    if 'hidden charges' in prompt:
+        return '```json\n' + json.dumps(LLM_RESPONSES['hidden_charges']) + '\n```'
+    if 'personalized recommendations' in prompt:
+        return json.dumps(LLM_RESPONSES['recommendations'])
+    return 'A bright, well-kept PG in a quiet lane, a short walk from college, with Wi-Fi, meals and daily cleaning.'
+
+
+class FakeUpstreams:
+    """Threaded fake server. Use as a context manager or call start()/stop()."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, jitter=0.2, error_rate=None, listings=200, seed=7):
+        self.latency = {name: 0.0 for name in UPSTREAMS}
+        self.latency.update(latency or {})
+        self.error_rate = {name: 0.0 for name in UPSTREAMS}
+        self.error_rate.update(error_rate or {})
+        self.jitter = jitter
+        self.listings = [_listing(i) for i in range(listings)]
+        self.requests = {name: 0 for name in UPSTREAMS}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self) -> dict:
+        """Environment variables that point the backend at this server."""
+        return {
+            'GROQ_API_KEY': 'fake-groq-key',
+            'GROQ_BASE_URL': self.url,
+            'OPENROUTE_API_KEY': 'fake-ors-key',
+            'OPENROUTE_BASE_URL': self.url,
+            'SUPABASE_URL': self.url,
+            'SUPABASE_ANON_KEY': 'fake-anon-key',
+            'SUPABASE_SERVICE_ROLE_KEY': 'fake-service-key',
+            # Benchmarks measure the backend, not the free-tier quotas
+            'GROQ_RATE_LIMIT_RPM': '1000000',
+            'OPENROUTE_RATE_LIMIT_RPM': '1000000',
+            # Never leave fake listings where a real dev server would pick them up
+            'SEARCH_INDEX_SNAPSHOT': '',
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-upstreams', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay_and_fail(self, upstream: str) -> bool:
+        """Sleep for the configured latency; return True if this call should fail."""
+        with self._lock:
+            self.requests[upstream] += 1
+            base = self.latency[upstream]
+            delay = base * (1 + self._random.uniform(-self.jitter, self.jitter)) if base else 0
+            fail = self._random.random() < self.error_rate[upstream]
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    # ---- handlers -------------------------------------------------------
+
+    def _groq(self, body: dict):
+        prompt = body['messages'][-1]['content']
+        content = _llm_content(prompt)
+        return 200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex[:12]}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': len(prompt) // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': (len(prompt) + len(content)) // 4,
+            },
+        }
+
+    def _ors(self, method: str, path: str):
+        if path.startswith('/geocode/'):
+            return 200, {'features': [{'geometry': {'coordinates': [73.85 + self._random.random() / 50, 18.52]}}]}
+        return 200, {'routes': [{'summary': {'duration': 600 + self._random.randint(0, 900), 'distance': 2500}}]}
+
+    def _supabase(self, method: str, path: str, query: dict, body):
+        if path.startswith('/storage/v1/object/upload/sign/'):
+            object_path = path.split('/upload/sign/', 1)[1]
+            return 200, {'url': f'/object/upload/sign/{object_path}?token=fake-{uuid.uuid4().hex[:8]}'}
+        if path.startswith('/storage/v1/object/sign/'):
+            bucket = path.rsplit('/', 1)[1]
+            return 200, [{'path': object_path, 'error': None,
+                          'signedURL': f'/object/sign/{bucket}/{object_path}?token=fake-{uuid.uuid4().hex[:8]}'}
+                         for object_path in body['paths']]
+        if path.startswith('/storage/'):
+            return 200, {'Key': path}
+        if path.startswith('/rest/v1/rpc/'):
+            return 200, 0
+
+        table = path[len('/rest/v1/'):]
+        if method == 'GET':
+            return 200, self._select(table, query)
+        if method == 'POST':
+            rows = body if isinstance(body, list) else [body]
+            return 201, [{'id': str(uuid.uuid4()), **(row or {})} for row in rows]
+        if method == 'PATCH':
+            return 200, []
+        return 204, None
+
+    def _select(self, table: str, query: dict) -> list:
+        limit = int(query.get('limit', ['1000'])[0])
+        if table == 'pg_listings':
+            return self.listings[:limit]
+        if table == 'pg_metrics':
+            # 30 days for each of 10 listings, in primary key order
+            rows = [
+                {'pg_id': self.listings[i // 30]['id'], 'date': f'2026-01-{1 + i % 30:02d}',
+                 'views': i % 50, 'inquiries': i % 7, 'saves': i % 5, 'clicks': i % 11}
+                for i in range(300)
+            ]
+            # Keyset paging as sent by analytics_export: or=(pg_id.gt.X,and(pg_id.eq.X,date.gt.D))
+            cursor = re.match(r'\(pg_id\.gt\.([^,]+),and\(pg_id\.eq\.[^,]+,date\.gt\.([^)]+)\)\)',
+                              query.get('or', [''])[0])
+            if cursor:
+                rows = [row for row in rows if (row['pg_id'], row['date']) > cursor.groups()]
+            return rows[:limit]
+        if table == 'content_reports':
+            return [
+                {'id': str(uuid.UUID(int=i + 1)), 'reporter_id': str(uuid.UUID(int=99)), 'content_type': 'listing',
+                 'content_id': self.listings[i]['id'], 'reason': 'spam', 'status': 'pending',
+                 'created_at': '2026-01-01T00:00:00+00:00', 'updated_at': '2026-01-01T00:00:00+00:00',
+                 'reporter': {'full_name': 'Test User'}}
+                for i in range(min(limit, 50))
+            ]
+        if table == 'verification_documents':
+            return [
+                {'id': str(uuid.UUID(int=i + 1)), 'owner_id': str(uuid.UUID(int=10_000)), 'document_type': 'trade_license',
+                 'file_url': f'{self.url}/storage/v1/object/public/verification-docs/verification/o/{i}.pdf',
+                 'file_name': f'{i}.pdf', 'status': 'pending', 'created_at': '2026-01-01T00:00:00+00:00',
+                 'updated_at': '2026-01-01T00:00:00+00:00',
+                 'owner': {'full_name': 'Owner'}}
+                for i in range(min(limit, 50))
+            ]
+        if table == 'owner_stats':
+            return [{'total_listings': 10, 'total_views': 4200, 'total_inquiries': 310, 'total_reviews': 85,
+                     'avg_rating': '4.12', 'total_available_beds': 23, 'total_beds': 140}]
+        if table == 'recently_viewed':
+            return [
+                {'pg_id': pg['id'], 'viewed_at': f'2026-01-01T00:00:{i:02d}+00:00', 'pg': pg}
+                for i, pg in enumerate(self.listings[:min(limit, 20)])
+            ]
+        return []
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw and 'json' in (self.headers.get('Content-Type') or '') else None
+                except ValueError:
+                    body = None
+
+                if parts.path.startswith('/openai/'):
+                    upstream = 'groq'
+                elif parts.path.startswith(('/geocode/', '/v2/directions/')):
+                    upstream = 'ors'
+                else:
+                    upstream = 'supabase'
+
+                if fake._delay_and_fail(upstream):
+                    status, payload = (429 if upstream == 'groq' else 503), {'error': 'injected failure'}
+                elif upstream == 'groq':
+                    status, payload = fake._groq(body or {})
+                elif upstream == 'ors':
+                    status, payload = fake._ors(self.command, parts.path)
+                elif parts.path == '/auth/v1/user':
+                    token = (self.headers.get('Authorization') or '').partition(' ')[2]
+                    status, payload = (200, {'id': token}) if token else (401, {'msg': 'missing token'})
+                else:
+                    status, payload = fake._supabase(self.command, parts.path, parse_qs(parts.query), body)
+
+                data = b'' if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if upstream == 'supabase' and 'count=exact' in (self.headers.get('Prefer') or ''):
+                    query = {key: value for key, value in parse_qs(parts.query).items() if key != 'limit'}
+                    total = len(fake._select(parts.path[len('/rest/v1/'):], query))
+                    self.send_header('Content-Range', f'0-{len(payload) - 1}/{total}' if payload else '*/0')
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the fake upstream servers standalone')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    with FakeUpstreams(port=args.port) as fake:
+        print(f'Fake upstreams listening on {fake.url}')
+        for key, value in fake.env().items():
+            print(f'{key}={value}')
+        threading.Event().wait()
@@ -0,0 +1,264 @@
+"""Load and latency benchmark for every backend route.
+
+Starts the fake upstreams (benchmarks/fake_upstreams.py), points the backend
+at them through environment variables, serves app.py on a local threaded
+server (or targets an already running server with --target) and drives each
+route at a fixed concurrency. Reports throughput and p50/p95/p99 latency.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+    python -m benchmarks.load_test --groq-latency 0.8 --groq-errors 0.05 --only ai
+    python -m benchmarks.load_test --json results.json --baseline previous.json
+
+With --baseline, the run fails (exit code 1) when any route's p95 regresses
+by more than --max-regression.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.fake_upstreams import FakeUpstreams
+
+PG_ID = '00000000-0000-0000-0000-000000000001'
+OWNER_ID = '00000000-0000-0000-0000-000000002710'
+USER_ID = '00000000-0000-0000-0000-000000000063'
+
+REVIEWS = [
+    {'review_text': 'Clean rooms and the food is great. Owner is helpful.'},
+    {'review_text': 'Wi-Fi drops every evening and water is cold in winter.'},
+    {'review_text': 'Average place, decent for the price, a bit noisy.'},
+]
+
+# (name, group, method, path, json body or None)
+SCENARIOS = [
+    ('health', 'core', 'GET', '/health', None),
+    ('metrics', 'core', 'GET', '/metrics', None),
+    ('sentiment', 'ai', 'POST', '/api/ai/sentiment-analysis', {'reviews': REVIEWS, 'pg_name': 'Sunrise PG', 'pg_id': PG_ID}),
+    ('hidden_charges', 'ai', 'POST', '/api/ai/hidden-charges', {
+        'pg_id': PG_ID,
+        'description': 'Spacious rooms close to campus, meals included, housekeeping twice a week.',
+        'rent': 8500, 'deposit': 10000, 'amenities': ['Wi-Fi', 'Food', 'Hot Water'],
+        'rules': 'No guests after 10pm', 'maintenanceCharges': '', 'electricityCharges': '', 'foodIncluded': True,
+    }),
+    ('travel_time', 'ai', 'POST', '/api/ai/travel-time', {
+        'from_address': 'Kothrud, Pune, Maharashtra', 'to_address': 'College Road, Pune, Maharashtra',
+    }),
+    ('generate_description', 'ai', 'POST', '/api/ai/generate-description', {
+        'amenities': ['Wi-Fi', 'Food'], 'location': 'Kothrud, Pune', 'rent': 8500, 'room_type': 'double',
+    }),
+    ('recommendations', 'ai', 'POST', '/api/ai/personalized-recommendations', {
+        'user_preferences': {'budget': {'min': 5000, 'max': 12000}, 'college': 'VIT Pune', 'amenities': ['Wi-Fi']},
+        'available_pgs': [
+            {'id': str(i), 'name': f'PG {i}', 'rent': 5000 + i * 100, 'amenities': ['Wi-Fi'], 'address': {'area': 'Kothrud'}}
+            for i in range(30)
+        ],
+        'user_history': {},
+    }),
+    ('chatbot', 'ai', 'POST', '/api/ai/chatbot', {
+        'message': 'How do I post my PG?', 'chat_history': [], 'context': {'current_page': 'home', 'user_role': 'owner'},
+    }),
+    ('chatbot_novel', 'ai', 'POST', '/api/ai/chatbot', {
+        'message': 'Can I pay my rent online through the app?', 'chat_history': [],
+        'context': {'current_page': '/search', 'user_role': 'user'},
+    }),
+    ('recently_viewed_add', 'db', 'POST', '/api/recently-viewed', {'user_id': USER_ID, 'pg_id': PG_ID}),
+    ('recently_viewed_list', 'db', 'GET', f'/api/recently-viewed?user_id={USER_ID}', None),
+    ('search', 'db', 'GET', '/api/search?city=Pune&gender=boys,any&min_rent=5000&max_rent=12000&amenities=Wi-Fi', None),
+    ('text_search', 'db', 'GET', '/api/search?q=koramangla%20clean&gender=boys,any', None),
+    ('nearby_radius', 'db', 'GET', '/api/nearby?lat=18.55&lng=73.85&radius_km=3&gender=boys,any', None),
+    ('nearby_college', 'db', 'GET', '/api/nearby?college=COEP%20Pune&k=10&available=true', None),
+    ('reports_list', 'db', 'GET', '/api/reports?status=pending', None),
+    ('reports_create', 'db', 'POST', '/api/reports', {
+        'reporter_id': USER_ID, 'content_type': 'listing', 'content_id': PG_ID, 'reason': 'spam',
+    }),
+    ('reports_review', 'db', 'POST', f'/api/reports/{PG_ID}/review', {
+        'admin_id': USER_ID, 'action': 'dismiss', 'resolution_notes': 'ok',
+    }),
+    ('upload_url', 'db', 'POST', '/api/verification/upload-url', {
+        'owner_id': OWNER_ID, 'file_name': 'license.pdf', 'content_type': 'application/pdf',
+    }),
+    ('documents_create', 'db', 'POST', '/api/verification/documents', {
+        'owner_id': OWNER_ID, 'document_type': 'trade_license', 'file_url': 'https://example.invalid/license.pdf',
+    }),
+    ('documents_list', 'db', 'GET', '/api/verification/documents?status=pending', None),
+    ('documents_review', 'db', 'POST', f'/api/verification/documents/{PG_ID}/review', {
+        'admin_id': USER_ID, 'status': 'rejected', 'review_notes': 'blurry',
+    }),
+    ('analytics_increment', 'db', 'POST', '/api/analytics/increment', {'pg_id': PG_ID, 'metric': 'views'}),
+    ('analytics_dashboard', 'db', 'GET', f'/api/analytics/dashboard?owner_id={OWNER_ID}&days=30', None),
+    ('owner_stats', 'db', 'GET', f'/api/analytics/owner-stats?owner_id={OWNER_ID}', None),
+    ('analytics_export', 'db', 'GET', f'/api/analytics/export?owner_id={OWNER_ID}&format=csv', None),
+]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# Extra request headers by scenario; the fake auth server takes the bearer token as the user id
+HEADERS = {
+    'recently_viewed_list': {'Authorization': f'Bearer {USER_ID}'},
+    'upload_url': {'Authorization': f'Bearer {OWNER_ID}'},
+}
+
+
+def run_scenario(base_url: str, scenario: tuple, total: int, concurrency: int) -> dict:
+    name, group, method, path, body = scenario
+    headers = HEADERS.get(name)
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=body, headers=headers, timeout=60)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'route': name,
+        'group': group,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': round(total / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def print_table(results: list):
+    header = f"{'route':<24}{'reqs':>7}{'errs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['route']:<24}{r['requests']:>7}{r['errors']:>7}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def compare(results: list, baseline_path: str, max_regression: float) -> list:
+    with open(baseline_path) as f:
+        baseline = {r['route']: r for r in json.load(f)['results']}
+    regressions = []
+    for r in results:
+        before = baseline.get(r['route'])
+        if before and before['p95_ms'] > 0 and r['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{r['route']}: p95 {before['p95_ms']}ms -> {r['p95_ms']}ms")
+    return regressions
+
+
+def serve_app_in_thread():
+    """Import app.py (after env is set) and serve it on an ephemeral port."""
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-app', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', help='Benchmark an already running backend instead of starting one')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--only', action='append', help='Route name or group (core, ai, db); repeatable')
+    parser.add_argument('--groq-latency', type=float, default=0.3, help='Seconds per fake Groq call')
+    parser.add_argument('--ors-latency', type=float, default=0.05)
+    parser.add_argument('--supabase-latency', type=float, default=0.01)
+    parser.add_argument('--groq-errors', type=float, default=0.0, help='Fraction of Groq calls answered with 429')
+    parser.add_argument('--ors-errors', type=float, default=0.0)
+    parser.add_argument('--supabase-errors', type=float, default=0.0)
+    parser.add_argument('--verbose', action='store_true', help="Show the backend's own log output")
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Compare against a previous --json output')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed p95 increase (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    fake = FakeUpstreams(
+        latency={'groq': args.groq_latency, 'ors': args.ors_latency, 'supabase': args.supabase_latency},
+        error_rate={'groq': args.groq_errors, 'ors': args.ors_errors, 'supabase': args.supabase_errors},
+    ).start()
+
+    server = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+        print(f'Targeting {base_url}; start it with these variables to use the fakes:')
+        for key, value in fake.env().items():
+            print(f'  {key}={value}')
+    else:
+        os.environ.update(fake.env())
+        server, base_url = serve_app_in_thread()
+
+    scenarios = [
+        s for s in SCENARIOS
+        if not args.only or s[0] in args.only or s[1] in args.only
+    ]
+
+    results = []
+    # The backend logs with print(); keep it out of the report unless asked for
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    try:
+        with quiet:
+            for scenario in scenarios:
+                results.append(run_scenario(base_url, scenario, args.requests, args.concurrency))
+    finally:
+        if server is not None:
+            server.shutdown()
+        fake.stop()
+
+    print_table(results)
+    print(f"\nUpstream calls: {fake.requests}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'config': {k: v for k, v in vars(args).items() if k not in ('json', 'baseline')},
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""Server-side conversation memory for the support chatbot.
+
+Clients used to resend the whole `chat_history` with every message. Now the
+first /api/ai/chatbot response carries a `session_id`; later messages send
+just that id and the new message, and the session supplies the context:
+
+    recent      the last CHAT_SESSION_KEEP_MESSAGES messages, kept verbatim
+    topics      a rolling digest of the user's earlier questions (first
+                sentence of each); the oldest are dropped beyond
+                CHAT_SESSION_MAX_TOPICS
+
+so the history section of every prompt is rendered from a bounded amount of
+state, whatever the length of the conversation (see
+prompt_budget.render_history).
+
+Sessions live in an LRU of at most CHAT_SESSION_MAX sessions per process and
+expire CHAT_SESSION_TTL seconds after their last message. Changed sessions
+are also written to the `chat_sessions` table (CREATE_CHAT_SESSIONS.sql)
+every CHAT_SESSION_FLUSH_INTERVAL seconds, in one upsert and off the request
+path, when the service role is configured, so a session started on one
+gunicorn worker continues on another. The `session_id` handed to the client
+ends in the session's turn count and changes every turn; a worker whose copy
+is behind the id it receives (the previous turn went to another worker)
+reloads the session from the table, and one that is up to date never reads
+it.
+
+Unknown or expired ids start a new session (seeded from `chat_history` if
+the client still sends it), and clients that never send a `session_id` keep
+working as before.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+import atexit
+import os
+import secrets
+import threading
+import time
+
+import metrics
+import prompt_budget
+import settings
+import upstream
+
+chat_session_lookups = metrics.registry.counter(
+    'smartstay_chat_session_lookups_total',
+    'Chatbot session lookups by result (hit, restored, expired, new)',
+    ('result',)
+)
+chat_sessions_active = metrics.registry.gauge(
+    'smartstay_chat_sessions',
+    'Chatbot sessions held in this process'
+)
+
+
+class ChatSession:
+    def __init__(self, session_id: str, keep_messages: int, max_topics: int, topics=(), recent=(), turns: int = 0):
+        self.id = session_id
+        self.turns = turns
+        self.topics = deque(topics, maxlen=max_topics)
+        self.recent = deque(recent, maxlen=keep_messages)
+        self.expires_at = 0.0
+
+    def add(self, role: str, content: str):
+        """Append a message; a user message pushed out of `recent` becomes a topic."""
+        if len(self.recent) == self.recent.maxlen:
+            oldest = self.recent[0]
+            if oldest['role'] == 'user':
+                self.topics.append(prompt_budget.topic(oldest['content']))
+        self.recent.append({'role': role, 'content': content})
+
+    @property
+    def token(self) -> str:
+        """The client-facing session_id: id and turn count."""
+        return f'{self.id}.{self.turns}'
+
+    def render(self, max_tokens: int, endpoint: str = 'chatbot') -> str:
+        return prompt_budget.render_history(list(self.topics), list(self.recent), max_tokens, endpoint)
+
+    def to_row(self, ttl: float) -> dict:
+        expires = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        return {'id': self.id, 'turns': self.turns, 'topics': list(self.topics), 'recent': list(self.recent),
+                'expires_at': expires.isoformat()}
+
+
+class ChatSessionStore:
+    def __init__(self, ttl: float = 1800.0, max_sessions: int = 10000, keep_messages: int = 4, max_topics: int = 12,
+                 flush_interval: float = 0.5):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self.keep_messages = keep_messages
+        self.max_topics = max_topics
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # session id -> row waiting to be written
+        self._pending = {}
+        self._next_purge = 0.0
+        self._thread = None
+        self._thread_pid = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _new(self, session_id: str = None, chat_history=None) -> ChatSession:
+        session = ChatSession(session_id or secrets.token_urlsafe(16), self.keep_messages, self.max_topics)
+        for message in chat_history or ():
+            if isinstance(message, dict) and message.get('content'):
+                session.add('user' if message.get('role') == 'user' else 'bot', str(message['content']))
+        return session
+
+    def _put(self, session: ChatSession):
+        session.expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            chat_sessions_active.set(len(self._sessions))
+
+    def get_or_create(self, token: str = None, chat_history=None) -> ChatSession:
+        """The live session for a client's `session_id`, else a new one seeded from `chat_history`."""
+        session_id, _, turns = str(token or '').rpartition('.')
+        if session_id and turns.isdigit():
+            turns = int(turns)
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None and session.expires_at <= time.monotonic():
+                    del self._sessions[session_id]
+                    session = None
+                if session is not None:
+                    self._sessions.move_to_end(session_id)
+            if session is not None and session.turns >= turns:
+                chat_session_lookups.inc(result='hit')
+                return session
+
+            restored = self._load(session_id)
+            if restored is not None:
+                chat_session_lookups.inc(result='restored')
+                self._put(restored)
+                return restored
+            if session is not None:
+                # Behind, but the table has nothing newer (or can't be reached)
+                chat_session_lookups.inc(result='hit')
+                return session
+            chat_session_lookups.inc(result='expired')
+        else:
+            chat_session_lookups.inc(result='new')
+
+        # Ids are only ever issued by the server, so an unknown one gets a fresh id
+        session = self._new(chat_history=chat_history)
+        self._put(session)
+        return session
+
+    def record(self, session: ChatSession, user_message: str, bot_message: str):
+        """Add a finished turn; the session is written to Supabase by the next flush."""
+        with self._lock:
+            session.add('user', user_message)
+            session.add('bot', bot_message)
+            session.turns += 1
+            self._pending[session.id] = session.to_row(self.ttl)
+        self._put(session)
+        self._ensure_flusher()
+
+    # ---- Supabase ---------------------------------------------------------------
+
+    def _load(self, session_id: str):
+        config = settings.get()
+        if not config.service_role_configured:
+            return None
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            response = upstream.get(
+                config.rest_url(f'chat_sessions?select=id,turns,topics,recent&id=eq.{quote(session_id)}'
+                                f'&expires_at=gt.{quote(now)}'),
+                headers=config.supabase_headers('service'),
+                timeout=5
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} {response.text}")
+            rows = response.json()
+        except Exception as e:
+            print(f"Error loading chat session: {str(e)}")
+            return None
+        if not rows:
+            return None
+        row = rows[0]
+        return ChatSession(row['id'], self.keep_messages, self.max_topics,
+                           row.get('topics') or (), row.get('recent') or (), row.get('turns') or 0)
+
+    def flush(self) -> int:
+        """Write every session changed since the last flush in one upsert."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        config = settings.get()
+        if not batch or not config.service_role_configured:
+            return 0
+        headers = {**config.supabase_headers('service', write=True), 'Prefer': 'resolution=merge-duplicates'}
+        try:
+            response = upstream.post(
+                config.rest_url('chat_sessions?on_conflict=id'),
+                headers=headers,
+                json=list(batch.values()),
+                timeout=10
+            )
+            if response.status_code not in [200, 201, 204]:
+                raise RuntimeError(f"{response.status_code} {response.text}")
+        except Exception as e:
+            print(f"Error saving chat sessions: {str(e)}")
+            with self._lock:
+                for session_id, row in batch.items():
+                    self._pending.setdefault(session_id, row)
+            return 0
+
+        # Expired rows are only ever filtered out on read, so clear them now and then
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.ttl
+            try:
+                upstream.post(config.rest_url('rpc/purge_expired_chat_sessions'), headers=headers, json={}, timeout=10)
+            except Exception as e:
+                print(f"Error purging chat sessions: {str(e)}")
+        return len(batch)
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork, so restart the flusher in each worker process
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='chat-session-flusher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+_config = settings.get()
+store = ChatSessionStore(
+    ttl=_config.chat_session_ttl,
+    max_sessions=_config.chat_session_max,
+    keep_messages=_config.chat_session_keep_messages,
+    max_topics=_config.chat_session_max_topics,
+    flush_interval=_config.chat_session_flush_interval,
+)
+atexit.register(store.flush)
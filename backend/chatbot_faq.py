@@ -0,0 +1,401 @@
+"""Answer common chatbot questions from a local index instead of the LLM.
+
+Most /api/ai/chatbot traffic is the same handful of questions ("how do I
+search", "what does verified mean"), phrased slightly differently each time.
+This module keeps a TF-IDF index over
+
+    curated     the paraphrased questions in chatbot_faq.json, each with a
+                hand-written answer; an entry may be limited to some pages
+                (`pages`, first path segment of context.current_page) and
+                roles (`roles`, context.user_role)
+    learned     LLM answers that users marked helpful, read from the
+                `chatbot_answers` table (CREATE_CHATBOT_ANSWERS.sql); each is
+                limited to the page and role it was asked from and served only
+                once its helpful votes outnumber the unhelpful ones by
+                CHATBOT_FAQ_MIN_ACCEPTS
+
+and `lookup()` returns the answer whose question is most similar (cosine of
+sublinear TF-IDF vectors over words and word pairs) to the user's message,
+if it reaches CHATBOT_FAQ_THRESHOLD. Words the index has never seen are
+matched to similar known words by trigram similarity, so small typos still
+hit. Follow-ups that refer back to the conversation ("what about that one?")
+and messages with no meaningful words always go to the LLM.
+
+LLM answers come with a feedback token: the question, answer and scope,
+signed with a key derived from the service role key. Only a valid token can
+be voted on, so only answers the model actually gave can be promoted.
+Voting takes a signed-in user and each user counts once per answer, so an
+answer a client coaxed out of the model ("reply exactly: ...") still needs
+CHATBOT_FAQ_MIN_ACCEPTS separate accounts to vouch for it.
+
+Learned answers are reloaded every CHATBOT_FAQ_REFRESH_INTERVAL seconds by a
+background thread; the index is rebuilt and swapped in whole, so lookups
+never see a half-built index.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import metrics
+import settings
+import text_search
+import upstream
+
+FAQ_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chatbot_faq.json')
+MAX_LEARNED = 2000
+MIN_TERMS = 1
+# Unknown words matched to known ones must be at least this similar
+FUZZY_THRESHOLD = 0.7
+
+# Question filler on top of text_search.STOPWORDS
+QUESTION_WORDS = frozenset(
+    'how do does did i im me my we our you your what whats which who when where why can could would should '
+    'will am was were any anyone some way please hi hello hey thanks thank tell know want need there here have has '
+    'smartstay'.split()
+)
+# A message containing one of these after earlier turns probably depends on them
+REFERENCE_WORDS = frozenset('it its that this these those they them their one same else above'.split())
+_WORD = re.compile(r'[a-z]+')
+
+chatbot_faq_lookups = metrics.registry.counter(
+    'smartstay_chatbot_faq_lookups_total',
+    'Chatbot messages checked against the FAQ index by result (hit, miss, skipped) and answer source (curated, learned, none)',
+    ('result', 'source')
+)
+chatbot_faq_similarity = metrics.registry.histogram(
+    'smartstay_chatbot_faq_similarity',
+    'Best FAQ similarity per looked-up chatbot message',
+    buckets=(0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+chatbot_faq_entries = metrics.registry.gauge(
+    'smartstay_chatbot_faq_entries',
+    'Answers in the chatbot FAQ index by source (curated, learned)',
+    ('source',)
+)
+chatbot_feedback = metrics.registry.counter(
+    'smartstay_chatbot_feedback_total',
+    'Chatbot answer votes by source of the answer (llm, learned) and vote (helpful, unhelpful, duplicate)',
+    ('source', 'vote')
+)
+
+
+def page_key(current_page) -> str:
+    """'/pg/123' -> 'pg', '/' -> 'home'."""
+    segments = [s for s in str(current_page or '').casefold().split('/') if s]
+    return segments[0] if segments else 'home'
+
+
+def role_key(user_role) -> str:
+    return str(user_role or 'guest').strip().casefold() or 'guest'
+
+
+def terms(text) -> list:
+    return [t for t in text_search.tokenize(text) if t not in QUESTION_WORDS]
+
+
+def standalone(message: str, chat_history: list = None) -> bool:
+    """Whether `message` can be answered without the conversation before it."""
+    if len(terms(message)) < MIN_TERMS:
+        return False
+    return not (chat_history and set(_WORD.findall(str(message).casefold())) & REFERENCE_WORDS)
+
+
+def question_key(question: str, page: str, role: str) -> str:
+    return hashlib.sha256(f"{page}|{role}|{' '.join(terms(question))}".encode('utf-8')).hexdigest()[:32]
+
+
+def answer_key(answer: str) -> str:
+    return hashlib.sha256(answer.encode('utf-8')).hexdigest()[:32]
+
+
+def _features(tokens: list) -> Counter:
+    features = Counter(tokens)
+    features.update(f'{a} {b}' for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+class FaqIndex:
+    """Immutable TF-IDF index over question paraphrases; built once, then only read."""
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self.sources = Counter(entry['source'] for entry in entries)
+        docs = []                # (entry index, feature counts)
+        for i, entry in enumerate(entries):
+            for question in entry['questions']:
+                tokens = terms(question)
+                if tokens:
+                    docs.append((i, _features(tokens)))
+
+        df = Counter(feature for _, features in docs for feature in features)
+        n = len(docs)
+        self.idf = {feature: math.log((n + 1) / (count + 1)) + 1 for feature, count in df.items()}
+        self.unseen_idf = math.log(n + 1) + 1
+        self.vocabulary = {f: text_search.trigrams(f) for f in self.idf if ' ' not in f}
+
+        self.postings = {}       # feature -> [(doc, weight)]
+        self.doc_entries = []
+        for doc, (i, features) in enumerate(docs):
+            vector = self._vector(features)
+            self.doc_entries.append(i)
+            for feature, weight in vector.items():
+                self.postings.setdefault(feature, []).append((doc, weight))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _vector(self, features: Counter) -> dict:
+        vector = {f: (1 + math.log(c)) * self.idf.get(f, self.unseen_idf) for f, c in features.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {f: w / norm for f, w in vector.items()}
+
+    def _correct(self, token: str):
+        """Closest known word to an unknown one, with its similarity, or (token, 1)."""
+        if token in self.idf or len(token) < text_search.FUZZY_MIN_LENGTH:
+            return token, 1.0
+        grams = text_search.trigrams(token)
+        best, best_score = token, 0.0
+        for known, known_grams in self.vocabulary.items():
+            score = 2 * len(grams & known_grams) / (len(grams) + len(known_grams))
+            if score > best_score:
+                best, best_score = known, score
+        return (best, best_score) if best_score >= FUZZY_THRESHOLD else (token, 1.0)
+
+    def match(self, tokens: list, page: str, role: str):
+        """(entry, similarity) of the best in-scope match, or (None, 0.0)."""
+        corrected = [self._correct(t) for t in tokens]
+        query = self._vector(_features([t for t, _ in corrected]))
+        # A corrected word only counts as much as it resembles the typed one
+        for token, similarity in corrected:
+            if token in query:
+                query[token] *= similarity
+
+        scores = Counter()
+        for feature, weight in query.items():
+            for doc, doc_weight in self.postings.get(feature, ()):
+                scores[doc] += weight * doc_weight
+
+        for doc, score in scores.most_common():
+            entry = self.entries[self.doc_entries[doc]]
+            if (not entry['pages'] or page in entry['pages']) and (not entry['roles'] or role in entry['roles']):
+                return entry, score
+        return None, 0.0
+
+
+def _curated_entries() -> list:
+    with open(FAQ_PATH, encoding='utf-8') as f:
+        faq = json.load(f)
+    return [{
+        'id': item['id'],
+        'source': 'curated',
+        'questions': item['questions'],
+        'answer': item['answer'],
+        'suggested_actions': item.get('suggested_actions', []),
+        'pages': frozenset(item.get('pages', ())),
+        'roles': frozenset(item.get('roles', ())),
+    } for item in faq]
+
+
+def _learned_entries() -> list:
+    """Best accepted answer per (question, page, role) from `chatbot_answers`."""
+    config = settings.get()
+    if not config.service_role_configured:
+        return []
+    min_accepts = config.chatbot_faq_min_accepts
+    response = upstream.get(
+        config.rest_url(f'chatbot_answers?select=question_key,page,user_role,question,answer,suggested_actions,'
+                        f'accepted,rejected&accepted=gte.{min_accepts}&order=accepted.desc&limit={MAX_LEARNED}'),
+        headers=config.supabase_headers('service'),
+        timeout=10
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to load learned chatbot answers: {response.status_code} {response.text}")
+
+    best = {}
+    for row in response.json():
+        net = row['accepted'] - row['rejected']
+        if net >= min_accepts and net > best.get(row['question_key'], (0, None))[0]:
+            best[row['question_key']] = (net, row)
+    return [{
+        'id': key,
+        'source': 'learned',
+        'questions': [row['question']],
+        'answer': row['answer'],
+        'suggested_actions': row.get('suggested_actions') or [],
+        'pages': frozenset((row['page'],)),
+        'roles': frozenset((row['user_role'],)),
+    } for key, (_, row) in best.items()]
+
+
+class FaqCache:
+    def __init__(self, threshold: float = None, refresh_interval: float = None):
+        # None follows CHATBOT_FAQ_THRESHOLD / CHATBOT_FAQ_REFRESH_INTERVAL across settings reloads
+        self._threshold = threshold
+        self._refresh_interval = refresh_interval
+        self._curated = None
+        self._index = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    @property
+    def index(self) -> FaqIndex:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._curated = _curated_entries()
+                    self._swap(self._curated)
+        self._ensure_refresher()
+        return self._index
+
+    def _swap(self, entries: list):
+        index = FaqIndex(entries)
+        self._index = index
+        for source in ('curated', 'learned'):
+            chatbot_faq_entries.set(index.sources[source], source=source)
+
+    def refresh(self) -> int:
+        """Reload learned answers and rebuild the index; returns how many were loaded."""
+        learned = _learned_entries()
+        self._swap(self._curated + learned)
+        return len(learned)
+
+    def lookup(self, message: str, context: dict = None, chat_history: list = None):
+        """Answer `message` from the index: {response, suggested_actions, source, faq_id[, feedback_token]} or None."""
+        context = context or {}
+        if not standalone(message, chat_history):
+            chatbot_faq_lookups.inc(result='skipped', source='none')
+            return None
+
+        entry, similarity = self.index.match(
+            terms(message), page_key(context.get('current_page')), role_key(context.get('user_role'))
+        )
+        chatbot_faq_similarity.observe(similarity)
+        threshold = self._threshold if self._threshold is not None else settings.get().chatbot_faq_threshold
+        if entry is None or similarity < threshold:
+            chatbot_faq_lookups.inc(result='miss', source='none')
+            return None
+
+        chatbot_faq_lookups.inc(result='hit', source=entry['source'])
+        answer = {
+            'response': entry['answer'],
+            'suggested_actions': list(entry['suggested_actions']),
+            'source': 'faq',
+            'faq_id': entry['id'],
+        }
+        if entry['source'] == 'learned':
+            # Learned answers stay open to votes so a bad one can be voted back out
+            answer['feedback_token'] = feedback_token(message, answer, context, 'learned')
+        return answer
+
+    def _ensure_refresher(self):
+        # Threads don't survive fork, so restart the refresher in each worker process
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='chatbot-faq-refresher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing chatbot FAQ: {str(e)}")
+            time.sleep(self._refresh_interval or settings.get().chatbot_faq_refresh_interval)
+
+
+faq = FaqCache()
+
+
+# ============================================
+# FEEDBACK
+# ============================================
+
+def _signing_key():
+    key = settings.get().supabase_service_role_key
+    if not key:
+        return None
+    return hmac.new(key.encode('utf-8'), b'smartstay-chatbot-feedback', hashlib.sha256).digest()
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def feedback_token(message: str, result: dict, context: dict, source: str):
+    """Signed token a user can send back to vote on `result`, or None if voting isn't possible."""
+    key = _signing_key()
+    if key is None or not result.get('response'):
+        return None
+    context = context or {}
+    payload = _b64(json.dumps({
+        'q': message,
+        'a': result['response'],
+        's': result.get('suggested_actions') or [],
+        'p': page_key(context.get('current_page')),
+        'r': role_key(context.get('user_role')),
+        'src': source,
+        't': int(time.time()),
+    }, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_b64(hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest())}"
+
+
+def read_feedback_token(token: str):
+    """The payload of a valid, unexpired token, else None."""
+    key = _signing_key()
+    if key is None or not isinstance(token, str) or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    expected = _b64(hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest())
+    if not hmac.compare_digest(signature, expected):
+        return None
+    try:
+        data = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if time.time() - data.get('t', 0) > settings.get().chatbot_feedback_ttl:
+        return None
+    return data
+
+
+def record_feedback(data: dict, helpful: bool, user_id: str) -> bool:
+    """Count `user_id`'s vote on a token payload; False if they already voted on that answer."""
+    config = settings.get()
+    response = upstream.post(
+        config.rest_url('rpc/record_chatbot_feedback'),
+        headers=config.supabase_headers('service', write=True),
+        json={
+            'p_user_id': user_id,
+            'p_question_key': question_key(data['q'], data['p'], data['r']),
+            'p_answer_key': answer_key(data['a']),
+            'p_page': data['p'],
+            'p_user_role': data['r'],
+            'p_question': data['q'],
+            'p_answer': data['a'],
+            'p_suggested_actions': data['s'],
+            'p_helpful': bool(helpful),
+        },
+        timeout=10
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to record chatbot feedback: {response.status_code} {response.text}")
+    recorded = bool(response.json())
+    chatbot_feedback.inc(
+        source=data.get('src', 'llm'), vote=('helpful' if helpful else 'unhelpful') if recorded else 'duplicate'
+    )
+    return recorded
@@ -0,0 +1,205 @@
+"""Background preview generation for verification documents.
+
+Admins reviewing documents used to open the raw upload (often a multi-MB
+scan). After a document record is created we render a compressed thumbnail
+and, for PDFs, a first-page image and store them next to the original in the
+`verification-docs` bucket:
+
+    verification/<owner>/<file>            original
+    verification/<owner>/previews/<file>.thumb.jpg
+    verification/<owner>/previews/<file>.page1.jpg
+
+The image work runs in a small process pool so it never holds the GIL on the
+Flask request threads. Pillow and pypdfium2 are optional - without them the
+pipeline is simply disabled.
+
+The bucket is private, so `preview_urls` hands admins short-lived signed URLs
+for the previews (one batch signing request per document list).
+"""
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import io
+import multiprocessing
+import os
+import threading
+
+import requests
+
+import upstream
+
+BUCKET = 'verification-docs'
+THUMBNAIL_SIZE = (480, 480)
+PAGE_RENDER_WIDTH = 1600
+JPEG_QUALITY = 70
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = None
+
+
+def is_available() -> bool:
+    return importlib.util.find_spec('PIL') is not None
+
+
+def storage_path_from_url(file_url: str):
+    """Return the object path inside the bucket for a storage URL (or None)."""
+    marker = f'/{BUCKET}/'
+    if not file_url or marker not in file_url:
+        return None
+    return file_url.split(marker, 1)[1].split('?', 1)[0]
+
+
+def preview_paths(file_path: str) -> dict:
+    directory, _, name = file_path.rpartition('/')
+    prefix = f'{directory}/previews/{name}' if directory else f'previews/{name}'
+    return {
+        'thumbnail': f'{prefix}.thumb.jpg',
+        'page': f'{prefix}.page1.jpg',
+    }
+
+
+def preview_urls(supabase_url: str, headers, file_urls: list, expires_in: int) -> list:
+    """Signed URLs of the previews of each of `file_urls`, in order.
+
+    Each entry has `thumbnail_url` and `preview_url` (the first page for PDFs,
+    else the thumbnail), valid for `expires_in` seconds. `headers` must be
+    allowed to sign objects in the bucket (the service role). Previews that
+    don't exist yet are left out.
+    """
+    wanted = []
+    for file_url in file_urls:
+        file_path = storage_path_from_url(file_url)
+        if not file_path:
+            wanted.append({})
+            continue
+        paths = preview_paths(file_path)
+        page = paths['page'] if file_path.lower().endswith('.pdf') else paths['thumbnail']
+        wanted.append({'thumbnail_url': paths['thumbnail'], 'preview_url': page})
+
+    unique = sorted({path for urls in wanted for path in urls.values()})
+    if not unique:
+        return wanted
+    response = upstream.post(
+        f'{supabase_url}/storage/v1/object/sign/{BUCKET}',
+        headers=headers,
+        json={'expiresIn': expires_in, 'paths': unique},
+        timeout=10
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to sign previews: {response.status_code} {response.text}")
+    # [{"path": ..., "signedURL": "/object/sign/<bucket>/<path>?token=...", "error": ...}]
+    signed = {item['path']: f"{supabase_url}/storage/v1{item['signedURL']}"
+              for item in response.json() if item.get('signedURL')}
+    return [{key: signed[path] for key, path in urls.items() if path in signed} for urls in wanted]
+
+
+def _to_jpeg(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _render_first_page(pdf_bytes: bytes):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        page = pdf[0]
+        scale = PAGE_RENDER_WIDTH / page.get_width()
+        return page.render(scale=scale).to_pil()
+    finally:
+        pdf.close()
+
+
+def build_previews(supabase_url: str, supabase_key: str, file_path: str) -> dict:
+    """Download the original, render previews and upload them. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    headers = {
+        'apikey': supabase_key,
+        'Authorization': f'Bearer {supabase_key}',
+    }
+    object_url = f'{supabase_url}/storage/v1/object/{BUCKET}'
+
+    response = requests.get(f'{object_url}/{file_path}', headers=headers, timeout=60)
+    response.raise_for_status()
+
+    paths = preview_paths(file_path)
+    outputs = {}
+
+    if file_path.lower().endswith('.pdf'):
+        page = _render_first_page(response.content).convert('RGB')
+        outputs[paths['page']] = _to_jpeg(page)
+        image = page
+    else:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(response.content))).convert('RGB')
+
+    image.thumbnail(THUMBNAIL_SIZE)
+    outputs[paths['thumbnail']] = _to_jpeg(image)
+
+    for path, body in outputs.items():
+        upload = requests.post(
+            f'{object_url}/{path}',
+            headers={**headers, 'Content-Type': 'image/jpeg', 'x-upsert': 'true'},
+            data=body,
+            timeout=60
+        )
+        upload.raise_for_status()
+
+    return {'file_path': file_path, 'previews': list(outputs)}
+
+
+def _get_executor():
+    global _executor, _executor_pid, _pending
+    with _executor_lock:
+        # Pools don't survive fork (e.g. a preloaded app in gunicorn workers)
+        if _executor is None or _executor_pid != os.getpid():
+            workers = int(os.getenv('PREVIEW_WORKERS', 2))
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+            _pending = threading.BoundedSemaphore(int(os.getenv('PREVIEW_MAX_PENDING', workers * 4)))
+        return _executor, _pending
+
+
+def _on_done(future, pending):
+    pending.release()
+    error = future.exception()
+    if error:
+        print(f"Preview generation failed: {error}")
+
+
+def schedule_previews(supabase_url: str, supabase_key: str, file_url: str) -> bool:
+    """Queue preview generation for an uploaded document. Never blocks the caller.
+
+    Returns False when the pipeline is unavailable or the queue is full.
+    """
+    file_path = storage_path_from_url(file_url)
+    if not file_path or not supabase_url or not supabase_key or not is_available():
+        return False
+
+    executor, pending = _get_executor()
+    if not pending.acquire(blocking=False):
+        print(f"Preview queue full, skipping {file_path}")
+        return False
+
+    try:
+        future = executor.submit(build_previews, supabase_url, supabase_key, file_path)
+    except Exception as e:
+        pending.release()
+        print(f"Could not schedule preview for {file_path}: {e}")
+        return False
+
+    future.add_done_callback(lambda f: _on_done(f, pending))
+    return True
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,275 @@
+"""Geohash index for radius and nearest-listing queries (GET /api/nearby).
+
+`pg_listings.distance_from_college` only answers "how far from the one
+college the owner typed in". This index answers "which listings are within
+R metres of this point" for any point, so every college in a city works.
+
+Listings are kept sorted by the geohash of their coordinates
+(GEOHASH_PRECISION characters, ~150 m cells). Every geohash prefix is a
+rectangle and a contiguous run of that order, so a radius query:
+
+    1. covers the radius' bounding box with the finest cells that need at
+       most MAX_COVER_CELLS of them (coarser cells for larger radii)
+    2. turns each cell into a [lo, hi) range of the sorted arrays by bisection
+    3. computes exact haversine distances for the candidates in those ranges
+       and keeps the ones inside the radius
+
+Step 3 runs over whole array slices with numpy when it is installed and in
+a plain loop otherwise. Nearest-k queries are radius queries with a growing
+radius (see search_index.ListingIndex.nearby).
+
+`locate(place)` geocodes a college or landmark name through
+OpenRouteService and keeps the answer in an LRU cache, so the popular
+colleges cost one API call per process per GEO_PLACE_CACHE_TTL (concurrent
+misses for the same place share that call).
+"""
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+import importlib.util
+import math
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+import settings
+import singleflight
+import upstream
+
+load_dotenv()
+
+np = None
+if importlib.util.find_spec('numpy') is not None:
+    try:
+        import numpy as np
+    except Exception as e:
+        print(f"numpy unavailable, geo distances computed in pure Python: {e}")
+
+GEOHASH_PRECISION = 7
+MAX_COVER_CELLS = 32
+EARTH_RADIUS_M = 6_371_008.8
+MAX_RADIUS_M = 50_000
+PLACE_CACHE_SIZE = 1024
+PLACE_CACHE_TTL = float(os.getenv('GEO_PLACE_CACHE_TTL', 7 * 24 * 3600))
+# Places that didn't geocode are retried after this long
+PLACE_NOT_FOUND_TTL = 600
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+geo_place_lookups = metrics.registry.counter(
+    'smartstay_geo_place_lookups_total',
+    'College/landmark geocoding lookups by result (hit, miss, not_found)',
+    ('result',)
+)
+
+
+def encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision: int) -> tuple:
+    """(height, width) of a geohash cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering(lat: float, lng: float, radius_m: float) -> list:
+    """Geohash cells that together cover the circle's bounding box."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lng - dlng, -180.0), min(lng + dlng, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(int((south + 90) // height), int((north + 90) // height) + 1)
+        cols = range(int((west + 180) // width), int((east + 180) // width) + 1)
+        if len(rows) * len(cols) <= MAX_COVER_CELLS or precision == 1:
+            break
+    return sorted({
+        encode(-90 + (row + 0.5) * height, -180 + (col + 0.5) * width, precision)
+        for row in rows for col in cols
+    })
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _coords(doc: dict):
+    try:
+        lat, lng = float(doc['latitude']), float(doc['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None
+    return lat, lng
+
+
+class GeoIndex:
+    """Listing id -> coordinates, queried through a geohash-sorted layout.
+    Not thread-safe; see search_index.ListingIndex."""
+
+    def __init__(self):
+        self.points = {}         # listing id -> (lat, lng, geohash)
+        self._dirty = True
+        self._hashes = []
+        self._ids = []
+        self._lats = array('d')
+        self._lngs = array('d')
+
+    def __len__(self):
+        return len(self.points)
+
+    def build(self, docs):
+        self.points = {}
+        for doc in docs:
+            if doc is not None:
+                self.upsert(doc)
+
+    def upsert(self, doc: dict):
+        point = _coords(doc)
+        if point is None:
+            self.remove(doc['id'])
+        elif self.points.get(doc['id'], ())[:2] != point:
+            self.points[doc['id']] = (*point, encode(*point))
+            self._dirty = True
+
+    def remove(self, pg_id: str):
+        if self.points.pop(pg_id, None) is not None:
+            self._dirty = True
+
+    def rebuild_derived(self):
+        """Re-sort after changes (done by the refresher so queries don't pay for it)."""
+        if not self._dirty:
+            return
+        entries = sorted((geohash, lat, lng, pg_id) for pg_id, (lat, lng, geohash) in self.points.items())
+        self._hashes = [e[0] for e in entries]
+        self._lats = array('d', (e[1] for e in entries))
+        self._lngs = array('d', (e[2] for e in entries))
+        self._ids = [e[3] for e in entries]
+        if np is not None:
+            self._lat_rad = np.radians(np.asarray(self._lats, dtype=np.float64))
+            self._lng_rad = np.radians(np.asarray(self._lngs, dtype=np.float64))
+            self._cos_lat = np.cos(self._lat_rad)
+        self._dirty = False
+
+    def _ranges(self, lat: float, lng: float, radius_m: float) -> list:
+        """Merged [lo, hi) runs of the sorted arrays that can hold matches."""
+        hashes = self._hashes
+        ranges = []
+        for cell in covering(lat, lng, radius_m):
+            lo = bisect_left(hashes, cell)
+            # '~' sorts after every base32 character
+            hi = bisect_left(hashes, cell + '~', lo)
+            if lo == hi:
+                continue
+            if ranges and ranges[-1][1] >= lo:
+                ranges[-1][1] = max(ranges[-1][1], hi)
+            else:
+                ranges.append([lo, hi])
+        return ranges
+
+    def within(self, lat: float, lng: float, radius_m: float) -> dict:
+        """Listing id -> distance in metres for listings within `radius_m`."""
+        self.rebuild_derived()
+        radius_m = min(float(radius_m), MAX_RADIUS_M)
+        found = {}
+        ids = self._ids
+        if np is not None:
+            phi, lam, cos_phi = math.radians(lat), math.radians(lng), math.cos(math.radians(lat))
+            for lo, hi in self._ranges(lat, lng, radius_m):
+                a = np.sin((self._lat_rad[lo:hi] - phi) / 2) ** 2 + \
+                    cos_phi * self._cos_lat[lo:hi] * np.sin((self._lng_rad[lo:hi] - lam) / 2) ** 2
+                distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+                for i in np.flatnonzero(distances <= radius_m):
+                    found[ids[lo + i]] = float(distances[i])
+            return found
+        lats, lngs = self._lats, self._lngs
+        for lo, hi in self._ranges(lat, lng, radius_m):
+            for i in range(lo, hi):
+                distance = haversine(lat, lng, lats[i], lngs[i])
+                if distance <= radius_m:
+                    found[ids[i]] = distance
+        return found
+
+
+# ---- place lookup -------------------------------------------------------------
+
+_places = OrderedDict()
+_places_lock = threading.Lock()
+_lookups = singleflight.Group('geo')
+
+
+def locate(place: str):
+    """{'lat', 'lng'} for a college/landmark name, or None if it can't be found.
+
+    Raises resilience.UpstreamUnavailable while OpenRouteService is rate
+    limited or its circuit is open, and RuntimeError if it isn't configured.
+    """
+    key = ' '.join(place.casefold().split())
+    now = time.monotonic()
+    with _places_lock:
+        cached = _places.get(key)
+        if cached is not None and cached[0] > now:
+            _places.move_to_end(key)
+            geo_place_lookups.inc(result='hit')
+            return cached[1]
+    return _lookups.do(key, lambda: _geocode(key, place, now), name='locate')
+
+
+def _geocode(key: str, place: str, now: float):
+    config = settings.get()
+    if not config.openroute_api_key:
+        raise RuntimeError('OPENROUTE_API_KEY is not configured')
+    response = upstream.get(
+        f"{config.openroute_base_url}/geocode/search",
+        params={"text": place, "size": 1},
+        headers=config.openroute_headers,
+        timeout=10
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Geocoding failed: {response.status_code}")
+    features = response.json().get('features') or []
+    point = None
+    if features:
+        coords = features[0]['geometry']['coordinates']
+        point = {'lat': coords[1], 'lng': coords[0]}
+
+    geo_place_lookups.inc(result='miss' if point else 'not_found')
+    with _places_lock:
+        _places[key] = (now + (PLACE_CACHE_TTL if point else PLACE_NOT_FOUND_TTL), point)
+        _places.move_to_end(key)
+        while len(_places) > PLACE_CACHE_SIZE:
+            _places.popitem(last=False)
+    return point
+
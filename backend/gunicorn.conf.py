@@ -0,0 +1,54 @@
+"""Gunicorn settings for the SmartStay backend.
+
+Most routes spend their time waiting on Groq, OpenRouteService or Supabase, so
+the default is a few processes with many threads each (`gthread`). Set
+GUNICORN_WORKER_CLASS=gevent (and `pip install gevent`) to use cooperative
+async workers instead. Everything can be tuned through environment variables.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+# Processes: one per core is plenty for I/O-bound work, capped to keep memory sane
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+# resilience.py splits provider quotas across worker processes
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Threads per process (gthread) / concurrent greenlets per process (gevent)
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))
+
+# LLM calls can legitimately take tens of seconds
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers occasionally to bound slow leaks
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# Import the app once in the master so workers share its memory copy-on-write.
+# gevent needs to monkey-patch before the app imports `requests`, so it loads per worker.
+preload_app = worker_class not in ('gevent', 'eventlet')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    # With preload_app the worker is forked from the master's imported app, so
+    # a `kill -HUP <master>` would otherwise respawn workers with the old
+    # settings. Re-read them here, and let `kill -HUP <worker>` reload in place.
+    import settings
+
+    settings.reload()
+    settings.install_reload_signal()
+
+
+def worker_exit(server, worker):
+    # Flush buffered writes before the worker goes away (graceful stop or recycle)
+    from wsgi import shutdown_background_work
+
+    shutdown_background_work()
@@ -0,0 +1,216 @@
+"""Response compression and conditional GETs.
+
+Admin and owner pages poll a few endpoints that return large JSON arrays
+(reports, verification documents, the analytics dashboard). Two things make
+those polls cheap:
+
+Compression. `init_app` compresses every buffered JSON or text response of
+at least HTTP_COMPRESS_MIN_BYTES, with brotli when the client accepts it and
+the `brotli` package is installed, else gzip. Streamed responses (the
+analytics export) are left alone.
+
+Validators. Routes wrapped in `conditional()` get a strong ETag and answer a
+matching If-None-Match with 304 Not Modified. The tag comes from one of:
+
+    a watermark   for a route listing a table, its row count and newest
+                  `updated_at`. The view records it from the rows it read
+                  (`record_watermark`); a request carrying If-None-Match
+                  first reads the same pair with a single-row query
+                  (`table_watermark`) and, on a match, the view never runs:
+                  no full fetch, no join, no serialization.
+    the content   a hash of the serialized body, used when a route has no
+                  watermark. Saves the transfer only.
+
+Requests without If-None-Match (first loads) cost nothing extra. Joined
+columns (e.g. a reporter's name) don't move a table's watermark, nor does a
+write whose updated_at is older than the newest already seen (a long
+transaction), so watermark tags also roll over every HTTP_WATERMARK_MAX_AGE
+seconds.
+
+A compressed body is a different representation, so its ETag gets a
+`-gzip`/`-br` suffix; If-None-Match accepts any variant of the current tag.
+"""
+from functools import wraps
+import gzip
+import hashlib
+import importlib.util
+import json
+import time
+
+import metrics
+import settings
+import upstream
+
+brotli = None
+if importlib.util.find_spec('brotli') is not None:
+    try:
+        import brotli
+    except Exception as e:
+        print(f"brotli unavailable, responses compressed with gzip only: {e}")
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+compressed_responses = metrics.registry.counter(
+    'smartstay_http_compressed_responses_total',
+    'Responses compressed by encoding',
+    ('encoding',)
+)
+compression_saved = metrics.registry.counter(
+    'smartstay_http_compression_saved_bytes_total',
+    'Bytes saved by response compression',
+    ('encoding',)
+)
+conditional_requests = metrics.registry.counter(
+    'smartstay_http_conditional_requests_total',
+    'GETs to routes with ETags, by route, validator (watermark, content) and result (not_modified, sent)',
+    ('route', 'validator', 'result')
+)
+
+
+def _tag(*parts) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _base(tag: str) -> str:
+    for suffix in ('-gzip', '-br'):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def _matches(request, tag: str) -> bool:
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return True
+    # If-None-Match uses weak comparison, and any content coding of the same tag counts
+    return any(_base(candidate) == tag for candidate in if_none_match.as_set(include_weak=True))
+
+
+def _not_modified(tag: str):
+    from flask import Response
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def table_watermark(table: str, filters: str = '') -> tuple:
+    """(row count, newest updated_at) of `table` under PostgREST `filters`, in one single-row read."""
+    config = settings.get()
+    response = upstream.get(
+        config.rest_url(f'{table}?select=updated_at{filters}&order=updated_at.desc.nullslast&limit=1'),
+        headers={**config.supabase_headers(), 'Prefer': 'count=exact'},
+        timeout=5
+    )
+    if response.status_code not in (200, 206):
+        raise RuntimeError(f"Failed to read {table} watermark: {response.status_code} {response.text}")
+    rows = response.json()
+    # Content-Range: 0-0/<count> (or */0 when empty); deletes change the count
+    count = response.headers.get('Content-Range', '').rpartition('/')[2]
+    if not count.isdigit():
+        raise RuntimeError(f"No row count in {table} watermark response")
+    return int(count), rows[0]['updated_at'] if rows else None
+
+
+def record_watermark(rows: list):
+    """Record the watermark of the rows a view is returning (same shape as `table_watermark`)."""
+    from flask import g
+    # Without the column (migration not run) the content hash is used instead
+    if all('updated_at' in row for row in rows):
+        g._http_cache_watermark = (len(rows), max((row['updated_at'] for row in rows if row['updated_at']), default=None))
+
+
+def _watermark_tag(request, mark) -> str:
+    # The query string is part of the tag: filters change the rows
+    return _tag(request.path, sorted(request.args.items(multi=True)), settings.get().supabase_url,
+                int(time.time() // settings.get().http_watermark_max_age), mark)
+
+
+def conditional(watermark=None):
+    """Route decorator adding a strong ETag and 304 handling.
+
+    `watermark(*args, **kwargs)` reads the route's current watermark, which
+    the view records with `record_watermark`; without it the tag is a hash
+    of the response body.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import g, make_response, request
+
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            if watermark is not None and request.if_none_match:
+                try:
+                    tag = _watermark_tag(request, watermark(*args, **kwargs))
+                except Exception as e:
+                    print(f"Error reading watermark for {route}: {str(e)}")
+                    tag = None
+                if tag is not None and _matches(request, tag):
+                    conditional_requests.inc(route=route, validator='watermark', result='not_modified')
+                    return _not_modified(tag)
+
+            g.pop('_http_cache_watermark', None)
+            response = make_response(view(*args, **kwargs))
+            mark = g.pop('_http_cache_watermark', None)
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if mark is not None:
+                validator, tag = 'watermark', _watermark_tag(request, mark)
+            else:
+                validator, tag = 'content', _tag(response.get_data())
+            if _matches(request, tag):
+                conditional_requests.inc(route=route, validator=validator, result='not_modified')
+                return _not_modified(tag)
+            conditional_requests.inc(route=route, validator=validator, result='sent')
+            response.set_etag(tag)
+            # Cacheable, but revalidated on every use
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _encoding(accept_encoding) -> str:
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def init_app(app):
+    """Compress large buffered JSON/text responses."""
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.is_streamed or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = _encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        config = settings.get()
+        if len(data) < config.http_compress_min_bytes:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=config.http_brotli_quality)
+        else:
+            compressed = gzip.compress(data, compresslevel=config.http_gzip_level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag and not weak:
+            response.set_etag(f'{tag}-{"gzip" if encoding == "gzip" else "br"}')
+        compressed_responses.inc(encoding=encoding)
+        compression_saved.inc(len(data) - len(compressed), encoding=encoding)
+        return response
@@ -0,0 +1,598 @@
+"""Precomputed listing insights (review sentiment, hidden-charge reports).
+
+The detail page asks for both analyses every time it is opened, and each
+answer is an LLM call on the request path. This module moves that work into
+a batch job and lets the routes serve the stored answer instead:
+
+    python -m insights            # poll forever (run it as its own process)
+    python -m insights --once     # one pass, e.g. from cron
+
+Each pass reads two (updated_at, id) watermarks from `insight_watermarks`
+and collects listings whose `pg_listings` row moved past the first (hidden
+charges) and listings with `reviews` rows past the second (sentiment;
+changed listings with reviews are checked as well). It then builds exactly
+the prompt the route would build for that listing.
+
+Every stored insight carries `source_hash`, the hash of the prompt it was
+computed from. A listing whose prompt hashes the same as its current insight
+is skipped, so edits that don't change the inputs (views, availability)
+cost nothing. The rest go through a pool of INSIGHTS_WORKERS threads, which
+bounds how hard the job leans on Groq next to live traffic. Results are
+stored by the `store_listing_insight` RPC as a new version; the previous
+version stays in the table but is no longer current (see
+CREATE_LISTING_INSIGHTS.sql).
+
+An insight that fails is counted in `insight_failures` and retried on the
+next passes until it has failed INSIGHTS_MAX_ATTEMPTS times; then it stays
+there as a dead letter until the listing changes again. Queued failures
+don't hold the watermarks back, so one broken listing can't pin them. A
+pass cut short by rate limits leaves the rest unattempted, and the
+watermarks stop at the first row that still has work, so the next pass
+resumes where it stopped.
+
+On the request path `precomputed(pg_id, kind, prompt)` returns the current
+insight only if its `source_hash` matches the prompt built from the request.
+A listing edited since the last pass therefore falls back to a live call
+rather than showing a stale answer.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from ai_provider import ai
+import llm_schemas
+import metrics
+import prompt_budget
+import resilience
+import settings
+import singleflight
+import upstream
+
+load_dotenv()
+
+# Bump when a prompt below changes so every listing is recomputed
+PROMPT_VERSION = 1
+KINDS = ('sentiment', 'hidden_charges')
+PAGE_SIZE = 500
+LISTING_COLUMNS = ('id,name,description,rent,deposit,amenities,rules,maintenance_charges,electricity_charges,'
+                   'total_reviews,updated_at')
+
+insight_jobs = metrics.registry.counter(
+    'smartstay_insight_jobs_total',
+    'Listing insights considered by the precompute job, by kind and outcome '
+    '(computed, unchanged, failed, dead_lettered, skipped)',
+    ('kind', 'outcome')
+)
+insights_served = metrics.registry.counter(
+    'smartstay_insights_served_total',
+    'Insight requests by kind and whether a precomputed result was served (precomputed, live)',
+    ('kind', 'source')
+)
+
+EMPTY_SENTIMENT = {
+    "overall_sentiment": "neutral",
+    "positive_count": 0,
+    "negative_count": 0,
+    "neutral_count": 0,
+    "insights": "No reviews available yet.",
+    "keywords": {"positive": [], "negative": []}
+}
+
+DEFAULT_QUESTIONS = [
+    "Are there any additional charges apart from rent and deposit?",
+    "What utilities are included in the rent?",
+    "Is there a maintenance fee, and what does it cover?"
+]
+
+
+# ============================================
+# PROMPTS (shared with the /api/ai routes)
+# ============================================
+
+def sentiment_prompt(reviews: list, pg_name: str) -> str:
+    # Check multiple possible field names; duplicates dropped and long
+    # reviews trimmed so the prompt stays within the token budget
+    review_texts = prompt_budget.fit_texts(
+        [r.get('review_text', r.get('text', r.get('comment', ''))) for r in reviews],
+        prompt_budget.budget('sentiment'),
+        endpoint='sentiment'
+    )
+    reviews_text = "\n".join([f"- {text}" for text in review_texts])
+    sample_note = f" ({len(review_texts)} of {len(reviews)} shown)" if len(review_texts) < len(reviews) else ""
+
+    return f"""Analyze the following reviews for {pg_name} and provide a comprehensive sentiment analysis.
+
+Reviews{sample_note}:
+{reviews_text}
+
+Please provide:
+1. Overall sentiment (positive/negative/neutral)
+2. Count of positive, negative, and neutral reviews
+3. Key insights (2-3 bullet points)
+4. Top 3 positive keywords and top 3 negative keywords
+
+Return ONLY a valid JSON object with this exact structure:
+{{
+  "overall_sentiment": "positive/negative/neutral",
+  "positive_count": <number>,
+  "negative_count": <number>,
+  "neutral_count": <number>,
+  "insights": "<2-3 sentence summary>",
+  "keywords": {{
+    "positive": ["keyword1", "keyword2", "keyword3"],
+    "negative": ["keyword1", "keyword2", "keyword3"]
+  }}
+}}"""
+
+
+def hidden_charges_prompt(data: dict) -> str:
+    """Prompt for the hidden-charge check; `data` is the route's request body."""
+    description = data.get('description', '')
+    rent = data.get('rent', 0)
+    deposit = data.get('deposit', 0)
+    amenities = data.get('amenities', [])
+    rules = data.get('rules', '')
+    maintenance_charges = data.get('maintenanceCharges', '')
+    electricity_charges = data.get('electricityCharges', '')
+    food_included = data.get('foodIncluded', False)
+
+    # Prepare comprehensive listing text
+    amenities_text = ', '.join(amenities) if amenities else 'Not specified'
+
+    # Format additional charge information
+    maintenance_text = f"₹{maintenance_charges}/month" if maintenance_charges and str(maintenance_charges).strip() and str(maintenance_charges) != '0' else "Not specified"
+    electricity_text = electricity_charges if electricity_charges and str(electricity_charges).strip() else "Not specified"
+    food_text = "Yes, food is included" if food_included else "Not specified"
+
+    return f"""You are analyzing a PG (Paying Guest) listing for transparency and potential hidden charges.
+
+COMPLETE LISTING INFORMATION:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Monthly Rent: ₹{rent}
+Security Deposit: ₹{deposit}
+
+Amenities Provided: {amenities_text}
+
+**MAINTENANCE CHARGES:** {maintenance_text}
+**ELECTRICITY CHARGES:** {electricity_text}
+**FOOD AVAILABILITY:** {food_text}
+
+Property Description:
+{description if description else 'No description provided'}
+
+House Rules & Terms:
+{rules if rules else 'No rules specified'}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+SCORING GUIDELINES - BE FAIR AND REASONABLE:
+
+START WITH BASE SCORE:
+- Has rent and deposit clearly stated: +40 points (baseline)
+- Has amenities list with 3+ items: +15 points
+- Has detailed description (50+ words): +15 points
+- Has rules/terms specified: +10 points
+
+DEDUCT FOR MISSING CRITICAL INFORMATION:
+- No mention of electricity (included/extra): -5 to -10 points
+- No mention of maintenance: -5 to -10 points
+- No mention of food availability: -3 to -7 points (less critical)
+- No mention of parking: -3 to -5 points (less critical)
+- Vague or ambiguous cost terms: -5 to -10 points
+
+FINAL SCORE RANGES:
+- 80-100: Excellent - All major costs clearly stated, minimal unknowns
+- 60-79: Good - Most information clear, minor details missing
+- 40-59: Fair - Basic info provided but several items unclear
+- 20-39: Poor - Many important details missing
+- 0-19: Very Poor - Minimal information, high risk
+
+IMPORTANT ANALYSIS RULES:
+1. If an amenity is LISTED (e.g., "Wi-Fi" in amenities), assume it's INCLUDED unless stated otherwise
+2. Common amenities like Wi-Fi, Hot Water, TV typically mean they're provided - don't flag as hidden
+3. Only flag as "hidden charge" if there's reason to believe it costs extra but isn't mentioned
+4. Give CREDIT for what IS provided - don't just focus on what's missing
+5. A listing with clear rent, deposit, and good amenities list should score AT LEAST 60/100
+
+Return ONLY valid JSON:
+{{
+  "risk_level": "low/medium/high",
+  "potential_hidden_charges": [
+    {{"charge": "specific charge name", "reason": "why you believe this might be extra/hidden"}}
+  ],
+  "missing_information": ["only truly missing cost details"],
+  "questions_to_ask": ["specific questions about legitimately unclear items"],
+  "transparency_score": <number 0-100>
+}}
+
+BE REASONABLE: If the listing has rent, deposit, amenities list, and a description, the score should be 60+ unless there are serious red flags.
+
+CRITICAL INSTRUCTION: Your response MUST be ONLY the JSON object above. NO explanations, NO markdown, NO extra text before or after. Start your response with {{ and end with }}. Do NOT write "Here's the analysis" or any other commentary."""
+
+
+def hidden_charges_input(pg: dict) -> dict:
+    """The request body the detail page sends for a pg_listings row."""
+    data = {
+        'description': pg.get('description') or '',
+        'rent': pg.get('rent') or 0,
+        'deposit': pg.get('deposit') or 0,
+        'amenities': pg.get('amenities') or [],
+        'rules': pg.get('rules') or '',
+        'foodIncluded': pg.get('food_included'),
+    }
+    # Absent rather than null, as after the page's JSON.stringify
+    for field, column in (('maintenanceCharges', 'maintenance_charges'), ('electricityCharges', 'electricity_charges')):
+        if pg.get(column) is not None:
+            data[field] = pg[column]
+    return data
+
+
+def clean_hidden_charges(result) -> dict:
+    """Clamp and fill the model's hidden-charge report into the shape the UI expects."""
+    if not isinstance(result, dict):
+        result = {}
+
+    # Ensure risk_level is valid
+    risk_level = result.get('risk_level', 'medium')
+    if risk_level not in ['low', 'medium', 'high']:
+        risk_level = 'medium'
+    result['risk_level'] = risk_level
+
+    # Ensure transparency_score is valid (0-100)
+    transparency_score = result.get('transparency_score', 50)
+    try:
+        transparency_score = float(transparency_score)
+        transparency_score = max(0, min(100, transparency_score))
+    except (ValueError, TypeError):
+        transparency_score = 50
+    result['transparency_score'] = int(transparency_score)
+
+    # Ensure arrays exist and are valid
+    if 'potential_hidden_charges' not in result or not isinstance(result['potential_hidden_charges'], list):
+        result['potential_hidden_charges'] = []
+
+    # Validate charge objects
+    valid_charges = []
+    for charge in result['potential_hidden_charges']:
+        if isinstance(charge, dict) and 'charge' in charge and 'reason' in charge:
+            valid_charges.append({
+                'charge': str(charge['charge']),
+                'reason': str(charge['reason'])
+            })
+    result['potential_hidden_charges'] = valid_charges
+
+    if 'missing_information' not in result or not isinstance(result['missing_information'], list):
+        result['missing_information'] = []
+    result['missing_information'] = [str(x) for x in result['missing_information'] if x]
+
+    if 'questions_to_ask' not in result or not isinstance(result['questions_to_ask'], list):
+        result['questions_to_ask'] = []
+    result['questions_to_ask'] = [str(x) for x in result['questions_to_ask'] if x]
+
+    # Ensure at least some questions
+    if len(result['questions_to_ask']) < 3:
+        for q in DEFAULT_QUESTIONS:
+            if q not in result['questions_to_ask']:
+                result['questions_to_ask'].append(q)
+            if len(result['questions_to_ask']) >= 3:
+                break
+
+    return result
+
+
+def analyze(kind: str, prompt: str) -> dict:
+    """Run one insight prompt through the AI provider."""
+    if kind == 'sentiment':
+        return ai.generate_json(prompt, llm_schemas.SENTIMENT, endpoint='sentiment')
+    return clean_hidden_charges(
+        ai.generate_json(prompt, llm_schemas.HIDDEN_CHARGES, endpoint='hidden_charges', temperature=0)
+    )
+
+
+def source_hash(kind: str, prompt: str) -> str:
+    return singleflight.key('insight', kind, PROMPT_VERSION, prompt)
+
+
+# ============================================
+# SERVING
+# ============================================
+
+def current(pg_id: str) -> dict:
+    """Current insights for a listing: {kind: {result, version, source_hash, computed_at}}."""
+    config = settings.get()
+    response = upstream.get(
+        config.rest_url(f'listing_insights?select=kind,result,version,source_hash,computed_at'
+                        f'&pg_id=eq.{quote(pg_id)}&is_current=is.true'),
+        headers=config.supabase_headers(),
+        timeout=5
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to load insights: {response.status_code} {response.text}")
+    return {row['kind']: row for row in response.json()}
+
+
+def precomputed(pg_id: str, kind: str, prompt: str):
+    """The stored result for `pg_id` if it was computed from exactly `prompt`, else None."""
+    try:
+        insight = current(pg_id).get(kind)
+    except Exception as e:
+        print(f"Error loading precomputed {kind} insight: {str(e)}")
+        insight = None
+    if insight is None or insight['source_hash'] != source_hash(kind, prompt):
+        insights_served.inc(kind=kind, source='live')
+        return None
+    insights_served.inc(kind=kind, source='precomputed')
+    return insight['result']
+
+
+# ============================================
+# PRECOMPUTE JOB
+# ============================================
+
+class InsightJob:
+    def __init__(self, workers: int = 2, poll_interval: float = 60.0, max_attempts: int = 5):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+    # ---- Supabase helpers ---------------------------------------------------
+
+    def _get(self, path: str) -> list:
+        config = settings.get()
+        response = upstream.get(config.rest_url(path), headers=config.supabase_headers('service'), timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path.split('?')[0]} failed: {response.status_code} {response.text}")
+        return response.json()
+
+    def _changed(self, table: str, select: str, since: tuple, extra: str = '') -> list:
+        """Rows of `table` after the (updated_at, id) cursor `since`, oldest first (keyset paged)."""
+        rows = []
+        cursor = since
+        while True:
+            after = ''
+            if cursor and cursor[1]:
+                # Keyset on (updated_at, id): one write can stamp many rows with the same time
+                updated_at, row_id = (quote(f'"{value}"') for value in cursor)
+                after = f'&or=(updated_at.gt.{updated_at},and(updated_at.eq.{updated_at},id.gt.{row_id}))'
+            elif cursor:
+                after = f'&updated_at=gt.{quote(cursor[0])}'
+            page = self._get(f'{table}?select={select}{extra}{after}'
+                             f'&order=updated_at.asc,id.asc&limit={PAGE_SIZE}')
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            cursor = (page[-1]['updated_at'], page[-1]['id'])
+
+    def watermarks(self) -> dict:
+        """{source: (updated_at, id)}; the id is None for watermarks saved before it was tracked."""
+        rows = self._get('insight_watermarks?select=source,watermark,watermark_id')
+        return {row['source']: (row['watermark'], row.get('watermark_id')) for row in rows}
+
+    def save_watermark(self, source: str, cursor: tuple):
+        config = settings.get()
+        headers = {**config.supabase_headers('service', write=True), 'Prefer': 'resolution=merge-duplicates'}
+        response = upstream.post(
+            config.rest_url('insight_watermarks?on_conflict=source'),
+            headers=headers,
+            json={'source': source, 'watermark': cursor[0], 'watermark_id': cursor[1]},
+            timeout=10
+        )
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"Failed to save {source} watermark: {response.status_code} {response.text}")
+
+    def failures(self) -> dict:
+        """{(pg_id, kind): failure row} for insights that failed on earlier passes."""
+        rows = self._get('insight_failures?select=pg_id,kind,attempts,source_updated_at')
+        return {(row['pg_id'], row['kind']): row for row in rows}
+
+    def record_failure(self, pg_id: str, kind: str, error: str, source_updated_at: str) -> int:
+        """Count a failed attempt; returns the attempts so far."""
+        config = settings.get()
+        response = upstream.post(
+            config.rest_url('rpc/record_insight_failure'),
+            headers=config.supabase_headers('service', write=True),
+            json={'p_pg_id': pg_id, 'p_kind': kind, 'p_error': error, 'p_source_updated_at': source_updated_at},
+            timeout=10
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to record {kind} failure: {response.status_code} {response.text}")
+        return int(response.json() or 0)
+
+    def clear_failure(self, pg_id: str, kind: str):
+        config = settings.get()
+        response = upstream.delete(
+            config.rest_url(f'insight_failures?pg_id=eq.{quote(pg_id)}&kind=eq.{kind}'),
+            headers=config.supabase_headers('service', write=True),
+            timeout=10
+        )
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"Failed to clear {kind} failure: {response.status_code} {response.text}")
+
+    def current_hashes(self, pg_ids: list) -> dict:
+        """{(pg_id, kind): source_hash} for the current insights of `pg_ids`."""
+        hashes = {}
+        for i in range(0, len(pg_ids), 100):
+            ids = ','.join(pg_ids[i:i + 100])
+            rows = self._get(f'listing_insights?select=pg_id,kind,source_hash&is_current=is.true&pg_id=in.({ids})')
+            for row in rows:
+                hashes[(row['pg_id'], row['kind'])] = row['source_hash']
+        return hashes
+
+    def store(self, pg_id: str, kind: str, digest: str, result: dict, source_updated_at: str):
+        config = settings.get()
+        response = upstream.post(
+            config.rest_url('rpc/store_listing_insight'),
+            headers=config.supabase_headers('service', write=True),
+            json={
+                'p_pg_id': pg_id,
+                'p_kind': kind,
+                'p_source_hash': digest,
+                'p_result': result,
+                'p_model': ai.model_for(kind),
+                'p_prompt_version': PROMPT_VERSION,
+                'p_source_updated_at': source_updated_at,
+            },
+            timeout=10
+        )
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"Failed to store {kind} insight: {response.status_code} {response.text}")
+
+    # ---- one pass -----------------------------------------------------------
+
+    def tasks(self, marks: dict, retries: list = ()) -> tuple:
+        """(tasks, changed rows). A task is (pg_id, kind, prompt, updated_at).
+
+        Changed rows are {source: [((updated_at, id), [(pg_id, kind)])]}: each
+        changed row, oldest first, with the tasks it feeds. `retries` are
+        insight_failures rows to try again.
+        """
+        listings = self._changed('pg_listings', LISTING_COLUMNS, marks.get('pg_listings'), '&status=eq.active')
+        changed_reviews = self._changed('reviews', 'id,pg_id,updated_at', marks.get('reviews'))
+
+        hidden = {pg['id']: pg for pg in listings}
+        names = {pg['id']: pg['name'] for pg in listings}
+        # Deleting a review doesn't touch `reviews`, but the rating trigger
+        # updates the listing, so changed listings with reviews are checked too
+        latest_review = {pg['id']: pg['updated_at'] for pg in listings if pg.get('total_reviews')}
+        for review in changed_reviews:
+            latest_review[review['pg_id']] = max(review['updated_at'], latest_review.get(review['pg_id'], ''))
+
+        retry_listings = [row['pg_id'] for row in retries
+                          if row['kind'] == 'hidden_charges' and row['pg_id'] not in hidden]
+        for i in range(0, len(retry_listings), 100):
+            for pg in self._get(f"pg_listings?select={LISTING_COLUMNS}&status=eq.active"
+                                f"&id=in.({','.join(retry_listings[i:i + 100])})"):
+                hidden[pg['id']] = pg
+                names[pg['id']] = pg['name']
+        for row in retries:
+            if row['kind'] == 'sentiment':
+                latest_review.setdefault(row['pg_id'], row['source_updated_at'])
+
+        tasks = []
+        for pg_id, pg in hidden.items():
+            prompt = hidden_charges_prompt(hidden_charges_input(pg))
+            tasks.append((pg_id, 'hidden_charges', prompt, pg['updated_at']))
+
+        missing = [pg_id for pg_id in latest_review if pg_id not in names]
+        for i in range(0, len(missing), 100):
+            for pg in self._get(f"pg_listings?select=id,name&id=in.({','.join(missing[i:i + 100])})"):
+                names[pg['id']] = pg['name']
+        for pg_id, updated_at in latest_review.items():
+            reviews = self._get(f'reviews?select=review_text&pg_id=eq.{pg_id}&order=created_at.desc')
+            if not reviews:
+                continue
+            prompt = sentiment_prompt(reviews, names.get(pg_id) or 'this property')
+            tasks.append((pg_id, 'sentiment', prompt, updated_at))
+
+        changed = {
+            'pg_listings': [((pg['updated_at'], pg['id']),
+                             [(pg['id'], kind) for kind in KINDS if kind == 'hidden_charges' or pg.get('total_reviews')])
+                            for pg in listings],
+            'reviews': [((review['updated_at'], review['id']), [(review['pg_id'], 'sentiment')])
+                        for review in changed_reviews],
+        }
+        return tasks, changed
+
+    def run_once(self) -> dict:
+        """Recompute insights for everything changed since the watermarks, plus earlier failures."""
+        marks = self.watermarks()
+        failures = self.failures()
+        retries = [row for row in failures.values() if row['attempts'] < self.max_attempts]
+        tasks, changed = self.tasks(marks, retries)
+        hashes = self.current_hashes(sorted({task[0] for task in tasks}))
+        counts = {'computed': 0, 'unchanged': 0, 'failed': 0, 'dead_lettered': 0, 'skipped': 0}
+        skipped = set()
+        counts_lock = threading.Lock()
+        stop = threading.Event()
+
+        def run(task):
+            pg_id, kind, prompt, updated_at = task
+            digest = source_hash(kind, prompt)
+            if hashes.get((pg_id, kind)) == digest:
+                outcome = 'unchanged'
+            elif stop.is_set():
+                outcome = 'skipped'
+            else:
+                try:
+                    self.store(pg_id, kind, digest, analyze(kind, prompt), updated_at)
+                    outcome = 'computed'
+                except resilience.UpstreamUnavailable as e:
+                    # Rate limited or circuit open: leave the rest for the next pass
+                    print(f"Insight job pausing: {str(e)}")
+                    stop.set()
+                    outcome = 'skipped'
+                except Exception as e:
+                    print(f"Error computing {kind} insight for {pg_id}: {str(e)}")
+                    try:
+                        attempts = self.record_failure(pg_id, kind, str(e), updated_at)
+                        outcome = 'failed' if attempts < self.max_attempts else 'dead_lettered'
+                    except Exception as record_error:
+                        print(f"Error recording {kind} failure for {pg_id}: {str(record_error)}")
+                        outcome = 'skipped'
+            if outcome in ('computed', 'unchanged') and (pg_id, kind) in failures:
+                try:
+                    self.clear_failure(pg_id, kind)
+                except Exception as e:
+                    # Retried (and found unchanged) next pass
+                    print(f"Error clearing {kind} failure for {pg_id}: {str(e)}")
+            insight_jobs.inc(kind=kind, outcome=outcome)
+            with counts_lock:
+                counts[outcome] += 1
+                if outcome == 'skipped':
+                    skipped.add((pg_id, kind))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='insights') as pool:
+            list(pool.map(run, tasks))
+
+        # Failures are queued in insight_failures, so a watermark moves past
+        # every row whose insights were stored, unchanged or queued, stopping
+        # at the first row with an insight left for the next pass
+        for source, rows in changed.items():
+            cursor = None
+            for row_cursor, keys in rows:
+                if any(key in skipped for key in keys):
+                    break
+                cursor = row_cursor
+            if cursor is not None:
+                self.save_watermark(source, cursor)
+        return counts
+
+    def run_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                counts = self.run_once()
+                print(f"Insight pass: {json.dumps(counts)} in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"Error in insight pass: {str(e)}")
+            time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Precompute listing insights (sentiment, hidden charges)')
+    parser.add_argument('--once', action='store_true', help='run a single pass and exit')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('INSIGHTS_WORKERS', 2)))
+    parser.add_argument('--interval', type=float, default=float(os.getenv('INSIGHTS_POLL_INTERVAL', 60)))
+    parser.add_argument('--max-attempts', type=int, default=int(os.getenv('INSIGHTS_MAX_ATTEMPTS', 5)))
+    args = parser.parse_args(argv)
+
+    config = settings.get()
+    if not config.service_role_configured:
+        print("SUPABASE_SERVICE_ROLE_KEY is required for the insight job")
+        return 1
+    job = InsightJob(workers=args.workers, poll_interval=args.interval, max_attempts=args.max_attempts)
+    if args.once:
+        print(json.dumps(job.run_once()))
+        return 0
+    job.run_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
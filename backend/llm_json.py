@@ -0,0 +1,223 @@
+"""Shared parser for JSON embedded in LLM responses.
+
+Models wrap JSON in markdown fences, prefix it with "Here's the analysis:",
+append commentary, or run out of tokens half-way through. `parse()` handles
+all of these in one pass: the C decoder (`raw_decode`) reads the first JSON
+value in place and ignores whatever surrounds it. Only when that fails does a
+Python scan track bracket depth and string state to skip brace-y prose as a
+whole, drop trailing commas or, when the response was cut off, close it at
+the last complete element so truncated output still yields usable data.
+
+Failures raise `json.JSONDecodeError`, so existing `except json.JSONDecodeError`
+fallbacks keep working.
+"""
+import json
+
+import metrics
+
+llm_json_results = metrics.registry.counter(
+    'smartstay_llm_json_parse_total',
+    'LLM responses parsed, by outcome (ok, salvaged, failed)',
+    ('outcome',)
+)
+
+_CLOSERS = {'{': '}', '[': ']'}
+_decoder = json.JSONDecoder()
+
+
+def _scan(text: str, start: int):
+    """Scan one bracketed value starting at `start` (an opening bracket).
+
+    Returns (end, balanced, commas, cut). `end` is the position after the
+    closing bracket (`balanced`) or after a mismatched one, or None when the
+    text ends first; then `cut` = (pos, stack) is the last position where the
+    value can be truncated and closed with the brackets in `stack`. `commas`
+    lists trailing commas (`[1, 2,]`) seen on the way.
+    """
+    stack = []
+    commas = []
+    in_string = False
+    escaped = False
+    last_comma = None
+    # The stack only changes where `cut` moves too, so the cut is closed with the final stack
+    cut = start + 1
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch in ' \t\r\n':
+            pass
+        elif ch == '"':
+            in_string = True
+            last_comma = None
+        elif ch == '{' or ch == '[':
+            stack.append(ch)
+            cut = i + 1
+            last_comma = None
+        elif ch == '}' or ch == ']':
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                # Mismatched bracket - not the JSON we are looking for
+                return i + 1, False, commas, None
+            if last_comma is not None:
+                commas.append(last_comma)
+                last_comma = None
+            stack.pop()
+            if not stack:
+                return i + 1, True, commas, None
+            cut = i + 1
+        elif ch == ',':
+            cut = i
+            last_comma = i
+        else:
+            last_comma = None
+        i += 1
+    return None, False, commas, (cut, stack)
+
+
+def _without(text: str, start: int, end: int, commas: list) -> str:
+    """text[start:end] minus the characters at `commas`."""
+    parts = []
+    for comma in commas:
+        if comma >= end:
+            break
+        parts.append(text[start:comma])
+        start = comma + 1
+    parts.append(text[start:end])
+    return ''.join(parts)
+
+
+def _loads(candidate: str):
+    try:
+        return json.loads(candidate)
+    except (json.JSONDecodeError, RecursionError):
+        return None
+
+
+def _fail(message: str, text: str, pos: int = 0):
+    llm_json_results.inc(outcome='failed')
+    raise json.JSONDecodeError(message, text, pos)
+
+
+def parse(text: str, salvage: bool = True, expect=dict):
+    """Return the first JSON value of type `expect` found in `text`.
+
+    Candidates are the top-level bracketed spans of `text`; a value nested in
+    a span that isn't valid JSON is never returned on its own. With `salvage`,
+    trailing commas are dropped and a response truncated mid-object is closed
+    at its last complete element. Raises json.JSONDecodeError if nothing usable
+    is found.
+    """
+    if not text:
+        _fail('Empty response', text or '')
+
+    opener = '{' if expect is dict else '[' if expect is list else None
+    pos = 0
+    truncated = None
+    while True:
+        if opener:
+            start = text.find(opener, pos)
+        else:
+            starts = [i for i in (text.find('{', pos), text.find('[', pos)) if i != -1]
+            start = min(starts) if starts else -1
+        if start == -1:
+            break
+
+        try:
+            value, end = _decoder.raw_decode(text, start)
+            if expect is None or isinstance(value, expect):
+                llm_json_results.inc(outcome='ok')
+                return value
+            pos = end
+            continue
+        except (json.JSONDecodeError, RecursionError):
+            pass
+
+        # Every candidate is scanned at most once and skipped as a whole, so a
+        # response costs one pass however it nests
+        end, balanced, commas, cut = _scan(text, start)
+        if end is None:
+            truncated = (start, commas, cut)
+            # Nothing after an unterminated value can be a complete one
+            break
+        if salvage and balanced and commas:
+            value = _loads(_without(text, start, end, commas))
+            if value is not None and (expect is None or isinstance(value, expect)):
+                llm_json_results.inc(outcome='salvaged')
+                return value
+        pos = end
+
+    if salvage and truncated is not None:
+        start, commas, (cut, stack) = truncated
+        candidate = (_without(text, start, cut, commas).rstrip().rstrip(',')
+                     + ''.join(_CLOSERS[b] for b in reversed(stack)))
+        value = _loads(candidate)
+        if value is not None and (expect is None or isinstance(value, expect)):
+            llm_json_results.inc(outcome='salvaged')
+            return value
+
+    _fail('No valid JSON found in response', text)
+
+
+class InvalidLLMOutput(json.JSONDecodeError):
+    """Parsed JSON that doesn't match the expected schema."""
+
+    def __init__(self, errors: list, doc: str):
+        self.errors = errors
+        super().__init__('; '.join(errors[:5]), doc, 0)
+
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'null': type(None),
+}
+
+
+def _is_type(value, name: str) -> bool:
+    # bool is an int subclass, but never a valid number here
+    if name in ('number', 'integer') and isinstance(value, bool):
+        return False
+    if name == 'integer' and isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, _TYPES[name])
+
+
+def validate(value, schema: dict, path: str = '$') -> list:
+    """Check `value` against a small JSON Schema subset; return error strings."""
+    errors = []
+    expected = schema.get('type')
+    if expected:
+        names = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(value, name) for name in names):
+            return [f'{path}: expected {"/".join(names)}, got {type(value).__name__}']
+
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f'{path}: {value!r} not one of {schema["enum"]}')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f'{path}: {value} < {schema["minimum"]}')
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f'{path}: {value} > {schema["maximum"]}')
+
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f'{path}: missing "{key}"')
+        for key, subschema in schema.get('properties', {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, f'{path}.{key}'))
+    elif isinstance(value, list) and 'items' in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema['items'], f'{path}[{i}]'))
+    return errors
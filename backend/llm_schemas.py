@@ -0,0 +1,74 @@
+"""Response schemas for the JSON-returning AI endpoints.
+
+A small JSON Schema subset (type, properties, required, items, enum, minimum,
+maximum) checked by `llm_json.validate`. Keep them loose enough that the
+route-level sanitizing still has something to work with - these exist to
+catch output that is the wrong shape, not to police wording.
+"""
+
+SENTIMENT = {
+    'type': 'object',
+    'required': ['overall_sentiment', 'positive_count', 'negative_count', 'neutral_count', 'insights', 'keywords'],
+    'properties': {
+        'overall_sentiment': {'type': 'string', 'enum': ['positive', 'negative', 'neutral']},
+        'positive_count': {'type': 'integer', 'minimum': 0},
+        'negative_count': {'type': 'integer', 'minimum': 0},
+        'neutral_count': {'type': 'integer', 'minimum': 0},
+        'insights': {'type': 'string'},
+        'keywords': {
+            'type': 'object',
+            'required': ['positive', 'negative'],
+            'properties': {
+                'positive': {'type': 'array', 'items': {'type': 'string'}},
+                'negative': {'type': 'array', 'items': {'type': 'string'}},
+            },
+        },
+    },
+}
+
+HIDDEN_CHARGES = {
+    'type': 'object',
+    'required': ['risk_level', 'potential_hidden_charges', 'transparency_score'],
+    'properties': {
+        'risk_level': {'type': 'string', 'enum': ['low', 'medium', 'high']},
+        'potential_hidden_charges': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['charge', 'reason'],
+                'properties': {'charge': {'type': 'string'}, 'reason': {'type': 'string'}},
+            },
+        },
+        'missing_information': {'type': 'array', 'items': {'type': 'string'}},
+        'questions_to_ask': {'type': 'array', 'items': {'type': 'string'}},
+        'transparency_score': {'type': 'number', 'minimum': 0, 'maximum': 100},
+    },
+}
+
+RECOMMENDATIONS = {
+    'type': 'object',
+    'required': ['recommendations'],
+    'properties': {
+        'recommendations': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'required': ['pg_id', 'match_score', 'match_reasons'],
+                'properties': {
+                    'pg_id': {'type': ['string', 'integer']},
+                    'match_score': {'type': 'number', 'minimum': 0, 'maximum': 100},
+                    'match_reasons': {'type': 'array', 'items': {'type': 'string'}},
+                },
+            },
+        },
+    },
+}
+
+CHATBOT = {
+    'type': 'object',
+    'required': ['response'],
+    'properties': {
+        'response': {'type': 'string'},
+        'suggested_actions': {'type': 'array', 'items': {'type': 'string'}},
+    },
+}
@@ -0,0 +1,257 @@
+"""In-process metrics exposed in Prometheus text format at /metrics.
+
+Deliberately tiny: counters, gauges and fixed-bucket histograms guarded by a
+lock each, so recording a sample is a dict lookup plus a bisect. Each gunicorn
+worker keeps its own registry - scrape every worker (or put one worker per
+container) when running more than one process.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import time
+
+# Seconds. Covers fast Supabase reads through slow LLM completions.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if not self.labelnames:
+            return ()
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last slot is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self._lock:
+            items = [(key, (list(state[0]), state[1])) for key, state in self._values.items()]
+        for key, (counts, total) in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# HTTP server side
+http_request_duration = registry.histogram(
+    'smartstay_http_request_duration_seconds',
+    'Flask request latency by route',
+    ('method', 'route', 'status')
+)
+http_requests_in_flight = registry.gauge(
+    'smartstay_http_requests_in_flight',
+    'Requests currently being handled',
+    ('method', 'route')
+)
+
+# Outbound calls (Groq, OpenRouteService, Supabase tables, storage)
+upstream_duration = registry.histogram(
+    'smartstay_upstream_request_duration_seconds',
+    'Outbound call latency by upstream service and target',
+    ('service', 'target')
+)
+upstream_errors = registry.counter(
+    'smartstay_upstream_errors_total',
+    'Outbound calls that raised or returned 429/5xx',
+    ('service', 'target', 'reason')
+)
+llm_tokens = registry.counter(
+    'smartstay_llm_tokens_total',
+    'LLM tokens reported by the provider',
+    ('model', 'kind')
+)
+
+
+@contextmanager
+def upstream_call(service: str, target: str):
+    """Time an outbound call; exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        upstream_errors.inc(service=service, target=target, reason=type(e).__name__)
+        raise
+    finally:
+        upstream_duration.observe(time.perf_counter() - start, service=service, target=target)
+
+
+def record_upstream_status(service: str, target: str, status_code: int):
+    if status_code == 429 or status_code >= 500:
+        upstream_errors.inc(service=service, target=target, reason=str(status_code))
+
+
+def record_llm_usage(model: str, usage):
+    """Record token counts from an OpenAI-compatible `usage` object (Groq)."""
+    if usage is None:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        count = getattr(usage, kind, None)
+        if count is None and isinstance(usage, dict):
+            count = usage.get(kind)
+        if count:
+            llm_tokens.inc(count, model=model, kind=kind.replace('_tokens', ''))
+
+
+def init_app(app):
+    """Record per-route latency and in-flight requests for a Flask app."""
+    from flask import g, request
+
+    def _route():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_route = _route()
+        http_requests_in_flight.inc(method=request.method, route=g._metrics_route)
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = g.pop('_metrics_route')
+            http_requests_in_flight.dec(method=request.method, route=route)
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=request.method, route=route, status=str(response.status_code)
+            )
+        return response
+
+    @app.teardown_request
+    def _release_in_flight(error):
+        # after_request is skipped on unhandled exceptions
+        if g.pop('_metrics_start', None) is not None:
+            http_requests_in_flight.dec(method=request.method, route=g.pop('_metrics_route'))
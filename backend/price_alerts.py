@@ -0,0 +1,268 @@
+"""Price-drop alert evaluator.
+
+A rent drop on `pg_listings` appends a row to `rent_change_events` (see
+CREATE_PRICE_ALERT_EVENTS.sql); this job consumes that queue instead of
+polling every alert:
+
+    python -m price_alerts            # poll forever (run it as its own process)
+    python -m price_alerts --once     # drain the queue once, e.g. from cron
+
+Every enabled, untriggered alert is held in an `AlertBook`: per listing, the
+alerts sorted by `target_price`, so the alerts a new rent satisfies
+(`target_price >= new_rent`) are one bisect away and listings without
+alerts cost a dict lookup. The book is loaded once, then kept current from
+`price_drop_alerts.updated_at` before every page of events, and reloaded in
+full every PRICE_ALERTS_FULL_RELOAD seconds to drop deleted alerts.
+
+Matches from a page of events are fired in batches of PRICE_ALERTS_FIRE_BATCH
+through the `fire_price_drop_alerts` RPC, which re-checks each alert, marks
+`triggered_at` and inserts the notifications in one statement. Events are
+deleted only after their alerts were fired, so a pass that fails is retried
+from the same events; an alert is never notified twice because the RPC only
+claims alerts whose `triggered_at` is still empty.
+
+Run a single evaluator per project: the queue has no consumer locking.
+"""
+from bisect import bisect_left, bisect_right
+from urllib.parse import quote
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+import settings
+import upstream
+
+load_dotenv()
+
+PAGE_SIZE = 1000
+ACK_BATCH = 500
+EVENT_COLUMNS = 'id,pg_id,owner_id,name,old_rent,new_rent'
+ALERT_COLUMNS = 'id,user_id,pg_id,target_price,is_enabled,triggered_at,updated_at'
+
+price_alert_events = metrics.registry.counter(
+    'smartstay_price_alert_events_total',
+    'Rent change events handled by the price alert evaluator, by outcome (matched, no_match)',
+    ('outcome',)
+)
+price_alerts_fired = metrics.registry.counter(
+    'smartstay_price_alerts_fired_total',
+    'Price drop alerts triggered (one notification each)'
+)
+price_alerts_tracked = metrics.registry.gauge(
+    'smartstay_price_alerts_tracked',
+    'Enabled, untriggered price drop alerts held by the evaluator'
+)
+
+
+class AlertBook:
+    """Armed alerts per listing, sorted by target price."""
+
+    def __init__(self):
+        # pg_id -> (target prices ascending, [(alert_id, user_id)] in the same order)
+        self._listings = {}
+        # alert_id -> (pg_id, target_price)
+        self._alerts = {}
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._alerts
+
+    def upsert(self, row: dict):
+        """Apply a `price_drop_alerts` row; disabled or triggered alerts are dropped."""
+        self.remove(row['id'])
+        if not row.get('is_enabled') or row.get('triggered_at'):
+            return
+        targets, alerts = self._listings.setdefault(row['pg_id'], ([], []))
+        target = int(row['target_price'])
+        position = bisect_right(targets, target)
+        targets.insert(position, target)
+        alerts.insert(position, (row['id'], row['user_id']))
+        self._alerts[row['id']] = (row['pg_id'], target)
+
+    def remove(self, alert_id: str):
+        entry = self._alerts.pop(alert_id, None)
+        if entry is None:
+            return
+        pg_id, target = entry
+        targets, alerts = self._listings[pg_id]
+        i = bisect_left(targets, target)
+        while alerts[i][0] != alert_id:
+            i += 1
+        del targets[i]
+        del alerts[i]
+        if not targets:
+            del self._listings[pg_id]
+
+    def matching(self, pg_id: str, rent: int) -> list:
+        """[(alert_id, user_id)] for the listing's alerts with target_price >= rent."""
+        entry = self._listings.get(pg_id)
+        if entry is None:
+            return []
+        targets, alerts = entry
+        return alerts[bisect_left(targets, rent):]
+
+
+class PriceAlertEvaluator:
+    def __init__(self, poll_interval: float = 5.0, full_reload: float = 3600.0, fire_batch: int = 500):
+        self.poll_interval = poll_interval
+        self.full_reload = full_reload
+        self.fire_batch = fire_batch
+        self.book = AlertBook()
+        # (updated_at, id) of the newest alert change applied to the book
+        self._cursor = None
+        self._next_full_reload = 0.0
+
+    # ---- Supabase helpers ---------------------------------------------------
+
+    def _get(self, path: str) -> list:
+        config = settings.get()
+        response = upstream.get(config.rest_url(path), headers=config.supabase_headers('service'), timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path.split('?')[0]} failed: {response.status_code} {response.text}")
+        return response.json()
+
+    def _fire(self, matches: list) -> int:
+        config = settings.get()
+        response = upstream.post(
+            config.rest_url('rpc/fire_price_drop_alerts'),
+            headers=config.supabase_headers('service', write=True),
+            json={'p_matches': matches},
+            timeout=30
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fire price alerts: {response.status_code} {response.text}")
+        return int(response.json() or 0)
+
+    def _ack(self, event_ids: list):
+        config = settings.get()
+        for i in range(0, len(event_ids), ACK_BATCH):
+            ids = ','.join(str(event_id) for event_id in event_ids[i:i + ACK_BATCH])
+            response = upstream.delete(
+                config.rest_url(f'rent_change_events?id=in.({ids})'),
+                headers=config.supabase_headers('service', write=True),
+                timeout=30
+            )
+            if response.status_code not in (200, 204):
+                raise RuntimeError(f"Failed to delete rent change events: {response.status_code} {response.text}")
+
+    # ---- alerts -------------------------------------------------------------
+
+    def refresh_alerts(self) -> int:
+        """Apply alert changes since the last refresh (all alerts when a full reload is due)."""
+        if time.monotonic() >= self._next_full_reload:
+            self._next_full_reload = time.monotonic() + self.full_reload
+            self.book = AlertBook()
+            self._cursor = None
+        # A full load only needs armed alerts; later changes must also evict
+        armed = '&is_enabled=is.true&triggered_at=is.null' if self._cursor is None else ''
+        applied = 0
+        while True:
+            after = ''
+            if self._cursor is not None:
+                # Keyset on (updated_at, id): one write can stamp many alerts with the same time
+                updated_at, alert_id = (quote(f'"{value}"') for value in self._cursor)
+                after = f'&or=(updated_at.gt.{updated_at},and(updated_at.eq.{updated_at},id.gt.{alert_id}))'
+            page = self._get(f'price_drop_alerts?select={ALERT_COLUMNS}{armed}{after}'
+                             f'&order=updated_at.asc,id.asc&limit={PAGE_SIZE}')
+            for row in page:
+                self.book.upsert(row)
+            applied += len(page)
+            if page:
+                self._cursor = (page[-1]['updated_at'], page[-1]['id'])
+            if len(page) < PAGE_SIZE:
+                break
+        price_alerts_tracked.set(len(self.book))
+        return applied
+
+    # ---- events -------------------------------------------------------------
+
+    def evaluate(self, events: list) -> list:
+        """Alerts met by a page of rent drops, as fire_price_drop_alerts() rows; each alert at most once."""
+        matches = []
+        seen = set()
+        for event in events:
+            new_rent = int(event['new_rent'])
+            alerts = self.book.matching(event['pg_id'], new_rent) if new_rent < int(event['old_rent']) else []
+            matched = False
+            for alert_id, user_id in alerts:
+                if alert_id in seen or user_id == event['owner_id']:
+                    continue
+                seen.add(alert_id)
+                matched = True
+                matches.append({'alert_id': alert_id, 'pg_id': event['pg_id'], 'name': event['name'],
+                                'old_rent': event['old_rent'], 'new_rent': new_rent})
+            price_alert_events.inc(outcome='matched' if matched else 'no_match')
+        return matches
+
+    def fire(self, matches: list) -> int:
+        fired = 0
+        for i in range(0, len(matches), self.fire_batch):
+            batch = matches[i:i + self.fire_batch]
+            fired += self._fire(batch)
+            # Fired or rejected by the RPC, these alerts are no longer armed
+            for match in batch:
+                self.book.remove(match['alert_id'])
+        price_alerts_fired.inc(fired)
+        price_alerts_tracked.set(len(self.book))
+        return fired
+
+    def run_once(self) -> dict:
+        """Drain the rent change queue."""
+        counts = {'events': 0, 'matched': 0, 'fired': 0}
+        while True:
+            events = self._get(f'rent_change_events?select={EVENT_COLUMNS}&order=id.asc&limit={PAGE_SIZE}')
+            if not events:
+                break
+            # After reading the events, so alerts created before a drop was queued are in the book
+            self.refresh_alerts()
+            matches = self.evaluate(events)
+            counts['fired'] += self.fire(matches)
+            self._ack([event['id'] for event in events])
+            counts['events'] += len(events)
+            counts['matched'] += len(matches)
+            if len(events) < PAGE_SIZE:
+                break
+        return counts
+
+    def run_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                counts = self.run_once()
+                if counts['events']:
+                    print(f"Price alert pass: {json.dumps(counts)} in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                print(f"Error in price alert pass: {str(e)}")
+            time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Evaluate price drop alerts against queued rent changes')
+    parser.add_argument('--once', action='store_true', help='drain the queue once and exit')
+    parser.add_argument('--interval', type=float, default=float(os.getenv('PRICE_ALERTS_POLL_INTERVAL', 5)))
+    parser.add_argument('--full-reload', type=float, default=float(os.getenv('PRICE_ALERTS_FULL_RELOAD', 3600)))
+    parser.add_argument('--fire-batch', type=int, default=int(os.getenv('PRICE_ALERTS_FIRE_BATCH', 500)))
+    args = parser.parse_args(argv)
+
+    config = settings.get()
+    if not config.service_role_configured:
+        print("SUPABASE_SERVICE_ROLE_KEY is required for the price alert evaluator")
+        return 1
+    evaluator = PriceAlertEvaluator(poll_interval=args.interval, full_reload=args.full_reload,
+                                    fire_batch=args.fire_batch)
+    if args.once:
+        print(json.dumps(evaluator.run_once()))
+        return 0
+    evaluator.run_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
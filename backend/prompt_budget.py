@@ -0,0 +1,242 @@
+"""Token budgets for the variable parts of AI prompts.
+
+Reviews, listings and chat history come straight from the client, so a PG
+with 800 reviews or a 40-message conversation used to produce a prompt (and a
+Groq bill and latency) that grew without bound. The helpers here count tokens
+locally and shrink each input to a per-endpoint budget, deterministically, so
+the same request always yields the same prompt:
+
+    fit_texts()          dedupe, then trim the longest texts first; sample
+                         evenly only if trimming alone can't fit
+    select_within_budget()  keep listings by priority, then by a stable hash
+    compress_history()   last few turns verbatim, older turns as a one-line digest
+                         (render_history() does the same for chat_sessions)
+
+Counting uses tiktoken's cl100k_base encoding when it is installed and
+otherwise a regex that splits words into <=4 character pieces, which slightly
+over-counts Llama's tokenizer (the safe direction for a budget).
+
+Budgets live in `settings.Settings.prompt_budgets` and can be overridden
+with PROMPT_BUDGET_<ENDPOINT>, e.g. PROMPT_BUDGET_SENTIMENT=2000 (picked up
+by a settings reload).
+"""
+import hashlib
+import importlib.util
+import re
+
+import metrics
+import settings
+
+# Shortest a text is trimmed to before we start dropping whole items instead
+MIN_ITEM_TOKENS = 24
+
+prompt_trims = metrics.registry.counter(
+    'smartstay_prompt_trimmed_total',
+    'Prompt inputs shrunk to fit a token budget, by endpoint and action (deduped, truncated, sampled, summarized)',
+    ('endpoint', 'action')
+)
+prompt_input_tokens = metrics.registry.histogram(
+    'smartstay_prompt_input_tokens',
+    'Estimated tokens of the variable prompt section after budgeting',
+    ('endpoint',),
+    buckets=(100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000)
+)
+
+_PIECE_RE = re.compile(r'\w{1,4}|[^\w\s]')
+_WS_RE = re.compile(r'\s+')
+
+_encoding = None
+if importlib.util.find_spec('tiktoken') is not None:
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        print(f"tiktoken unavailable, using the regex token estimate: {e}")
+
+
+def budget(endpoint: str) -> int:
+    return settings.get().prompt_budgets[endpoint]
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_PIECE_RE.findall(text))
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens`, at a word boundary where possible."""
+    if max_tokens <= 1:
+        return ''
+    # Leave room for the ellipsis
+    keep = max_tokens - 1
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = _encoding.decode(tokens[:keep])
+    else:
+        end = None
+        for i, match in enumerate(_PIECE_RE.finditer(text)):
+            if i == keep:
+                end = match.start()
+                break
+        if end is None or count_tokens(text) <= max_tokens:
+            return text
+        cut = text[:end]
+    space = cut.rfind(' ')
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip(' ,;:-') + '…'
+
+
+def _normalize(text: str) -> str:
+    return _WS_RE.sub(' ', text or '').strip()
+
+
+def _even_sample(n: int, k: int) -> list:
+    """k indexes spread evenly over range(n), in order."""
+    if k >= n:
+        return list(range(n))
+    if k <= 0:
+        return []
+    step = n / k
+    return [int(i * step) for i in range(k)]
+
+
+def fit_texts(texts: list, max_tokens: int, endpoint: str, per_item_max: int = 400) -> list:
+    """Dedupe and shrink `texts` so their total is within `max_tokens`.
+
+    Exact duplicates (ignoring case and whitespace) are dropped. If the rest
+    is still over budget, the longest texts are trimmed first to a common cap
+    (so one essay-length review can't crowd out ten short ones); only when
+    every text would fall below MIN_ITEM_TOKENS are whole texts dropped,
+    sampled evenly to keep the original mix.
+    """
+    seen = set()
+    unique = []
+    for text in texts:
+        text = _normalize(text)
+        key = text.casefold()
+        if text and key not in seen:
+            seen.add(key)
+            unique.append(text)
+    if len(unique) < len(texts):
+        prompt_trims.inc(len(texts) - len(unique), endpoint=endpoint, action='deduped')
+
+    if len(unique) * MIN_ITEM_TOKENS > max_tokens:
+        keep = max(1, max_tokens // MIN_ITEM_TOKENS)
+        prompt_trims.inc(len(unique) - keep, endpoint=endpoint, action='sampled')
+        unique = [unique[i] for i in _even_sample(len(unique), keep)]
+
+    sizes = [min(count_tokens(t), per_item_max) for t in unique]
+    cap = per_item_max
+    if sum(sizes) > max_tokens:
+        # Water-fill: largest cap c with sum(min(size, c)) <= budget
+        remaining = max_tokens
+        ordered = sorted(sizes)
+        cap = MIN_ITEM_TOKENS
+        for i, size in enumerate(ordered):
+            share = remaining // (len(ordered) - i)
+            if size > share:
+                cap = max(share, MIN_ITEM_TOKENS)
+                break
+            remaining -= size
+        else:
+            cap = per_item_max
+
+    result = []
+    truncated = 0
+    for text, size in zip(unique, sizes):
+        if count_tokens(text) > cap:
+            text = truncate(text, cap)
+            truncated += 1
+        result.append(text)
+    if truncated:
+        prompt_trims.inc(truncated, endpoint=endpoint, action='truncated')
+    prompt_input_tokens.observe(sum(min(s, cap) for s in sizes), endpoint=endpoint)
+    return result
+
+
+def _stable_rank(key) -> str:
+    return hashlib.sha1(str(key).encode()).hexdigest()
+
+
+def select_within_budget(items: list, render, max_tokens: int, endpoint: str, priority=None, key=None) -> list:
+    """Keep as many of `items` as fit, each costing count_tokens(render(item)).
+
+    Items are taken by `priority(item)` (lower first) and ties broken by a
+    stable hash of `key(item)`, so an oversized list is sampled the same way
+    on every call. The kept items are returned in their original order.
+    """
+    lines = [render(item) for item in items]
+    costs = [count_tokens(line) + 1 for line in lines]
+    if sum(costs) <= max_tokens:
+        prompt_input_tokens.observe(sum(costs), endpoint=endpoint)
+        return items
+
+    key = key or (lambda item: item)
+    order = sorted(
+        range(len(items)),
+        key=lambda i: (priority(items[i]) if priority else 0, _stable_rank(key(items[i])))
+    )
+    chosen = set()
+    used = 0
+    for i in order:
+        if used + costs[i] > max_tokens:
+            continue
+        chosen.add(i)
+        used += costs[i]
+    prompt_trims.inc(len(items) - len(chosen), endpoint=endpoint, action='sampled')
+    prompt_input_tokens.observe(used, endpoint=endpoint)
+    return [item for i, item in enumerate(items) if i in chosen]
+
+
+def topic(text: str) -> str:
+    """First sentence of a user message, short enough for a history digest."""
+    first = re.split(r'(?<=[.?!])\s', _normalize(text), maxsplit=1)[0]
+    return truncate(first, 20)
+
+
+def render_history(topics: list, recent: list, max_tokens: int, endpoint: str) -> str:
+    """Render a digest of earlier user questions (`topics`, oldest first) and
+    the `recent` messages within `max_tokens`; recent messages are kept nearly
+    verbatim, topics newest first while space lasts."""
+    def speaker(msg):
+        return 'User' if msg.get('role') == 'user' else 'Bot'
+
+    per_message = max(MIN_ITEM_TOKENS, (max_tokens * 2 // 3) // max(len(recent), 1))
+    recent_lines = [f"{speaker(m)}: {truncate(_normalize(m.get('content', '')), per_message)}" for m in recent]
+    used = sum(count_tokens(line) for line in recent_lines)
+
+    kept = []
+    for item in reversed(topics):
+        cost = count_tokens(item) + 1
+        if not item or used + cost > max_tokens:
+            break
+        kept.append(item)
+        used += cost
+
+    lines = []
+    if kept:
+        lines.append('Earlier: user asked ' + '; '.join(reversed(kept)))
+    lines.extend(recent_lines)
+    prompt_input_tokens.observe(used, endpoint=endpoint)
+    return '\n'.join(lines)
+
+
+def compress_history(messages: list, max_tokens: int, endpoint: str, keep_last: int = 2) -> str:
+    """Render chat history within `max_tokens`.
+
+    The last `keep_last` messages are kept nearly verbatim; older user
+    questions are folded into a single "Earlier:" line (first sentence of
+    each, newest kept first when space runs out).
+    """
+    recent = messages[-keep_last:] if keep_last else []
+    older = messages[:-keep_last] if keep_last else list(messages)
+    if older:
+        prompt_trims.inc(endpoint=endpoint, action='summarized')
+    topics = [topic(m.get('content', '')) for m in older if m.get('role') == 'user']
+    return render_history(topics, recent, max_tokens, endpoint)
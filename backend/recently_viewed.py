@@ -0,0 +1,304 @@
+"""Write-coalescing buffer for recently viewed PGs.
+
+Paging through search results fires a burst of POST /api/recently-viewed
+calls for the same (user_id, pg_id) keys. Views are collected in memory for a
+short window, deduped to the latest `viewed_at`, and flushed as a single
+multi-row upsert followed by one RPC that trims each touched user's history to
+`RECENTLY_VIEWED_MAX_PER_USER` rows (see CREATE_RECENTLY_VIEWED_TRIM.sql).
+
+Reads are served from `RecentlyViewedCache`: a bounded deque per user that is
+updated write-through on every view and hydrated lazily from the
+`recently_viewed` table joined with listing summaries. Views posted to other
+gunicorn workers only reach this worker through the table, so a user's list
+is re-read once it is older than RECENTLY_VIEWED_CACHE_TTL seconds.
+Hydration reads with the caller's own access token, so the table's RLS
+policies decide what is returned.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import quote
+import atexit
+import os
+import threading
+import time
+
+import settings
+import upstream
+
+# Client errors that say nothing about the rows themselves
+RETRYABLE_STATUSES = (401, 403, 408, 429)
+
+
+class RecentlyViewedBuffer:
+    def __init__(self, flush_interval: float = 2.0, max_batch: int = 500, max_per_user: int = 20):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_per_user = max_per_user
+        self._views = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+
+    def record(self, user_id: str, pg_id: str, viewed_at: str = None) -> str:
+        """Buffer a view. Repeated views of the same PG keep only the latest time."""
+        viewed_at = viewed_at or datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            key = (user_id, pg_id)
+            if viewed_at > self._views.get(key, ''):
+                self._views[key] = viewed_at
+            full = len(self._views) >= self.max_batch
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+        return viewed_at
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._views)
+
+    def flush(self) -> int:
+        """Write all buffered views in one upsert. Returns the number of rows written."""
+        with self._lock:
+            batch, self._views = self._views, {}
+        if not batch:
+            return 0
+
+        config = settings.get()
+        SUPABASE_URL = config.supabase_url
+        if not config.service_role_configured:
+            print(f"Supabase not configured, dropping {len(batch)} recently viewed rows")
+            return 0
+
+        headers = {**config.supabase_headers('service', write=True), 'Prefer': 'resolution=merge-duplicates'}
+        rows = [
+            {'user_id': user_id, 'pg_id': pg_id, 'viewed_at': viewed_at}
+            for (user_id, pg_id), viewed_at in batch.items()
+        ]
+
+        written, retry = self._write(rows, headers)
+        if retry:
+            self._requeue({(row['user_id'], row['pg_id']): row['viewed_at'] for row in retry})
+        if not written:
+            return 0
+
+        # Trim every touched user's history in the same flush
+        user_ids = sorted({row['user_id'] for row in written})
+        try:
+            response = upstream.post(
+                f'{SUPABASE_URL}/rest/v1/rpc/trim_recently_viewed',
+                headers=headers,
+                json={'user_ids': user_ids, 'keep_count': self.max_per_user},
+                timeout=10
+            )
+            if response.status_code not in [200, 204]:
+                print(f"Error trimming recently viewed: {response.text}")
+        except Exception as e:
+            print(f"Error trimming recently viewed: {str(e)}")
+
+        return len(written)
+
+    def _write(self, rows: list, headers: dict) -> tuple:
+        """Upsert `rows`; returns (rows written, rows to retry).
+
+        A row the database rejects (e.g. its listing was deleted) fails the
+        whole statement, so a rejected batch is split in halves until the bad
+        rows are isolated and dropped. Server, auth and network errors keep
+        the rows for the next window.
+        """
+        try:
+            response = upstream.post(
+                f'{settings.get().supabase_url}/rest/v1/recently_viewed?on_conflict=user_id,pg_id',
+                headers=headers,
+                json=rows,
+                timeout=10
+            )
+        except Exception as e:
+            print(f"Error flushing recently viewed: {str(e)}")
+            return [], rows
+        if response.status_code in (200, 201, 204):
+            return rows, []
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+            print(f"Error flushing recently viewed: {response.status_code} {response.text}")
+            return [], rows
+        if len(rows) == 1:
+            print(f"Dropping rejected recently viewed row {rows[0]}: {response.status_code} {response.text}")
+            return [], []
+        middle = len(rows) // 2
+        written, retry = self._write(rows[:middle], headers)
+        more_written, more_retry = self._write(rows[middle:], headers)
+        return written + more_written, retry + more_retry
+
+    def _requeue(self, batch: dict):
+        # Keep failed rows for the next window unless the buffer is already full
+        with self._lock:
+            for key, viewed_at in batch.items():
+                if len(self._views) >= self.max_batch * 4:
+                    break
+                if viewed_at > self._views.get(key, ''):
+                    self._views[key] = viewed_at
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork, so restart the flusher in each worker process
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='recently-viewed-flusher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+SUMMARY_FIELDS = 'id,name,rent,address,images'
+
+
+def _summarize(pg: dict) -> dict:
+    address = pg.get('address') or {}
+    images = pg.get('images') or []
+    return {
+        'id': pg.get('id'),
+        'name': pg.get('name'),
+        'rent': pg.get('rent'),
+        'city': address.get('city'),
+        'area': address.get('area'),
+        'image': images[0] if images else None,
+    }
+
+
+class RecentlyViewedCache:
+    def __init__(self, max_per_user: int = 20, max_users: int = 10000, max_summaries: int = 50000, ttl: float = 30.0):
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self.max_summaries = max_summaries
+        self.ttl = ttl
+        # user_id -> {'items': deque[(pg_id, viewed_at)], 'hydrated_at': monotonic time or None}
+        self._users = OrderedDict()
+        # pg_id -> listing summary
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: str) -> dict:
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = {'items': deque(maxlen=self.max_per_user), 'hydrated_at': None}
+            self._users[user_id] = entry
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return entry
+
+    def touch(self, user_id: str, pg_id: str, viewed_at: str):
+        """Write-through: move the PG to the front of the user's list."""
+        with self._lock:
+            items = self._entry(user_id)['items']
+            for i, (existing_pg, _) in enumerate(items):
+                if existing_pg == pg_id:
+                    del items[i]
+                    break
+            items.appendleft((pg_id, viewed_at))
+
+    def invalidate(self, user_id: str = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def get(self, user_id: str, access_token: str, limit: int = None) -> list:
+        """The user's list, newest first; `access_token` must belong to `user_id`."""
+        with self._lock:
+            hydrated_at = self._entry(user_id)['hydrated_at']
+        if hydrated_at is None or time.monotonic() - hydrated_at >= self.ttl:
+            self._hydrate(user_id, access_token)
+
+        with self._lock:
+            items = list(self._entry(user_id)['items'])[:limit or self.max_per_user]
+            missing = [pg_id for pg_id, _ in items if pg_id not in self._summaries]
+        if missing:
+            self._load_summaries(missing, access_token)
+
+        with self._lock:
+            results = []
+            for pg_id, viewed_at in items:
+                summary = self._summaries.get(pg_id)
+                if summary is None:
+                    # Listing was deleted or is no longer visible
+                    continue
+                results.append({**summary, 'viewed_at': viewed_at})
+            return results
+
+    def _store_summary(self, pg: dict):
+        self._summaries[pg['id']] = _summarize(pg)
+        self._summaries.move_to_end(pg['id'])
+        if len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    def _hydrate(self, user_id: str, access_token: str):
+        started = time.monotonic()
+        config = settings.get()
+        response = upstream.get(
+            config.rest_url(f'recently_viewed?user_id=eq.{quote(user_id)}'
+                            f'&select=pg_id,viewed_at,pg:pg_listings({SUMMARY_FIELDS})'
+                            f'&order=viewed_at.desc&limit={self.max_per_user}'),
+            headers=config.user_headers(access_token),
+            timeout=10
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to load recently viewed: {response.text}")
+
+        with self._lock:
+            entry = self._entry(user_id)
+            if entry['hydrated_at'] is not None and entry['hydrated_at'] >= started:
+                # A concurrent read already refreshed it
+                return
+            # Views recorded here may still be sitting in the write buffer, so
+            # merge rather than replace
+            merged = {pg_id: viewed_at for pg_id, viewed_at in entry['items']}
+            for row in response.json():
+                if row.get('pg'):
+                    self._store_summary(row['pg'])
+                if row['viewed_at'] > merged.get(row['pg_id'], ''):
+                    merged[row['pg_id']] = row['viewed_at']
+            ordered = sorted(merged.items(), key=lambda item: item[1], reverse=True)
+            entry['items'] = deque(ordered[:self.max_per_user], maxlen=self.max_per_user)
+            entry['hydrated_at'] = time.monotonic()
+
+    def _load_summaries(self, pg_ids: list, access_token: str):
+        config = settings.get()
+        response = upstream.get(
+            config.rest_url(f'pg_listings?id=in.({",".join(quote(pg_id) for pg_id in pg_ids)})'
+                            f'&select={SUMMARY_FIELDS}'),
+            headers=config.user_headers(access_token),
+            timeout=10
+        )
+        if response.status_code != 200:
+            print(f"Error loading listing summaries: {response.text}")
+            return
+        with self._lock:
+            for pg in response.json():
+                self._store_summary(pg)
+
+
+_config = settings.get()
+buffer = RecentlyViewedBuffer(
+    flush_interval=_config.recently_viewed_flush_interval,
+    max_batch=_config.recently_viewed_max_batch,
+    max_per_user=_config.recently_viewed_max_per_user,
+)
+
+cache = RecentlyViewedCache(
+    max_per_user=buffer.max_per_user,
+    max_users=_config.recently_viewed_cache_users,
+    ttl=_config.recently_viewed_cache_ttl,
+)
+
+# Don't lose the last window on a clean shutdown
+atexit.register(buffer.flush)
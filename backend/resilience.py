@@ -0,0 +1,238 @@
+"""Rate limiting and circuit breaking for flaky upstreams (Groq, OpenRouteService).
+
+Each guarded upstream has:
+
+- a token bucket sized to the provider's quota. Callers wait at most
+  `max_wait` seconds for a token; past that they are rejected immediately
+  instead of queueing into a 429. The rate is adaptive (AIMD): a 429 halves
+  it and honours Retry-After, and every success creeps it back up towards
+  the configured quota.
+- a circuit breaker. After `failure_threshold` consecutive failures
+  (timeouts, connection errors, 429/5xx) the circuit opens and every call
+  fails fast with `UpstreamUnavailable` for `reset_timeout` seconds; then a
+  single probe is let through (half-open) and its result closes or re-opens
+  the circuit.
+
+Routes catch `UpstreamUnavailable` and answer with their existing fallbacks
+(default hidden-charge analysis, demo travel modes), so during a provider
+incident tail latency is bounded by `max_wait` instead of the HTTP timeout.
+
+State is per process; quotas are divided by WEB_CONCURRENCY so a gunicorn
+deployment as a whole stays inside the provider limits. The per-worker rate
+is small (30 RPM over 4 workers refills one token every 8 s), so the bucket
+holds a worker's whole share of a minute, and at least MIN_BURST tokens:
+bursts of chat traffic are served at once, and only sustained load above
+the quota waits or is rejected.
+"""
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+import settings
+
+load_dotenv()
+
+# Smallest bucket a worker gets, however small its share of the quota
+MIN_BURST = 5
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state = metrics.registry.gauge(
+    'smartstay_circuit_state',
+    'Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)',
+    ('upstream',)
+)
+rejected_calls = metrics.registry.counter(
+    'smartstay_upstream_rejected_total',
+    'Calls failed fast without reaching the upstream, by reason (circuit_open, rate_limited)',
+    ('upstream', 'reason')
+)
+rate_limit = metrics.registry.gauge(
+    'smartstay_upstream_rate_limit',
+    'Current adaptive rate limit (requests/second) per upstream',
+    ('upstream',)
+)
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Raised instead of calling an upstream that is rate limited or unhealthy."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = None):
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f'{upstream} unavailable ({reason})')
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, min_rate: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 10
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait: float) -> bool:
+        """Take a token, waiting up to `max_wait` seconds. False if none came."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 1:
+                wait = max(wait, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return False
+            # Reserve the token now so concurrent callers queue behind us
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def penalize(self, retry_after: float = None):
+        """The provider said 429: halve the rate and pause for Retry-After."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+    def reward(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class Guard:
+    """Token bucket + circuit breaker for one upstream.
+
+    `burst` defaults to this worker's share of one minute's quota, floored at
+    MIN_BURST.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, burst: int = None, max_wait: float = 2.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        processes = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+        rate = requests_per_minute / 60.0 / processes
+        self.name = name
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst or max(MIN_BURST, int(requests_per_minute / processes)))
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        circuit_state.set(0, upstream=name)
+        rate_limit.set(rate, upstream=name)
+
+    def available(self) -> bool:
+        """Cheap check for routes that can skip straight to a fallback."""
+        return self.breaker.state != OPEN or self.breaker.retry_after() == 0
+
+    def before_call(self):
+        if not self.breaker.allow():
+            rejected_calls.inc(upstream=self.name, reason='circuit_open')
+            raise UpstreamUnavailable(self.name, 'circuit open', self.breaker.retry_after())
+        if not self.bucket.acquire(self.max_wait):
+            rejected_calls.inc(upstream=self.name, reason='rate_limited')
+            # Not a health failure, but a half-open probe must be released
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.record_failure()
+            raise UpstreamUnavailable(self.name, 'rate limited')
+
+    def record(self, status_code: int = None, error: Exception = None, retry_after: float = None):
+        """Report the outcome of a call that went through before_call()."""
+        if status_code == 429:
+            self.bucket.penalize(retry_after)
+            self.breaker.record_failure()
+        elif error is not None or (status_code is not None and status_code >= 500):
+            self.breaker.record_failure()
+        else:
+            self.bucket.reward()
+            self.breaker.record_success()
+        circuit_state.set(_STATE_VALUES[self.breaker.state], upstream=self.name)
+        rate_limit.set(self.bucket.rate, upstream=self.name)
+
+    @contextmanager
+    def call(self):
+        """Guard a call that signals failure by raising (the Groq SDK)."""
+        self.before_call()
+        try:
+            yield
+        except Exception as e:
+            status = getattr(e, 'status_code', None)
+            if status is not None and status < 500 and status != 429:
+                # 4xx means the upstream is healthy and rejected our request
+                self.record(status_code=status)
+            else:
+                self.record(status_code=status, error=e, retry_after=retry_after_from(e))
+            raise
+        else:
+            self.record()
+
+
+def retry_after_from(obj) -> float:
+    """Retry-After seconds from a response or an SDK error carrying one."""
+    response = getattr(obj, 'response', obj)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+# Sized once per process from settings.rate_limits; changes need a restart
+groq = Guard('groq', **settings.get().rate_limits['groq'])
+openrouteservice = Guard('openrouteservice', **settings.get().rate_limits['openrouteservice'])
+
+GUARDS = {'groq': groq, 'openrouteservice': openrouteservice}
+
+
+def guard_for(service: str):
+    return GUARDS.get(service)
@@ -0,0 +1,656 @@
+"""In-memory faceted search over active PG listings (GET /api/search).
+
+Every listing gets a slot number; each filterable value owns a bitmap (a
+Python int with bit `slot` set) so a query is a handful of big-integer ANDs:
+
+    gender / room_type / amenity / city / area   value -> bitmap
+    rent                                         fixed-width buckets -> bitmap,
+                                                 plus prefix unions for O(1) ranges
+    available / verified / alive                 one bitmap each
+
+Facet counts are `(result & bitmap).bit_count()`. Single-select facets
+(gender, room type, city) are disjunctive - counted with every filter except
+their own - so the UI can show how many results picking another value gives.
+
+Sorted pages come from precomputed per-sort orders: small result sets are
+materialized and sorted by rank, large ones are paged by walking the order and
+testing membership in a byte mask, so a page costs O(page) instead of
+O(results).
+
+A free-text query (`q`) is answered by text_search.TextIndex first; its
+matches become one more bitmap to intersect, and `sort=relevance` orders the
+page by BM25 score. Geo queries work the same way: geo_index.GeoIndex returns
+the listings within a radius with their distances, and `sort=distance` orders
+by them.
+
+`ListingIndex` loads all active listings on first use, then a background
+thread polls `pg_listings` for rows whose `updated_at` moved past the last
+watermark and applies them in place (rows that stopped being active are
+removed). That poll reads with the service role when it is configured:
+under RLS the anon key only sees active listings, so with the anon key a
+listing an admin deactivates vanishes from the poll and stays searchable
+until the next full rebuild (`settings.Settings.warnings()` says so at
+startup). Hard deletes don't bump `updated_at`, so the index is rebuilt from
+scratch every SEARCH_INDEX_FULL_REBUILD seconds as well.
+
+Each full rebuild is written to SEARCH_INDEX_SNAPSHOT. A worker that starts
+while the snapshot is younger than the full rebuild interval maps it instead
+of paging every listing out of Supabase, then catches up from the snapshot's
+watermark with an incremental refresh.
+"""
+from collections import OrderedDict
+from urllib.parse import quote
+import os
+import tempfile
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import geo_index
+import metrics
+import settings
+import text_search
+import upstream
+
+load_dotenv()
+
+RENT_BUCKET = 100
+# Recent rent ranges kept as ready-made bitmaps (cleared on every change)
+RENT_RANGE_CACHE = 64
+# Result sets larger than this are paged by walking the sort order
+DENSE_RESULTS = 2048
+SORTS = ('relevance', 'distance', 'rating', 'rent_asc', 'rent_desc', 'newest')
+# Nearest-k queries start at this radius and grow 4x until k listings match
+NEAREST_START_RADIUS_M = 1000
+FACET_LIMIT = 30
+
+INDEX_FIELDS = (
+    'id,name,description,address,gender,room_type,rent,deposit,amenities,images,is_available,available_beds,'
+    'is_verified,average_rating,total_reviews,nearest_college,distance_from_college,'
+    'latitude,longitude,status,created_at,updated_at'
+)
+
+search_index_size = metrics.registry.gauge(
+    'smartstay_search_index_listings',
+    'Active listings held in the in-memory search index'
+)
+search_index_refreshes = metrics.registry.counter(
+    'smartstay_search_index_refreshes_total',
+    'Search index refreshes by kind (full, incremental) and outcome',
+    ('kind', 'outcome')
+)
+search_index_snapshot_loads = metrics.registry.counter(
+    'smartstay_search_index_snapshot_loads_total',
+    'Worker start-ups that loaded the search index from the snapshot file, by outcome',
+    ('outcome',)
+)
+
+
+def _norm(value) -> str:
+    return str(value or '').strip().casefold()
+
+
+def _bitmap_from_slots(slots, size: int) -> int:
+    """Bulk-build a bitmap (much faster than OR-ing one bit at a time)."""
+    buf = bytearray((size >> 3) + 1)
+    for slot in slots:
+        buf[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def iter_slots(bits: int) -> list:
+    """Set bit positions in ascending order."""
+    text = bin(bits)
+    top = len(text) - 1
+    slots = []
+    i = text.rfind('1')
+    while i > 1:
+        slots.append(top - i)
+        i = text.rfind('1', 0, i)
+    return slots
+
+
+def _summary(pg: dict) -> dict:
+    """The fields search results carry (also accepts an existing summary)."""
+    address = pg.get('address') or {}
+    images = pg.get('images') or ([pg['image']] if pg.get('image') else [])
+    return {
+        'id': pg['id'],
+        'name': pg.get('name'),
+        'address': address,
+        'gender': pg.get('gender'),
+        'room_type': pg.get('room_type'),
+        'rent': pg.get('rent') or 0,
+        'deposit': pg.get('deposit'),
+        'amenities': pg.get('amenities') or [],
+        'image': images[0] if images else None,
+        'is_available': bool(pg.get('is_available')),
+        'available_beds': pg.get('available_beds'),
+        'is_verified': bool(pg.get('is_verified')),
+        'average_rating': float(pg.get('average_rating') or 0),
+        'total_reviews': pg.get('total_reviews') or 0,
+        'nearest_college': pg.get('nearest_college'),
+        'distance_from_college': pg.get('distance_from_college'),
+        'latitude': pg.get('latitude'),
+        'longitude': pg.get('longitude'),
+        'created_at': pg.get('created_at') or '',
+    }
+
+
+class FacetIndex:
+    """Bitmap index over listing summaries. Not thread-safe; see ListingIndex."""
+
+    def __init__(self):
+        self.docs = []
+        self.slot_of = {}
+        self.free = []
+        self.alive = 0
+        self.available = 0
+        self.verified = 0
+        self.gender = {}
+        self.room_type = {}
+        self.amenity = {}
+        self.city = {}
+        self.area = {}
+        self.rent_buckets = {}
+        # Display labels for facet values (first spelling seen)
+        self.labels = {}
+        self._derived_dirty = True
+        self._rent_prefix = []
+        self._orders = {}
+        self._ranks = {}
+        self._rent_ranges = OrderedDict()
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    # ---- building ---------------------------------------------------------
+
+    def _keys(self, doc: dict) -> list:
+        """(bitmap dict, key) pairs this document belongs to."""
+        address = doc['address']
+        city = _norm(address.get('city'))
+        keys = [
+            (self.gender, _norm(doc['gender'])),
+            (self.room_type, _norm(doc['room_type'])),
+            (self.city, city),
+            (self.area, (city, _norm(address.get('area')))),
+            (self.rent_buckets, int(doc['rent']) // RENT_BUCKET),
+        ]
+        keys.extend((self.amenity, _norm(a)) for a in doc['amenities'])
+        return keys
+
+    def _remember_labels(self, doc: dict):
+        address = doc['address']
+        for facet, raw in (('gender', doc['gender']), ('room_type', doc['room_type']),
+                           ('city', address.get('city'))):
+            self.labels.setdefault((facet, _norm(raw)), raw)
+        for amenity in doc['amenities']:
+            self.labels.setdefault(('amenities', _norm(amenity)), amenity)
+
+    def build(self, listings: list):
+        """Replace the contents with `listings` (bulk path)."""
+        self.__init__()
+        groups = {}
+        for slot, pg in enumerate(listings):
+            doc = _summary(pg)
+            self.docs.append(doc)
+            self.slot_of[doc['id']] = slot
+            self._remember_labels(doc)
+            for table, key in self._keys(doc):
+                groups.setdefault((id(table), key), (table, []))[1].append(slot)
+        size = len(self.docs)
+        for (_, key), (table, slots) in groups.items():
+            table[key] = _bitmap_from_slots(slots, size)
+        self.alive = (1 << size) - 1
+        self.available = _bitmap_from_slots(
+            [s for s, d in enumerate(self.docs) if d['is_available'] and (d['available_beds'] or 0) > 0], size)
+        self.verified = _bitmap_from_slots([s for s, d in enumerate(self.docs) if d['is_verified']], size)
+        self._derived_dirty = True
+
+    def upsert(self, pg: dict):
+        if pg['id'] in self.slot_of:
+            self.remove(pg['id'])
+        doc = _summary(pg)
+        slot = self.free.pop() if self.free else len(self.docs)
+        if slot == len(self.docs):
+            self.docs.append(doc)
+        else:
+            self.docs[slot] = doc
+        self.slot_of[doc['id']] = slot
+        self._remember_labels(doc)
+        bit = 1 << slot
+        for table, key in self._keys(doc):
+            table[key] = table.get(key, 0) | bit
+        self.alive |= bit
+        if doc['is_available'] and (doc['available_beds'] or 0) > 0:
+            self.available |= bit
+        if doc['is_verified']:
+            self.verified |= bit
+        self._derived_dirty = True
+
+    def remove(self, pg_id: str):
+        slot = self.slot_of.pop(pg_id, None)
+        if slot is None:
+            return
+        doc = self.docs[slot]
+        mask = ~(1 << slot)
+        for table, key in self._keys(doc):
+            remaining = table.get(key, 0) & mask
+            if remaining:
+                table[key] = remaining
+            else:
+                table.pop(key, None)
+        self.alive &= mask
+        self.available &= mask
+        self.verified &= mask
+        self.docs[slot] = None
+        self.free.append(slot)
+        self._derived_dirty = True
+
+    def rebuild_derived(self):
+        """Recompute rent prefix unions and sort orders after changes."""
+        if not self._derived_dirty:
+            return
+        prefix = []
+        running = 0
+        for bucket in range(max(self.rent_buckets, default=-1) + 1):
+            running |= self.rent_buckets.get(bucket, 0)
+            prefix.append(running)
+        self._rent_prefix = prefix
+        self._rent_ranges.clear()
+
+        live = [s for s, d in enumerate(self.docs) if d is not None]
+        docs = self.docs
+        orders = {
+            'rent_asc': sorted(live, key=lambda s: (docs[s]['rent'], docs[s]['id'])),
+            'rating': sorted(live, key=lambda s: (-docs[s]['average_rating'], -docs[s]['total_reviews'], docs[s]['id'])),
+            'newest': sorted(live, key=lambda s: (docs[s]['created_at'], docs[s]['id']), reverse=True),
+        }
+        orders['rent_desc'] = orders['rent_asc'][::-1]
+        ranks = {}
+        for name, order in orders.items():
+            rank = [0] * len(docs)
+            for i, slot in enumerate(order):
+                rank[slot] = i
+            ranks[name] = rank
+        self._orders = orders
+        self._ranks = ranks
+        self._derived_dirty = False
+
+    # ---- querying -----------------------------------------------------------
+
+    def _rent_bits(self, min_rent=None, max_rent=None) -> int:
+        """Bitmap of listings with min_rent <= rent <= max_rent (cached per range)."""
+        cache_key = (min_rent, max_rent)
+        bits = self._rent_ranges.get(cache_key)
+        if bits is None:
+            bits = self._rent_ranges[cache_key] = self._compute_rent_bits(min_rent, max_rent)
+            if len(self._rent_ranges) > RENT_RANGE_CACHE:
+                self._rent_ranges.popitem(last=False)
+        else:
+            self._rent_ranges.move_to_end(cache_key)
+        return bits
+
+    def _compute_rent_bits(self, min_rent, max_rent) -> int:
+        prefix = self._rent_prefix
+        if not prefix:
+            return 0
+        lo_bucket = max(0, int(min_rent) // RENT_BUCKET) if min_rent is not None else 0
+        hi_bucket = min(len(prefix) - 1, int(max_rent) // RENT_BUCKET) if max_rent is not None else len(prefix) - 1
+        if lo_bucket > hi_bucket:
+            return 0
+        # Whole buckets strictly between the edges need no per-listing check
+        inner = 0
+        if hi_bucket - 1 >= lo_bucket + 1:
+            inner = prefix[hi_bucket - 1] & ~prefix[lo_bucket]
+        result = inner
+        for bucket in {lo_bucket, hi_bucket}:
+            edge = self.rent_buckets.get(bucket, 0)
+            for slot in iter_slots(edge):
+                rent = self.docs[slot]['rent']
+                if (min_rent is None or rent >= min_rent) and (max_rent is None or rent <= max_rent):
+                    result |= 1 << slot
+        return result
+
+    def _any_of(self, table: dict, values) -> int:
+        bits = 0
+        for value in values:
+            bits |= table.get(value, 0)
+        return bits
+
+    def search(self, city=None, area=None, gender=(), room_type=(), amenities=(), min_rent=None,
+               max_rent=None, available=False, verified=False, sort='rating', offset=0, limit=20,
+               facets=True, matches: dict = None, distances: dict = None) -> dict:
+        """Filter, facet and page. Multi-valued args are OR within a field
+        (gender, room_type) except `amenities`, which must all be present.
+        `matches` (listing id -> relevance score) and `distances` (listing
+        id -> metres) restrict the search to those listings and enable
+        `sort='relevance'` and `sort='distance'` respectively."""
+        self.rebuild_derived()
+        city_key = _norm(city) if city else None
+        genders = [_norm(g) for g in gender]
+        rooms = [_norm(r) for r in room_type]
+
+        base = self.alive
+        slot_of = self.slot_of
+        for restriction in (matches, distances):
+            if restriction is not None:
+                base &= _bitmap_from_slots([slot_of[i] for i in restriction if i in slot_of], len(self.docs))
+        if available:
+            base &= self.available
+        if verified:
+            base &= self.verified
+        for amenity in amenities:
+            base &= self.amenity.get(_norm(amenity), 0)
+        if area:
+            base &= self.area.get((city_key, _norm(area)), 0) if city_key else \
+                self._any_of(self.area, [k for k in self.area if k[1] == _norm(area)])
+        if min_rent is not None or max_rent is not None:
+            base &= self._rent_bits(min_rent, max_rent)
+
+        filters = {
+            'city': self.city.get(city_key, 0) if city_key else None,
+            'gender': self._any_of(self.gender, genders) if genders else None,
+            'room_type': self._any_of(self.room_type, rooms) if rooms else None,
+        }
+        result = base
+        for bits in filters.values():
+            if bits is not None:
+                result &= bits
+
+        total = result.bit_count()
+        if sort not in SORTS or (sort == 'relevance' and matches is None) or \
+                (sort == 'distance' and distances is None):
+            sort = 'rating'
+        if sort == 'relevance':
+            page = self._page_by(result, lambda pg_id: -matches[pg_id], offset, limit)
+        elif sort == 'distance':
+            page = self._page_by(result, distances.__getitem__, offset, limit)
+        else:
+            page = self._page(result, total, sort, offset, limit)
+        results = [self.docs[s] for s in page]
+        if matches is not None or distances is not None:
+            results = [self._annotate(doc, matches, distances) for doc in results]
+        response = {'total': total, 'results': results}
+        if facets:
+            response['facets'] = self._facets(base, result, filters)
+        return response
+
+    def _page(self, result: int, total: int, sort: str, offset: int, limit: int) -> list:
+        if total == 0 or offset >= total:
+            return []
+        if total <= DENSE_RESULTS:
+            slots = iter_slots(result)
+            slots.sort(key=self._ranks[sort].__getitem__)
+            return slots[offset:offset + limit]
+        # Dense result: walk the global order and test membership in a byte mask
+        mask = result.to_bytes((len(self.docs) >> 3) + 1, 'little')
+        page = []
+        skipped = 0
+        for slot in self._orders[sort]:
+            if mask[slot >> 3] >> (slot & 7) & 1:
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page.append(slot)
+                if len(page) >= limit:
+                    break
+        return page
+
+    def _page_by(self, result: int, key, offset: int, limit: int) -> list:
+        """Page sorted by `key(listing id)`, ties broken by rating."""
+        docs = self.docs
+        rating = self._ranks['rating']
+        slots = iter_slots(result)
+        slots.sort(key=lambda s: (key(docs[s]['id']), rating[s]))
+        return slots[offset:offset + limit]
+
+    @staticmethod
+    def _annotate(doc: dict, matches: dict, distances: dict) -> dict:
+        doc = dict(doc)
+        if matches is not None:
+            doc['score'] = round(matches[doc['id']], 4)
+        if distances is not None:
+            doc['distance_m'] = round(distances[doc['id']])
+        return doc
+
+    def _facets(self, base: int, result: int, filters: dict) -> dict:
+        def others(name):
+            bits = base
+            for other, value in filters.items():
+                if other != name and value is not None:
+                    bits &= value
+            return bits
+
+        def counts(facet, table, scope):
+            values = {}
+            for key, bits in table.items():
+                count = (scope & bits).bit_count()
+                if count:
+                    values[self.labels.get((facet, key), key)] = count
+            top = sorted(values.items(), key=lambda item: (-item[1], str(item[0])))[:FACET_LIMIT]
+            return dict(top)
+
+        return {
+            'gender': counts('gender', self.gender, others('gender')),
+            'room_type': counts('room_type', self.room_type, others('room_type')),
+            'city': counts('city', self.city, others('city')),
+            'amenities': counts('amenities', self.amenity, result),
+        }
+
+
+class ListingIndex:
+    """FacetIndex kept in sync with Supabase by a background refresher."""
+
+    def __init__(self, refresh_interval: float = 30.0, full_rebuild_interval: float = 3600.0, page_size: int = 1000,
+                 snapshot_path: str = None):
+        self.refresh_interval = refresh_interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self.page_size = page_size
+        self.snapshot_path = snapshot_path
+        self.index = FacetIndex()
+        self.text = text_search.TextIndex()
+        self.geo = geo_index.GeoIndex()
+        self.watermark = None
+        self.loaded_at = 0.0
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def search(self, q: str = None, near: tuple = None, **query) -> dict:
+        """`near` is (lat, lng, radius in metres)."""
+        self._ensure_loaded()
+        with self._lock:
+            matches = self.text.search(q) if q else None
+            distances = self.geo.within(*near) if near else None
+            return self.index.search(matches=matches, distances=distances, **query)
+
+    def nearby(self, lat: float, lng: float, radius_m: float = None, k: int = None, **query) -> dict:
+        """Listings within `radius_m` of a point, or the `k` nearest ones that
+        pass the filters (searching out to geo_index.MAX_RADIUS_M)."""
+        query.setdefault('sort', 'distance')
+        if radius_m is not None:
+            result = self.search(near=(lat, lng, radius_m), **query)
+            result['radius_m'] = min(radius_m, geo_index.MAX_RADIUS_M)
+            return result
+        radius = NEAREST_START_RADIUS_M
+        while True:
+            result = self.search(near=(lat, lng, radius), offset=0, limit=k, **query)
+            if result['total'] >= k or radius >= geo_index.MAX_RADIUS_M:
+                result['radius_m'] = radius
+                return result
+            radius = min(radius * 4, geo_index.MAX_RADIUS_M)
+
+    def _ensure_loaded(self):
+        if self.loaded_at:
+            self._ensure_refresher()
+            return
+        with self._load_lock:
+            if not self.loaded_at and not self.load_snapshot():
+                self.full_rebuild()
+        self._ensure_refresher()
+
+    def load_snapshot(self) -> bool:
+        """Start from the snapshot file if it's recent enough. Returns whether it was used."""
+        path = self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            text, extra = text_search.read_snapshot(path)
+            age = time.time() - extra['built_at']
+            if age >= self.full_rebuild_interval:
+                search_index_snapshot_loads.inc(outcome='stale')
+                return False
+            index = FacetIndex()
+            index.build(extra['docs'])
+            index.rebuild_derived()
+            geo = geo_index.GeoIndex()
+            geo.build(index.docs)
+            geo.rebuild_derived()
+        except Exception as e:
+            print(f"Error loading search index snapshot: {str(e)}")
+            search_index_snapshot_loads.inc(outcome='error')
+            return False
+        with self._lock:
+            self.index = index
+            self.text = text
+            self.geo = geo
+            self.watermark = extra['watermark']
+            # Keep the full rebuild schedule of the process that wrote it
+            self.loaded_at = time.monotonic() - age
+        search_index_size.set(len(index))
+        search_index_snapshot_loads.inc(outcome='ok')
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error catching up search index snapshot: {str(e)}")
+        return True
+
+    def _write_snapshot(self, index: FacetIndex, text, watermark):
+        if not self.snapshot_path:
+            return
+        try:
+            text_search.write_snapshot(self.snapshot_path, text, {
+                'built_at': time.time(),
+                'watermark': watermark,
+                'docs': [doc for doc in index.docs if doc is not None],
+            })
+        except Exception as e:
+            print(f"Error writing search index snapshot: {str(e)}")
+
+    def _fetch(self, filters: str, order: str, role: str = 'anon') -> list:
+        """All matching listings, paged on `order` ('id' or 'updated_at') with `id` breaking ties."""
+        config = settings.get()
+        rows = []
+        after = ''
+        order_by = 'id.asc' if order == 'id' else f'{order}.asc,id.asc'
+        while True:
+            response = upstream.get(
+                config.rest_url(f'pg_listings?select={INDEX_FIELDS}{filters}{after}'
+                                f'&order={order_by}&limit={self.page_size}'),
+                headers=config.supabase_headers(role),
+                timeout=30
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Failed to load listings: {response.status_code} {response.text}")
+            page = response.json()
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            if order == 'id':
+                after = f'&id=gt.{quote(page[-1]["id"])}'
+            else:
+                # Keyset on (updated_at, id): a bulk update stamps many listings with the same time
+                value, last_id = (quote(f'"{page[-1][key]}"') for key in (order, 'id'))
+                after = f'&or=({order}.gt.{value},and({order}.eq.{value},id.gt.{last_id}))'
+
+    def full_rebuild(self):
+        """Load every active listing into a fresh index and swap it in."""
+        try:
+            rows = self._fetch('&status=eq.active', 'id')
+        except Exception:
+            search_index_refreshes.inc(kind='full', outcome='error')
+            raise
+        index = FacetIndex()
+        index.build(rows)
+        index.rebuild_derived()
+        text = text_search.TextIndex()
+        for row in rows:
+            text.add(row)
+        geo = geo_index.GeoIndex()
+        geo.build(index.docs)
+        geo.rebuild_derived()
+        watermark = max((r.get('updated_at') or '' for r in rows), default=None)
+        with self._lock:
+            self.index = index
+            self.text = text
+            self.geo = geo
+            self.watermark = watermark
+            self.loaded_at = time.monotonic()
+        search_index_size.set(len(index))
+        search_index_refreshes.inc(kind='full', outcome='ok')
+        self._write_snapshot(index, text, watermark)
+
+    def refresh(self) -> int:
+        """Apply listings changed since the watermark. Returns the number of rows applied."""
+        # gte, not gt: rows sharing the watermark timestamp may have been
+        # committed after the last poll; re-applying one is harmless
+        since = f'&updated_at=gte.{quote(self.watermark)}' if self.watermark else ''
+        try:
+            # Service role, so listings that stopped being active are seen and removed;
+            # the anon key still picks up new and edited active listings
+            role = 'service' if settings.get().service_role_configured else 'anon'
+            rows = self._fetch(since, 'updated_at', role=role)
+        except Exception:
+            search_index_refreshes.inc(kind='incremental', outcome='error')
+            raise
+        if rows:
+            with self._lock:
+                for row in rows:
+                    if row.get('status') == 'active':
+                        self.index.upsert(row)
+                        self.text.add(row)
+                        self.geo.upsert(row)
+                    else:
+                        self.index.remove(row['id'])
+                        self.text.remove(row['id'])
+                        self.geo.remove(row['id'])
+                    if (row.get('updated_at') or '') > (self.watermark or ''):
+                        self.watermark = row['updated_at']
+                self.index.rebuild_derived()
+                self.geo.rebuild_derived()
+            search_index_size.set(len(self.index))
+        search_index_refreshes.inc(kind='incremental', outcome='ok')
+        return len(rows)
+
+    def _ensure_refresher(self):
+        # Threads don't survive fork, so restart the refresher in each worker process
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._load_lock:
+            if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='search-index-refresher', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                if time.monotonic() - self.loaded_at >= self.full_rebuild_interval:
+                    self.full_rebuild()
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(f"Error refreshing search index: {str(e)}")
+
+
+listings = ListingIndex(
+    refresh_interval=float(os.getenv('SEARCH_INDEX_REFRESH_INTERVAL', 30)),
+    full_rebuild_interval=float(os.getenv('SEARCH_INDEX_FULL_REBUILD', 3600)),
+    snapshot_path=os.getenv('SEARCH_INDEX_SNAPSHOT', os.path.join(tempfile.gettempdir(), 'smartstay-search.idx')) or None,
+)
@@ -0,0 +1,322 @@
+"""Application settings, loaded once from the environment.
+
+Routes used to call `os.getenv()` for the Supabase and OpenRouteService
+credentials and rebuild the same header dicts on every request. `get()`
+returns an immutable `Settings` snapshot instead, with the headers for each
+key type prebuilt:
+
+    s = settings.get()
+    upstream.get(s.rest_url('pg_listings?select=id'), headers=s.supabase_headers())
+    upstream.post(s.rest_url('notifications'), headers=s.supabase_headers(write=True), json=...)
+
+Malformed values (non-numeric sizes, URLs without a scheme) fail at startup
+with `SettingsError` rather than on the first request; missing credentials
+only print a warning since the app runs fine without them in demo mode.
+
+`reload()` re-reads `.env` and swaps the snapshot atomically, so in-flight
+requests keep the one they started with. It runs on SIGHUP for the
+development server and in every gunicorn worker after fork (see
+gunicorn.conf.py); callbacks registered with `on_reload()` are told about the
+new snapshot (the AI provider uses this to rebuild its client).
+
+Only values read through `get()` at use time change on reload: credentials,
+models, prompt budgets, compression, the chatbot FAQ knobs. The chat session
+store, the recently-viewed buffer and cache and the rate limiters
+(`rate_limits`) size themselves from the snapshot at import, so a SIGHUP
+validates new values for them but they take effect on the next restart.
+Variables not listed here (worker pools, search index intervals, tracing)
+are still read by their own module at import and also need a restart.
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Optional
+import os
+import signal
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Values left over from .env.example count as unset
+PLACEHOLDER_PREFIX = 'your_'
+
+DEFAULT_PROMPT_BUDGETS = {
+    'sentiment': 3000,
+    'recommendations': 3500,
+    'chatbot_history': 600,
+}
+
+# Defaults match the providers' free-tier quotas; raise them for paid plans
+DEFAULT_RATE_LIMITS = {
+    'groq': ('GROQ', dict(requests_per_minute=30.0, max_wait=2.0)),
+    'openrouteservice': ('OPENROUTE', dict(requests_per_minute=40.0, max_wait=1.0)),
+}
+
+
+class SettingsError(ValueError):
+    """Raised when an environment variable has an unusable value."""
+
+
+def _str(name: str, default: str = None) -> Optional[str]:
+    value = os.getenv(name)
+    if value is None or not value.strip() or value.startswith(PLACEHOLDER_PREFIX):
+        return default
+    return value.strip()
+
+
+def _int(name: str, default: int) -> int:
+    value = _str(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise SettingsError(f'{name} must be an integer, got {value!r}')
+
+
+def _float(name: str, default: float) -> float:
+    value = _str(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise SettingsError(f'{name} must be a number, got {value!r}')
+
+
+def _url(name: str, default: str = None) -> Optional[str]:
+    value = _str(name, default)
+    if value is None:
+        return None
+    if not value.startswith(('http://', 'https://')):
+        raise SettingsError(f'{name} must start with http:// or https://, got {value!r}')
+    return value.rstrip('/')
+
+
+def _rate_limit(prefix: str, requests_per_minute: float, max_wait: float) -> Mapping:
+    burst = _int(f'{prefix}_RATE_LIMIT_BURST', 0)
+    return MappingProxyType(dict(
+        requests_per_minute=_float(f'{prefix}_RATE_LIMIT_RPM', requests_per_minute),
+        burst=burst or None,
+        max_wait=_float(f'{prefix}_RATE_LIMIT_MAX_WAIT', max_wait),
+        failure_threshold=_int(f'{prefix}_CIRCUIT_FAILURES', 5),
+        reset_timeout=_float(f'{prefix}_CIRCUIT_RESET', 30.0),
+    ))
+
+
+def _frozen(headers: dict) -> Mapping[str, str]:
+    return MappingProxyType(headers)
+
+
+@dataclass(frozen=True)
+class Settings:
+    supabase_url: Optional[str]
+    supabase_anon_key: Optional[str]
+    supabase_service_role_key: Optional[str]
+    openroute_api_key: Optional[str]
+    openroute_base_url: str
+    ai_provider: str
+    groq_api_key: Optional[str]
+    groq_model_fast: str
+    groq_model_quality: str
+    groq_hedge_percentile: float
+    groq_json_mode: bool
+    groq_timeout: float
+    groq_max_retries: int
+    resumable_upload_threshold: int
+    preview_url_ttl: int
+    prompt_budgets: Mapping[str, int]
+    http_compress_min_bytes: int
+    http_gzip_level: int
+    http_brotli_quality: int
+    http_watermark_max_age: float
+    chatbot_faq_threshold: float
+    chatbot_faq_min_accepts: int
+    chatbot_faq_refresh_interval: float
+    chatbot_feedback_ttl: int
+    # Read once when their module builds its singleton (see the module docstring)
+    chat_session_ttl: float
+    chat_session_max: int
+    chat_session_keep_messages: int
+    chat_session_max_topics: int
+    chat_session_flush_interval: float
+    recently_viewed_flush_interval: float
+    recently_viewed_max_batch: int
+    recently_viewed_max_per_user: int
+    recently_viewed_cache_users: int
+    recently_viewed_cache_ttl: float
+    rate_limits: Mapping[str, Mapping]
+    _headers: Mapping = field(repr=False, compare=False)
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        values = dict(
+            supabase_url=_url('SUPABASE_URL'),
+            supabase_anon_key=_str('SUPABASE_ANON_KEY'),
+            supabase_service_role_key=_str('SUPABASE_SERVICE_ROLE_KEY'),
+            openroute_api_key=_str('OPENROUTE_API_KEY'),
+            openroute_base_url=_url('OPENROUTE_BASE_URL', 'https://api.openrouteservice.org'),
+            ai_provider=_str('AI_PROVIDER', 'groq'),
+            groq_api_key=_str('GROQ_API_KEY'),
+            # GROQ_MODEL predates routing and still sets the fast tier
+            groq_model_fast=_str('GROQ_MODEL_FAST', _str('GROQ_MODEL', 'llama-3.1-8b-instant')),
+            groq_model_quality=_str('GROQ_MODEL_QUALITY', 'llama-3.3-70b-versatile'),
+            groq_hedge_percentile=_float('GROQ_HEDGE_PERCENTILE', 95.0),
+            groq_json_mode=_str('GROQ_JSON_MODE', '1') == '1',
+            groq_timeout=_float('GROQ_TIMEOUT', 30.0),
+            groq_max_retries=_int('GROQ_MAX_RETRIES', 1),
+            resumable_upload_threshold=_int('RESUMABLE_UPLOAD_THRESHOLD', 6 * 1024 * 1024),
+            # Outlives HTTP_WATERMARK_MAX_AGE, so a body revalidated with 304 still has working URLs
+            preview_url_ttl=_int('PREVIEW_URL_TTL', 3600),
+            # Token budget per prompt_budget endpoint, overridden by PROMPT_BUDGET_<ENDPOINT>
+            prompt_budgets=MappingProxyType({
+                endpoint: _int(f'PROMPT_BUDGET_{endpoint.upper()}', default)
+                for endpoint, default in DEFAULT_PROMPT_BUDGETS.items()
+            }),
+            http_compress_min_bytes=_int('HTTP_COMPRESS_MIN_BYTES', 1024),
+            http_gzip_level=_int('HTTP_GZIP_LEVEL', 6),
+            http_brotli_quality=_int('HTTP_BROTLI_QUALITY', 5),
+            http_watermark_max_age=_float('HTTP_WATERMARK_MAX_AGE', 300.0),
+            chatbot_faq_threshold=_float('CHATBOT_FAQ_THRESHOLD', 0.6),
+            chatbot_faq_min_accepts=_int('CHATBOT_FAQ_MIN_ACCEPTS', 3),
+            chatbot_faq_refresh_interval=_float('CHATBOT_FAQ_REFRESH_INTERVAL', 300.0),
+            chatbot_feedback_ttl=_int('CHATBOT_FEEDBACK_TTL', 7 * 24 * 3600),
+            chat_session_ttl=_float('CHAT_SESSION_TTL', 1800.0),
+            chat_session_max=_int('CHAT_SESSION_MAX', 10000),
+            chat_session_keep_messages=_int('CHAT_SESSION_KEEP_MESSAGES', 4),
+            chat_session_max_topics=_int('CHAT_SESSION_MAX_TOPICS', 12),
+            chat_session_flush_interval=_float('CHAT_SESSION_FLUSH_INTERVAL', 0.5),
+            recently_viewed_flush_interval=_float('RECENTLY_VIEWED_FLUSH_INTERVAL', 2.0),
+            recently_viewed_max_batch=_int('RECENTLY_VIEWED_MAX_BATCH', 500),
+            recently_viewed_max_per_user=_int('RECENTLY_VIEWED_MAX_PER_USER', 20),
+            recently_viewed_cache_users=_int('RECENTLY_VIEWED_CACHE_USERS', 10000),
+            recently_viewed_cache_ttl=_float('RECENTLY_VIEWED_CACHE_TTL', 30.0),
+            # Guard arguments per resilience upstream, overridden by <PREFIX>_RATE_LIMIT_* / <PREFIX>_CIRCUIT_*
+            rate_limits=MappingProxyType({
+                upstream: _rate_limit(prefix, **defaults)
+                for upstream, (prefix, defaults) in DEFAULT_RATE_LIMITS.items()
+            }),
+        )
+        return cls(**values, _headers=_build_headers(values))
+
+    @property
+    def supabase_configured(self) -> bool:
+        return bool(self.supabase_url and self.supabase_anon_key)
+
+    @property
+    def service_role_configured(self) -> bool:
+        return bool(self.supabase_url and self.supabase_service_role_key)
+
+    @property
+    def storage_key(self) -> Optional[str]:
+        """Key for storage signing/uploads: service role if set, else anon."""
+        return self.supabase_service_role_key or self.supabase_anon_key
+
+    def rest_url(self, path: str) -> str:
+        return f'{self.supabase_url}/rest/v1/{path}'
+
+    def supabase_headers(self, role: str = 'anon', write: bool = False) -> Mapping[str, str]:
+        """Prebuilt, read-only Supabase headers.
+
+        `role` is 'anon', 'service' or 'storage' (service role falling back
+        to anon). `write` adds the JSON content type and
+        `Prefer: return=representation`. Extend with `{**headers, ...}`.
+        """
+        return self._headers[(role, write)]
+
+    def user_headers(self, access_token: str) -> Mapping[str, str]:
+        """Read headers acting as a signed-in user, so their RLS policies apply."""
+        return {'apikey': self.supabase_anon_key or '', 'Authorization': f'Bearer {access_token}'}
+
+    @property
+    def openroute_headers(self) -> Mapping[str, str]:
+        return self._headers['openroute']
+
+    def warnings(self) -> list:
+        problems = []
+        if not self.supabase_configured:
+            problems.append('SUPABASE_URL / SUPABASE_ANON_KEY not set - database routes will fail')
+        if not self.supabase_service_role_key:
+            problems.append('SUPABASE_SERVICE_ROLE_KEY not set - recently viewed and previews are disabled, '
+                            'deactivated listings leave search only on the full index rebuild')
+        if not self.openroute_api_key:
+            problems.append('OPENROUTE_API_KEY not set - travel time runs in demo mode')
+        if not self.groq_api_key:
+            problems.append('GROQ_API_KEY not set - AI routes are disabled')
+        return problems
+
+
+def _build_headers(values: dict) -> Mapping:
+    keys = {
+        'anon': values['supabase_anon_key'],
+        'service': values['supabase_service_role_key'],
+        'storage': values['supabase_service_role_key'] or values['supabase_anon_key'],
+    }
+    headers = {}
+    for role, key in keys.items():
+        read = {'apikey': key or '', 'Authorization': f'Bearer {key or ""}'}
+        headers[(role, False)] = _frozen(read)
+        headers[(role, True)] = _frozen({
+            **read,
+            'Content-Type': 'application/json',
+            'Prefer': 'return=representation'
+        })
+    headers['openroute'] = _frozen({
+        'Authorization': values['openroute_api_key'] or '',
+        'Content-Type': 'application/json'
+    })
+    return MappingProxyType(headers)
+
+
+_current = Settings.from_env()
+_listeners = []
+_reload_lock = threading.Lock()
+
+
+def get() -> Settings:
+    return _current
+
+
+def on_reload(callback):
+    """Call `callback(new_settings)` after every successful reload."""
+    _listeners.append(callback)
+    return callback
+
+
+def reload() -> Settings:
+    """Re-read .env (overriding the process environment) and swap the snapshot.
+
+    A bad value keeps the previous settings in place and re-raises.
+    """
+    global _current
+    with _reload_lock:
+        load_dotenv(override=True)
+        new = Settings.from_env()
+        _current = new
+    for callback in list(_listeners):
+        try:
+            callback(new)
+        except Exception as e:
+            print(f"Error applying reloaded settings: {str(e)}")
+    for problem in new.warnings():
+        print(f"⚠️  {problem}")
+    return new
+
+
+def install_reload_signal(signum=getattr(signal, 'SIGHUP', None)):
+    """Reload on `signum` (SIGHUP by default). Must be called from the main thread.
+
+    See the module docstring for which settings apply without a restart.
+    """
+    if signum is None:
+        return
+
+    def _handler(*_):
+        try:
+            reload()
+            print("Settings reloaded")
+        except SettingsError as e:
+            print(f"Settings reload failed, keeping previous values: {str(e)}")
+
+    signal.signal(signum, _handler)
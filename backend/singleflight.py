@@ -0,0 +1,84 @@
+"""Request coalescing ("single flight") for identical concurrent calls.
+
+When a listing goes viral, dozens of people open it within the same second
+and each page load asks for the same sentiment analysis and hidden-charge
+check. `Group.do(key, fn)` lets the first caller for a key (the leader) run
+`fn` while every concurrent caller with the same key waits for that one
+result instead of making its own upstream call. Nothing is remembered once
+the call finishes - this only collapses calls that overlap in time, so it
+complements a cache rather than replacing one.
+
+Results handed to more than one caller are deep-copied so a route that
+post-processes its result in place can't affect the others. Exceptions are
+re-raised in every waiter.
+"""
+import copy
+import hashlib
+import json
+import threading
+
+import metrics
+
+singleflight_calls = metrics.registry.counter(
+    'smartstay_singleflight_calls_total',
+    'Calls through a single-flight group, by role (leader ran the call, follower shared it)',
+    ('group', 'name', 'role')
+)
+
+
+def key(*parts) -> str:
+    """Stable hash of JSON-serializable parts (dict key order doesn't matter)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: str, fn, name: str = ''):
+        """Run `fn()` once per concurrent `key` and return its result to every caller."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            singleflight_calls.inc(group=self.name, name=name, role='follower')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        singleflight_calls.inc(group=self.name, name=name, role='leader')
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.followers > 0
+            call.done.set()
+        # Followers copy from call.result, so the leader must not get the original either
+        return copy.deepcopy(call.result) if shared else call.result
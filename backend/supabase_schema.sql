@@ -107,6 +107,7 @@ CREATE TABLE pg_listings (
   strictness_level INTEGER CHECK (strictness_level >= 1 AND strictness_level <= 5) DEFAULT 3,
   average_rating NUMERIC(3, 2) DEFAULT 0,
   total_reviews INTEGER DEFAULT 0,
+  rating_sum BIGINT DEFAULT 0 NOT NULL, -- running sum of review ratings
   
   -- Media
   images TEXT[] DEFAULT '{}',
@@ -379,10 +380,12 @@ CREATE TABLE verification_documents (
   review_notes TEXT,
   reviewed_at TIMESTAMP WITH TIME ZONE,
   
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
 );
 
 CREATE INDEX idx_verification_owner ON verification_documents(owner_id);
+CREATE INDEX idx_verification_updated ON verification_documents(updated_at DESC);
 CREATE INDEX idx_verification_status ON verification_documents(status);
 CREATE INDEX idx_verification_type ON verification_documents(document_type);
 
@@ -414,10 +417,12 @@ CREATE TABLE content_reports (
   resolution_notes TEXT,
   
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-  resolved_at TIMESTAMP WITH TIME ZONE
+  resolved_at TIMESTAMP WITH TIME ZONE,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
 );
 
 CREATE INDEX idx_reports_status ON content_reports(status);
+CREATE INDEX idx_reports_updated ON content_reports(updated_at DESC);
 CREATE INDEX idx_reports_type ON content_reports(content_type);
 CREATE INDEX idx_reports_reporter ON content_reports(reporter_id);
 
@@ -439,6 +444,27 @@ CREATE TABLE pg_metrics (
 CREATE INDEX idx_metrics_pg ON pg_metrics(pg_id);
 CREATE INDEX idx_metrics_date ON pg_metrics(date DESC);
 
+-- ============================================
+-- 1️⃣5️⃣ OWNER STATISTICS
+-- ============================================
+-- Per-owner listing totals for GET /api/analytics/owner-stats, kept current
+-- by the triggers on pg_listings below
+CREATE TABLE owner_stats (
+  owner_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+  total_listings INTEGER DEFAULT 0 NOT NULL,
+  total_views BIGINT DEFAULT 0 NOT NULL,
+  total_inquiries BIGINT DEFAULT 0 NOT NULL,
+  total_reviews INTEGER DEFAULT 0 NOT NULL,
+  rating_sum BIGINT DEFAULT 0 NOT NULL,
+  -- Average over all of the owner's reviews (not an average of listing averages)
+  avg_rating NUMERIC(3, 2) GENERATED ALWAYS AS (
+    CASE WHEN total_reviews > 0 THEN (rating_sum::NUMERIC / total_reviews)::NUMERIC(3,2) ELSE 0 END
+  ) STORED,
+  total_available_beds INTEGER DEFAULT 0 NOT NULL,
+  total_beds INTEGER DEFAULT 0 NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- ============================================
 -- TRIGGERS & FUNCTIONS
 -- ============================================
@@ -462,40 +488,166 @@ CREATE TRIGGER update_pg_listings_updated_at BEFORE UPDATE ON pg_listings
 CREATE TRIGGER update_reviews_updated_at BEFORE UPDATE ON reviews
   FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Also the ETag watermarks of GET /api/verification/documents and /api/reports
+CREATE TRIGGER update_verification_documents_updated_at BEFORE UPDATE ON verification_documents
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_content_reports_updated_at BEFORE UPDATE ON content_reports
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 -- ============================================
 -- Auto-update review count and average rating
 -- ============================================
-CREATE OR REPLACE FUNCTION update_pg_rating()
-RETURNS TRIGGER AS $$
-DECLARE
-  target_pg_id UUID;
+-- Applies each review's change to running totals instead of re-counting the
+-- PG's reviews (owner totals follow in the next section)
+CREATE OR REPLACE FUNCTION apply_pg_rating_delta(target_pg_id UUID, count_delta INTEGER, sum_delta INTEGER)
+RETURNS VOID AS $$
 BEGIN
-  -- Determine which PG to update
-  IF TG_OP = 'DELETE' THEN
-    target_pg_id := OLD.pg_id;
-  ELSE
-    target_pg_id := NEW.pg_id;
-  END IF;
-  
-  -- Update the pg_listing stats
   UPDATE pg_listings
-  SET 
-    total_reviews = (SELECT COUNT(*) FROM reviews WHERE pg_id = target_pg_id),
-    average_rating = COALESCE((SELECT AVG(rating)::NUMERIC(3,2) FROM reviews WHERE pg_id = target_pg_id), 0)
+  SET
+    total_reviews = total_reviews + count_delta,
+    rating_sum = rating_sum + sum_delta,
+    average_rating = CASE WHEN total_reviews + count_delta > 0
+      THEN ((rating_sum + sum_delta)::NUMERIC / (total_reviews + count_delta))::NUMERIC(3,2)
+      ELSE 0 END
   WHERE id = target_pg_id;
-  
-  -- Return appropriate row
-  IF TG_OP = 'DELETE' THEN
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_pg_rating()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 1, NEW.rating);
+    RETURN NEW;
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM apply_pg_rating_delta(OLD.pg_id, -1, -OLD.rating);
     RETURN OLD;
+  ELSIF OLD.pg_id = NEW.pg_id THEN
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 0, NEW.rating - OLD.rating);
   ELSE
-    RETURN NEW;
+    PERFORM apply_pg_rating_delta(OLD.pg_id, -1, -OLD.rating);
+    PERFORM apply_pg_rating_delta(NEW.pg_id, 1, NEW.rating);
   END IF;
+  RETURN NEW;
 END;
-$$ LANGUAGE plpgsql;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
 
-CREATE TRIGGER update_pg_rating_on_review AFTER INSERT OR UPDATE OR DELETE ON reviews
+CREATE TRIGGER update_pg_rating_on_review AFTER INSERT OR DELETE ON reviews
   FOR EACH ROW EXECUTE FUNCTION update_pg_rating();
 
+-- Vote count updates don't change the rating, so they don't fire this
+CREATE TRIGGER update_pg_rating_on_review_change AFTER UPDATE OF rating, pg_id ON reviews
+  FOR EACH ROW
+  WHEN (OLD.rating IS DISTINCT FROM NEW.rating OR OLD.pg_id IS DISTINCT FROM NEW.pg_id)
+  EXECUTE FUNCTION update_pg_rating();
+
+-- ============================================
+-- Auto-update owner statistics
+-- ============================================
+-- A listing write costs one single-row upsert of its owner's stats row
+
+-- Add (direction 1) or remove (direction -1) a listing's contribution to its owner's row
+CREATE OR REPLACE FUNCTION apply_owner_stats_delta(listing pg_listings, direction INTEGER)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO owner_stats AS s (
+    owner_id, total_listings, total_views, total_inquiries, total_reviews, rating_sum,
+    total_available_beds, total_beds
+  ) VALUES (
+    listing.owner_id,
+    direction,
+    direction * COALESCE(listing.views, 0),
+    direction * COALESCE(listing.inquiries, 0),
+    direction * COALESCE(listing.total_reviews, 0),
+    direction * COALESCE(listing.rating_sum, 0),
+    direction * COALESCE(listing.available_beds, 0),
+    direction * COALESCE(listing.total_beds, 0)
+  )
+  ON CONFLICT (owner_id) DO UPDATE SET
+    total_listings = s.total_listings + EXCLUDED.total_listings,
+    total_views = s.total_views + EXCLUDED.total_views,
+    total_inquiries = s.total_inquiries + EXCLUDED.total_inquiries,
+    total_reviews = s.total_reviews + EXCLUDED.total_reviews,
+    rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+    total_available_beds = s.total_available_beds + EXCLUDED.total_available_beds,
+    total_beds = s.total_beds + EXCLUDED.total_beds,
+    updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_owner_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM apply_owner_stats_delta(OLD, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM apply_owner_stats_delta(NEW, 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER update_owner_stats_on_listing AFTER INSERT OR DELETE ON pg_listings
+  FOR EACH ROW EXECUTE FUNCTION update_owner_stats();
+CREATE TRIGGER update_owner_stats_on_listing_change
+  AFTER UPDATE OF owner_id, views, inquiries, total_reviews, rating_sum, available_beds, total_beds ON pg_listings
+  FOR EACH ROW
+  WHEN (
+    (OLD.owner_id, OLD.views, OLD.inquiries, OLD.total_reviews, OLD.rating_sum, OLD.available_beds, OLD.total_beds)
+    IS DISTINCT FROM
+    (NEW.owner_id, NEW.views, NEW.inquiries, NEW.total_reviews, NEW.rating_sum, NEW.available_beds, NEW.total_beds)
+  )
+  EXECUTE FUNCTION update_owner_stats();
+
+-- Full recompute from the base tables (backfill and reconciliation)
+CREATE OR REPLACE FUNCTION refresh_owner_stats()
+RETURNS VOID AS $$
+BEGIN
+  -- Lock out concurrent review/listing writes so no delta lands between the two steps
+  LOCK TABLE reviews, pg_listings IN SHARE ROW EXCLUSIVE MODE;
+
+  UPDATE pg_listings pg
+  SET
+    total_reviews = COALESCE(r.review_count, 0),
+    rating_sum = COALESCE(r.rating_total, 0),
+    average_rating = CASE WHEN COALESCE(r.review_count, 0) > 0
+      THEN (r.rating_total::NUMERIC / r.review_count)::NUMERIC(3,2) ELSE 0 END
+  FROM pg_listings base
+  LEFT JOIN (
+    SELECT pg_id, COUNT(*) AS review_count, SUM(rating) AS rating_total
+    FROM reviews
+    GROUP BY pg_id
+  ) r ON r.pg_id = base.id
+  WHERE pg.id = base.id
+    AND (pg.total_reviews, pg.rating_sum) IS DISTINCT FROM (COALESCE(r.review_count, 0), COALESCE(r.rating_total, 0));
+
+  DELETE FROM owner_stats;
+  INSERT INTO owner_stats (
+    owner_id, total_listings, total_views, total_inquiries, total_reviews, rating_sum,
+    total_available_beds, total_beds
+  )
+  SELECT
+    owner_id,
+    COUNT(*),
+    COALESCE(SUM(views), 0),
+    COALESCE(SUM(inquiries), 0),
+    COALESCE(SUM(total_reviews), 0),
+    COALESCE(SUM(rating_sum), 0),
+    COALESCE(SUM(available_beds), 0),
+    COALESCE(SUM(total_beds), 0)
+  FROM pg_listings
+  GROUP BY owner_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Backfill (a no-op on an empty database)
+SELECT refresh_owner_stats();
+
+REVOKE ALL ON FUNCTION refresh_owner_stats() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION refresh_owner_stats() TO service_role;
+
 -- ============================================
 -- Update last_message in chats
 -- ============================================
@@ -529,6 +681,7 @@ ALTER TABLE notifications ENABLE ROW LEVEL SECURITY;
 ALTER TABLE saved_pgs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE vacancy_alerts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE verification_documents ENABLE ROW LEVEL SECURITY;
+ALTER TABLE owner_stats ENABLE ROW LEVEL SECURITY;
 
 -- Profiles: Users can read all, update only their own
 CREATE POLICY "Profiles are viewable by everyone" ON profiles
@@ -641,6 +794,10 @@ CREATE POLICY "Owners can view own documents" ON verification_documents
 CREATE POLICY "Owners can upload documents" ON verification_documents
   FOR INSERT WITH CHECK (owner_id = auth.uid());
 
+-- Owner stats: every column is a sum of public pg_listings columns; only triggers write
+CREATE POLICY "Anyone can read owner stats" ON owner_stats
+  FOR SELECT USING (true);
+
 -- ============================================
 -- SEED DATA (Optional - for testing)
 -- ============================================
@@ -0,0 +1,80 @@
+import json
+import time
+
+import pytest
+
+import llm_json
+
+PAYLOAD = {'recommendations': [{'pg_id': 'a1', 'match_score': 91}, {'pg_id': 'b2', 'match_score': 78}]}
+BODY = json.dumps(PAYLOAD, indent=2)
+
+
+@pytest.mark.parametrize('text, expected', [
+    (BODY, PAYLOAD),
+    # fenced
+    (f'```json\n{BODY}\n```', PAYLOAD),
+    (f'```\n{BODY}\n```', PAYLOAD),
+    # prose around the JSON, including brace-y prose
+    (f"Here's the analysis:\n{BODY}\nLet me know if you need anything else!", PAYLOAD),
+    (f'Scores use the format {{score}} out of 100.\n{BODY}', PAYLOAD),
+    (f'{BODY}\n\nHappy to help {{always}}', PAYLOAD),
+    ('[see {a] and {"x": 1}', {'x': 1}),
+    # braces inside strings
+    ('{"reason": "Has Wi-Fi {fast} and \\"meals\\" [veg]"}', {'reason': 'Has Wi-Fi {fast} and "meals" [veg]'}),
+    # trailing commas
+    ('{"recs": [{"pg_id": 1}, {"pg_id": 2},], }', {'recs': [{'pg_id': 1}, {'pg_id': 2}]}),
+    ('Result: {"a": [1, 2, ], "b": {"c": 3,},}', {'a': [1, 2], 'b': {'c': 3}}),
+    ('{"a": ",]"  ,}', {'a': ',]'}),
+    # truncated by the token limit
+    ('{"recs": [{"pg_id": 1}, {"pg_id": 2}], "summary": "Both are wi', {'recs': [{'pg_id': 1}, {'pg_id': 2}]}),
+    ('{"recs": [{"pg_id": 1}, {"pg_id"', {'recs': [{'pg_id': 1}, {}]}),
+    ('{"recs": [{"pg_id": 1, "why": "Near \\"coll', {'recs': [{'pg_id': 1}]}),
+    ('{"a": [1, 2,], "b": {"c": "tr', {'a': [1, 2], 'b': {}}),
+    # nested
+    ('{"a": {"b": {"c": [1, {"d": null}]}}}', {'a': {'b': {'c': [1, {'d': None}]}}}),
+])
+def test_parse(text, expected):
+    assert llm_json.parse(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'no JSON here',
+    # a value nested in an invalid object is not the answer
+    '{"a": {"b": 1} junk }',
+    '{"a": {"b": 1} "c"}',
+])
+def test_parse_rejects(text):
+    with pytest.raises(json.JSONDecodeError):
+        llm_json.parse(text)
+
+
+def test_parse_skips_invalid_outer_for_later_value():
+    assert llm_json.parse('{"a": {"b": 1} junk } then {"ok": true}') == {'ok': True}
+
+
+def test_parse_expect():
+    text = 'Top picks: ["a1", "b2"] and {"note": "x"}'
+    assert llm_json.parse(text, expect=list) == ['a1', 'b2']
+    assert llm_json.parse(text) == {'note': 'x'}
+    assert llm_json.parse(text, expect=None) == ['a1', 'b2']
+
+
+def test_parse_without_salvage():
+    with pytest.raises(json.JSONDecodeError):
+        llm_json.parse('{"recs": [1, 2,]}', salvage=False)
+    with pytest.raises(json.JSONDecodeError):
+        llm_json.parse('{"recs": [1, 2', salvage=False)
+
+
+@pytest.mark.parametrize('text', [
+    '{a' * 5000 + '}' * 5000,
+    '[' * 5000 + ']' * 5000,
+    '{"a": [' * 20000,
+    '{' * 20000 + ']',
+])
+def test_parse_is_linear(text):
+    start = time.perf_counter()
+    with pytest.raises(json.JSONDecodeError):
+        llm_json.parse(text, expect=None)
+    assert time.perf_counter() - start < 1.0
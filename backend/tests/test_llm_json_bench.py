@@ -0,0 +1,54 @@
+"""Timing tests for llm_json.parse over the benchmark corpus (benchmarks/bench_llm_json.py).
+
+Each shape is parsed at 1KB, 10KB and 100KB. The per-size limits leave a wide
+margin over a laptop run so they only trip on a real regression (a
+quadratic scan, a per-character copy), not on a slow CI box.
+"""
+from functools import lru_cache
+import time
+
+import pytest
+
+import llm_json
+from benchmarks.bench_llm_json import build_corpus, correct
+
+SIZES_KB = (1, 10, 100)
+SHAPES = [shape for shape, _, _, _ in build_corpus(1)]
+# Seconds per parse, best of REPEAT
+LIMIT_PER_KB = 0.002
+LIMIT_BASE = 0.005
+REPEAT = 5
+
+
+@lru_cache(maxsize=None)
+def _corpus(size_kb: int) -> dict:
+    return {case[0]: case for case in build_corpus(size_kb)}
+
+
+def _corpus_case(size_kb: int, shape: str):
+    return _corpus(size_kb)[shape]
+
+
+def _best_time(text: str) -> float:
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        llm_json.parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+@pytest.mark.parametrize('size_kb', SIZES_KB)
+def test_parse_time(size_kb, shape):
+    _, text, expected, truncated = _corpus_case(size_kb, shape)
+    assert correct(llm_json.parse(text), expected, truncated)
+    assert _best_time(text) < LIMIT_BASE + LIMIT_PER_KB * size_kb
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_parse_time_scales_linearly(shape):
+    small = _best_time(_corpus_case(10, shape)[1])
+    large = _best_time(_corpus_case(100, shape)[1])
+    # 10x the input: linear is ~10x, quadratic ~100x
+    assert large < small * 30
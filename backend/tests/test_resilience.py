@@ -0,0 +1,196 @@
+import threading
+
+import pytest
+
+import resilience
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Guard, TokenBucket, UpstreamUnavailable
+
+
+class FakeClock:
+    """Stands in for the `time` module inside resilience: time only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, 'time', fake)
+    return fake
+
+
+def _concurrently(fn, threads: int = 20) -> list:
+    start = threading.Barrier(threads, timeout=5)
+    results = [None] * threads
+
+    def run(i):
+        start.wait()
+        results[i] = fn()
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(5)
+    return results
+
+
+# ---- TokenBucket --------------------------------------------------------------
+
+def test_bucket_hands_out_exactly_burst_tokens_to_concurrent_callers(clock):
+    bucket = TokenBucket(rate=1.0, burst=5)
+    results = _concurrently(lambda: bucket.acquire(max_wait=0))
+    assert results.count(True) == 5
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=0.5, burst=2)
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert not bucket.acquire(0)
+    clock.advance(2.0)
+    assert bucket.acquire(0)
+    assert not bucket.acquire(0)
+    # Never more than `burst` saved up
+    clock.advance(100.0)
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert not bucket.acquire(0)
+
+
+def test_bucket_waits_up_to_max_wait(clock):
+    bucket = TokenBucket(rate=1.0, burst=1)
+    assert bucket.acquire(0)
+    assert not bucket.acquire(max_wait=0.5)
+    assert bucket.acquire(max_wait=1.0)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_bucket_penalize_halves_rate_and_honours_retry_after(clock):
+    bucket = TokenBucket(rate=1.0, burst=3)
+    bucket.penalize(retry_after=10)
+    assert bucket.rate == 0.5
+    assert not bucket.acquire(max_wait=5)
+    clock.advance(10)
+    assert bucket.acquire(0)
+
+    for _ in range(10):
+        bucket.penalize()
+    assert bucket.rate == bucket.min_rate == pytest.approx(0.1)
+
+
+def test_bucket_reward_recovers_to_max_rate(clock):
+    bucket = TokenBucket(rate=1.0, burst=3)
+    bucket.penalize()
+    bucket.reward()
+    assert bucket.rate == pytest.approx(0.55)
+    for _ in range(20):
+        bucket.reward()
+    assert bucket.rate == 1.0
+
+
+# ---- CircuitBreaker -----------------------------------------------------------
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_breaker_lets_one_concurrent_probe_through_when_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    results = _concurrently(breaker.allow)
+    assert results.count(True) == 1
+    assert breaker.state == HALF_OPEN
+
+
+def test_breaker_probe_result_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+    # A failed probe re-opens at once, whatever the threshold
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert all(breaker.allow() for _ in range(3))
+
+
+# ---- Guard --------------------------------------------------------------------
+
+def test_guard_burst_is_a_minutes_share_per_worker(clock, monkeypatch):
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert Guard('test', requests_per_minute=30).bucket.burst == 7
+    assert Guard('test', requests_per_minute=8).bucket.burst == resilience.MIN_BURST
+    assert Guard('test', requests_per_minute=600).bucket.burst == 150
+    assert Guard('test', requests_per_minute=600, burst=3).bucket.burst == 3
+
+
+def test_guard_client_errors_do_not_open_the_circuit(clock):
+    guard = Guard('test', requests_per_minute=600, failure_threshold=2)
+
+    class ClientError(Exception):
+        status_code = 400
+
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            with guard.call():
+                raise ClientError()
+    assert guard.breaker.state == CLOSED
+
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            with guard.call():
+                raise TimeoutError()
+    assert guard.breaker.state == OPEN
+    with pytest.raises(UpstreamUnavailable) as info:
+        guard.before_call()
+    assert info.value.reason == 'circuit open'
+
+
+def test_guard_rate_limited_probe_releases_half_open(clock):
+    guard = Guard('test', requests_per_minute=60, burst=1, max_wait=0, failure_threshold=1, reset_timeout=30)
+    guard.before_call()
+    guard.record(status_code=503)
+    assert guard.breaker.state == OPEN
+    clock.advance(30)
+    # The bucket refilled meanwhile; drain it so the probe is rate limited
+    guard.bucket.acquire(0)
+    with pytest.raises(UpstreamUnavailable) as info:
+        guard.before_call()
+    assert info.value.reason == 'rate limited'
+    assert guard.breaker.state == OPEN
+
+
+def test_guard_429_penalizes_and_counts_as_failure(clock):
+    guard = Guard('test', requests_per_minute=60, failure_threshold=5)
+    guard.before_call()
+    guard.record(status_code=429, retry_after=5)
+    assert guard.bucket.rate == pytest.approx(0.5)
+    assert guard.breaker._failures == 1
@@ -0,0 +1,258 @@
+"""FacetIndex and GeoIndex checked against a brute-force scan of the same listings."""
+import random
+
+import pytest
+
+import geo_index
+import search_index
+from search_index import FacetIndex
+
+CITIES = {'Bengaluru': ('Koramangala', 'HSR Layout', 'Indiranagar'), 'Pune': ('Kothrud', 'Baner'),
+          'Chennai': ('Adyar',)}
+GENDERS = ('male', 'female', 'unisex')
+ROOM_TYPES = ('single', 'double', 'triple')
+AMENITIES = ('WiFi', 'AC', 'Meals', 'Laundry', 'Gym', 'Parking')
+CENTER = (12.9716, 77.5946)
+
+
+def make_listings(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    listings = []
+    for i in range(count):
+        city = rng.choice(list(CITIES))
+        point = (CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3))
+        if i % 17 == 0:
+            point = (None, None)
+        listings.append({
+            'id': f'pg-{i:05d}',
+            'name': f'PG {i}',
+            'address': {'city': city, 'area': rng.choice(CITIES[city])},
+            'gender': rng.choice(GENDERS),
+            'room_type': rng.choice(ROOM_TYPES),
+            'rent': rng.randrange(3000, 20000, 50),
+            'amenities': rng.sample(AMENITIES, rng.randint(0, 4)),
+            'is_available': rng.random() < 0.7,
+            'available_beds': rng.randint(0, 3),
+            'is_verified': rng.random() < 0.5,
+            'average_rating': round(rng.uniform(1, 5), 1),
+            'total_reviews': rng.randint(0, 200),
+            'created_at': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z',
+            'latitude': point[0],
+            'longitude': point[1],
+        })
+    return listings
+
+
+def random_query(rng: random.Random) -> dict:
+    query = {}
+    if rng.random() < 0.5:
+        query['city'] = rng.choice(list(CITIES))
+        if rng.random() < 0.4:
+            query['area'] = rng.choice(CITIES[query['city']])
+    if rng.random() < 0.5:
+        query['gender'] = rng.sample(GENDERS, rng.randint(1, 2))
+    if rng.random() < 0.4:
+        query['room_type'] = rng.sample(ROOM_TYPES, rng.randint(1, 2))
+    if rng.random() < 0.4:
+        query['amenities'] = rng.sample(AMENITIES, rng.randint(1, 2))
+    if rng.random() < 0.5:
+        query['min_rent'] = rng.randrange(2000, 15000, 75)
+    if rng.random() < 0.5:
+        query['max_rent'] = rng.randrange(5000, 22000, 75)
+    query['available'] = rng.random() < 0.3
+    query['verified'] = rng.random() < 0.3
+    return query
+
+
+# ---- brute force --------------------------------------------------------------
+
+def matches(pg: dict, query: dict, skip: str = None) -> bool:
+    city = pg['address']['city']
+    if skip != 'city' and query.get('city') and city != query['city']:
+        return False
+    if query.get('area') and pg['address']['area'] != query['area']:
+        return False
+    if skip != 'gender' and query.get('gender') and pg['gender'] not in query['gender']:
+        return False
+    if skip != 'room_type' and query.get('room_type') and pg['room_type'] not in query['room_type']:
+        return False
+    if not set(query.get('amenities', ())) <= set(pg['amenities']):
+        return False
+    if query.get('min_rent') is not None and pg['rent'] < query['min_rent']:
+        return False
+    if query.get('max_rent') is not None and pg['rent'] > query['max_rent']:
+        return False
+    if query.get('available') and not (pg['is_available'] and pg['available_beds'] > 0):
+        return False
+    if query.get('verified') and not pg['is_verified']:
+        return False
+    return True
+
+
+SORT_KEYS = {
+    'rating': lambda pg: (-pg['average_rating'], -pg['total_reviews'], pg['id']),
+    'rent_asc': lambda pg: (pg['rent'], pg['id']),
+}
+
+
+def brute_sorted(listings: list, sort: str) -> list:
+    if sort == 'newest':
+        return sorted(listings, key=lambda pg: (pg['created_at'], pg['id']), reverse=True)
+    if sort == 'rent_desc':
+        return sorted(listings, key=SORT_KEYS['rent_asc'], reverse=True)
+    return sorted(listings, key=SORT_KEYS[sort])
+
+
+def brute_counts(listings: list, field) -> dict:
+    counts = {}
+    for pg in listings:
+        for value in field(pg):
+            counts[value] = counts.get(value, 0) + 1
+    top = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:search_index.FACET_LIMIT]
+    return dict(top)
+
+
+def brute_facets(listings: list, query: dict) -> dict:
+    return {
+        'gender': brute_counts([pg for pg in listings if matches(pg, query, 'gender')], lambda pg: [pg['gender']]),
+        'room_type': brute_counts([pg for pg in listings if matches(pg, query, 'room_type')],
+                                  lambda pg: [pg['room_type']]),
+        'city': brute_counts([pg for pg in listings if matches(pg, query, 'city')],
+                             lambda pg: [pg['address']['city']]),
+        'amenities': brute_counts([pg for pg in listings if matches(pg, query)], lambda pg: pg['amenities']),
+    }
+
+
+def check_search(index: FacetIndex, listings: list, query: dict, sort: str, offset: int = 0, limit: int = 20):
+    response = index.search(sort=sort, offset=offset, limit=limit, **query)
+    expected = brute_sorted([pg for pg in listings if matches(pg, query)], sort)
+    assert response['total'] == len(expected)
+    assert [doc['id'] for doc in response['results']] == [pg['id'] for pg in expected[offset:offset + limit]]
+    assert response['facets'] == brute_facets(listings, query)
+
+
+# ---- facets -------------------------------------------------------------------
+
+@pytest.mark.parametrize('sort', ['rating', 'rent_asc', 'rent_desc', 'newest'])
+def test_search_matches_brute_force(sort):
+    listings = make_listings(800)
+    index = FacetIndex()
+    index.build(listings)
+    rng = random.Random(sort)
+    for _ in range(60):
+        check_search(index, listings, random_query(rng), sort, offset=rng.choice((0, 0, 5, 40)))
+
+
+def test_dense_results_page_like_brute_force(monkeypatch):
+    # Walk the global sort order instead of sorting the result set
+    monkeypatch.setattr(search_index, 'DENSE_RESULTS', 50)
+    listings = make_listings(600)
+    index = FacetIndex()
+    index.build(listings)
+    for sort in ('rating', 'rent_desc', 'newest'):
+        for offset in (0, 37, 250):
+            check_search(index, listings, {}, sort, offset=offset, limit=25)
+            check_search(index, listings, {'available': True}, sort, offset=offset, limit=25)
+
+
+def test_upserts_and_removes_match_a_fresh_build():
+    rng = random.Random(3)
+    listings = {pg['id']: pg for pg in make_listings(400)}
+    index = FacetIndex()
+    index.build(list(listings.values()))
+    extra = iter(make_listings(200, seed=99))
+    for step in range(300):
+        action = rng.random()
+        if action < 0.4:
+            pg_id = rng.choice(list(listings))
+            index.remove(pg_id)
+            del listings[pg_id]
+        elif action < 0.7:
+            pg = dict(rng.choice(list(listings.values())), rent=rng.randrange(3000, 20000, 50),
+                      gender=rng.choice(GENDERS), amenities=rng.sample(AMENITIES, 2))
+            index.upsert(pg)
+            listings[pg['id']] = pg
+        else:
+            pg = next(extra)
+            pg = dict(pg, id=f'new-{step}')
+            index.upsert(pg)
+            listings[pg['id']] = pg
+        if step % 25 == 0:
+            check_search(index, list(listings.values()), random_query(rng), 'rating')
+    for _ in range(30):
+        check_search(index, list(listings.values()), random_query(rng), rng.choice(('rent_asc', 'newest')))
+
+
+# ---- geo ----------------------------------------------------------------------
+
+@pytest.fixture(params=['python', 'numpy'])
+def geo_backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(geo_index, 'np', None)
+    return request.param
+
+
+def brute_within(listings: list, lat: float, lng: float, radius_m: float) -> dict:
+    found = {}
+    for pg in listings:
+        if pg['latitude'] is None:
+            continue
+        distance = geo_index.haversine(lat, lng, pg['latitude'], pg['longitude'])
+        if distance <= radius_m:
+            found[pg['id']] = distance
+    return found
+
+
+def test_within_matches_brute_force(geo_backend):
+    listings = make_listings(1500)
+    geo = geo_index.GeoIndex()
+    geo.build(listings)
+    rng = random.Random(11)
+    for _ in range(40):
+        lat = CENTER[0] + rng.uniform(-0.35, 0.35)
+        lng = CENTER[1] + rng.uniform(-0.35, 0.35)
+        radius = rng.choice((200, 1000, 3000, 10000, 40000))
+        found = geo.within(lat, lng, radius)
+        expected = brute_within(listings, lat, lng, radius)
+        assert found.keys() == expected.keys()
+        for pg_id, distance in expected.items():
+            assert found[pg_id] == pytest.approx(distance, abs=0.01)
+
+
+def test_within_follows_moves_and_removals(geo_backend):
+    listings = {pg['id']: pg for pg in make_listings(300)}
+    geo = geo_index.GeoIndex()
+    geo.build(listings.values())
+    rng = random.Random(5)
+    for pg_id in rng.sample(sorted(listings), 60):
+        if rng.random() < 0.5:
+            geo.remove(pg_id)
+            del listings[pg_id]
+        else:
+            moved = dict(listings[pg_id], latitude=CENTER[0] + rng.uniform(-0.05, 0.05),
+                         longitude=CENTER[1] + rng.uniform(-0.05, 0.05))
+            geo.upsert(moved)
+            listings[pg_id] = moved
+    found = geo.within(*CENTER, 8000)
+    assert found.keys() == brute_within(listings.values(), *CENTER, 8000).keys()
+
+
+def test_distance_sorted_search_matches_brute_force(geo_backend):
+    listings = make_listings(800)
+    index = FacetIndex()
+    index.build(listings)
+    geo = geo_index.GeoIndex()
+    geo.build(listings)
+    rng = random.Random(21)
+    for _ in range(20):
+        query = random_query(rng)
+        distances = geo.within(*CENTER, rng.choice((2000, 8000, 20000)))
+        response = index.search(distances=distances, sort='distance', limit=30, **query)
+        expected = [pg for pg in listings if pg['id'] in distances and matches(pg, query)]
+        expected.sort(key=lambda pg: (distances[pg['id']], SORT_KEYS['rating'](pg)))
+        assert response['total'] == len(expected)
+        assert [doc['id'] for doc in response['results']] == [pg['id'] for pg in expected[:30]]
+        assert [doc['distance_m'] for doc in response['results']] == \
+            [round(distances[pg['id']]) for pg in expected[:30]]
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+import singleflight
+
+CALLERS = 16
+
+
+def _wait_for_followers(group: singleflight.Group, key: str, followers: int, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with group._lock:
+            call = group._calls.get(key)
+            if call is not None and call.followers >= followers:
+                return
+        time.sleep(0.001)
+    raise AssertionError(f'{followers} followers did not join within {timeout}s')
+
+
+def _run_concurrently(group: singleflight.Group, key: str, fn) -> tuple:
+    """Start CALLERS threads calling group.do(key, fn); returns (threads, outcomes)."""
+    outcomes = [None] * CALLERS
+
+    def caller(i):
+        try:
+            outcomes[i] = ('ok', group.do(key, fn))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_calls_run_once_and_share_the_result():
+    group = singleflight.Group('test')
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(threading.get_ident())
+        release.wait(5)
+        return {'recommendations': [1, 2, 3]}
+
+    threads, outcomes = _run_concurrently(group, 'k', fn)
+    _wait_for_followers(group, 'k', CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert all(outcome == ('ok', {'recommendations': [1, 2, 3]}) for outcome in outcomes)
+    # Every caller gets its own copy
+    results = [value for _, value in outcomes]
+    assert len({id(value) for value in results}) == CALLERS
+    assert group.in_flight() == 0
+
+
+def test_concurrent_calls_all_see_the_exception():
+    group = singleflight.Group('test')
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    threads, outcomes = _run_concurrently(group, 'k', fn)
+    _wait_for_followers(group, 'k', CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert all(kind == 'error' and isinstance(error, ValueError) and str(error) == 'upstream failed'
+               for kind, error in outcomes)
+    assert group.in_flight() == 0
+
+
+def test_key_is_released_after_the_call():
+    group = singleflight.Group('test')
+    calls = []
+    assert group.do('k', lambda: calls.append(1) or 'first') == 'first'
+    assert group.in_flight() == 0
+    assert group.do('k', lambda: calls.append(1) or 'second') == 'second'
+
+    with pytest.raises(RuntimeError):
+        group.do('k', lambda: (_ for _ in ()).throw(RuntimeError('boom')))
+    assert group.in_flight() == 0
+    assert group.do('k', lambda: 'after error') == 'after error'
+    assert len(calls) == 2
+
+
+def test_different_keys_do_not_coalesce():
+    group = singleflight.Group('test')
+    release = threading.Event()
+    started = threading.Barrier(3, timeout=5)
+    results = {}
+
+    def caller(name):
+        def fn():
+            started.wait()
+            release.wait(5)
+            return name
+        results[name] = group.do(name, fn)
+
+    threads = [threading.Thread(target=caller, args=(name,)) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    # Both leaders are inside fn at once
+    started.wait()
+    assert group.in_flight() == 2
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == {'a': 'a', 'b': 'b'}
+
+
+def test_key_ignores_dict_order():
+    assert singleflight.key({'a': 1, 'b': 2}, 'x') == singleflight.key({'b': 2, 'a': 1}, 'x')
+    assert singleflight.key({'a': 1}) != singleflight.key({'a': 2})
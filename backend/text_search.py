@@ -0,0 +1,346 @@
+"""Typo-tolerant full-text search over listing name, area and description.
+
+An inverted index (term -> postings of (slot, weighted term frequency)) scored
+with BM25. Fields are weighted before counting - a word in the name counts
+three times, in the area twice, in the description once - and the listing's
+length is the weighted token count:
+
+    score = sum over query terms of  idf(term) * tf * (K1 + 1) / (tf + K1 * (1 - B + B * len / avg_len))
+
+Query terms are expanded before lookup so locality names don't have to be
+spelled exactly:
+
+    exact       the term itself (weight 1)
+    prefix      the last query term also matches longer terms it starts
+                ("koram" -> "koramangala"), for search-as-you-type
+    fuzzy       terms not in the vocabulary match vocabulary terms whose
+                trigram Dice similarity is >= SEARCH_FUZZY_THRESHOLD
+                ("koramangla", "whitefeild", "indranagar"), weighted by it
+
+Each query term contributes its best-scoring expansion per listing, and a
+listing matches if any term does (ranked OR, unlike plainto_tsquery's AND).
+
+Updates never rewrite postings: a changed listing gets a new slot and the
+old one is marked dead and skipped at query time. Dead postings still count
+towards document frequencies until the next full rebuild compacts them.
+
+Snapshots (`write_snapshot` / `read_snapshot`) store the postings as packed
+uint32/float32 arrays behind a JSON header. Reading one maps the file and
+only parses the header; posting lists are sliced out of the mapping when a
+query first touches them, so a new worker is searchable almost immediately.
+"""
+from array import array
+from bisect import bisect_left
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FIELD_WEIGHTS = (('name', 3.0), ('area', 2.0), ('description', 1.0))
+K1 = 1.2
+B = 0.75
+FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', 0.55))
+# Terms shorter than this are too ambiguous to correct
+FUZZY_MIN_LENGTH = 4
+FUZZY_EXPANSIONS = 5
+PREFIX_MIN_LENGTH = 3
+PREFIX_EXPANSIONS = 10
+PREFIX_WEIGHT = 0.8
+
+# Every listing is a PG, so "pg" carries no signal; the rest are English filler
+STOPWORDS = frozenset(
+    'a an and are as at be by for from in into is it near of on or pg pgs the to with'.split()
+)
+
+SNAPSHOT_MAGIC = b'SSTXT1\n'
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text) -> list:
+    """Lowercase, strip accents, split on non-alphanumerics, drop stopwords,
+    and fold simple plurals ("rooms" -> "room")."""
+    text = unicodedata.normalize('NFKD', str(text or '')).casefold()
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    tokens = []
+    for token in _WORD.findall(text):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def trigrams(term: str) -> set:
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _fields(pg: dict) -> dict:
+    address = pg.get('address') or {}
+    return {'name': pg.get('name'), 'area': address.get('area'), 'description': pg.get('description')}
+
+
+class TextIndex:
+    """BM25 index keyed by listing id. Not thread-safe; see search_index.ListingIndex."""
+
+    def __init__(self):
+        self.ids = []            # slot -> listing id, None once dead
+        self.lengths = []        # slot -> weighted token count
+        self.fingerprints = []   # slot -> hash of the indexed text (None when loaded from a snapshot)
+        self.slot_of = {}
+        self.live = 0
+        self.total_length = 0.0
+        self._delta = {}         # term -> {slot: weight}, for slots added in memory
+        self._base = {}          # term -> (offset, count) in the mapped snapshot
+        self._buffer = None
+        self._sorted_vocab = None
+        self._grams = None       # trigram -> set of terms, built on first fuzzy lookup
+        self._norms = None       # slot -> BM25 length normalization, rebuilt after changes
+
+    def __len__(self):
+        return self.live
+
+    def __contains__(self, term):
+        return term in self._delta or term in self._base
+
+    # ---- updates ------------------------------------------------------------
+
+    def add(self, pg: dict):
+        fields = _fields(pg)
+        fingerprint = hash(tuple(fields.values()))
+        slot = self.slot_of.get(pg['id'])
+        if slot is not None:
+            # Refreshes re-deliver rows whose text didn't change (rent edits, re-polls)
+            if self.fingerprints[slot] == fingerprint:
+                return
+            self.remove(pg['id'])
+        weights = {}
+        for field, factor in FIELD_WEIGHTS:
+            for token in tokenize(fields[field]):
+                weights[token] = weights.get(token, 0.0) + factor
+        slot = len(self.ids)
+        self.ids.append(pg['id'])
+        length = sum(weights.values())
+        self.lengths.append(length)
+        self.fingerprints.append(fingerprint)
+        self.slot_of[pg['id']] = slot
+        self.live += 1
+        self.total_length += length
+        self._norms = None
+        for term, weight in weights.items():
+            postings = self._delta.get(term)
+            if postings is None:
+                postings = self._delta[term] = {}
+                if term not in self._base:
+                    self._new_term(term)
+            postings[slot] = weight
+
+    def remove(self, pg_id: str):
+        slot = self.slot_of.pop(pg_id, None)
+        if slot is None:
+            return
+        self.ids[slot] = None
+        self.live -= 1
+        self.total_length -= self.lengths[slot]
+        self._norms = None
+
+    def _new_term(self, term: str):
+        self._sorted_vocab = None
+        if self._grams is not None:
+            for gram in trigrams(term):
+                self._grams.setdefault(gram, set()).add(term)
+
+    # ---- lookup ---------------------------------------------------------------
+
+    def _postings(self, term: str):
+        """(slot, weight) pairs for `term`, dead slots included."""
+        entry = self._base.get(term)
+        if entry is not None:
+            offset, count = entry
+            slots = self._buffer[offset:offset + 4 * count].cast('I')
+            weights = self._buffer[offset + 4 * count:offset + 8 * count].cast('f')
+            yield from zip(slots, weights)
+        delta = self._delta.get(term)
+        if delta:
+            yield from delta.items()
+
+    def _df(self, term: str) -> int:
+        entry = self._base.get(term)
+        return (entry[1] if entry else 0) + len(self._delta.get(term, ()))
+
+    def _vocab(self) -> list:
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self._delta.keys() | self._base.keys())
+        return self._sorted_vocab
+
+    def _prefix_matches(self, prefix: str) -> list:
+        vocab = self._vocab()
+        matches = []
+        i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            if vocab[i] != prefix:
+                matches.append(vocab[i])
+            i += 1
+        # Prefer the common completions
+        matches.sort(key=self._df, reverse=True)
+        return matches[:PREFIX_EXPANSIONS]
+
+    def _fuzzy_matches(self, term: str) -> dict:
+        if self._grams is None:
+            self._grams = {}
+            for known in self._vocab():
+                for gram in trigrams(known):
+                    self._grams.setdefault(gram, set()).add(known)
+        grams = trigrams(term)
+        shared = {}
+        for gram in grams:
+            for known in self._grams.get(gram, ()):
+                shared[known] = shared.get(known, 0) + 1
+        similar = {}
+        for known, count in shared.items():
+            # Dice coefficient; len(trigrams(known)) without building the set
+            dice = 2 * count / (len(grams) + len(known) + 1)
+            if dice >= FUZZY_THRESHOLD:
+                similar[known] = dice
+        best = sorted(similar.items(), key=lambda item: -item[1])[:FUZZY_EXPANSIONS]
+        return dict(best)
+
+    def expand(self, term: str, prefix: bool = False) -> dict:
+        """Vocabulary terms to look up for a query term, with their weights."""
+        variants = {}
+        if term in self:
+            variants[term] = 1.0
+        elif len(term) >= FUZZY_MIN_LENGTH:
+            variants.update(self._fuzzy_matches(term))
+        if prefix and len(term) >= PREFIX_MIN_LENGTH:
+            for completion in self._prefix_matches(term):
+                variants.setdefault(completion, PREFIX_WEIGHT)
+        return variants
+
+    def _length_norms(self) -> list:
+        """K1 * (1 - B + B * len / avg_len) per slot; None for dead slots."""
+        if self._norms is None:
+            avg_length = self.total_length / self.live or 1.0
+            self._norms = [K1 * (1 - B + B * length / avg_length) if pg_id is not None else None
+                           for pg_id, length in zip(self.ids, self.lengths)]
+        return self._norms
+
+    def search(self, query: str) -> dict:
+        """Listing id -> BM25 score for every live listing matching `query`."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.live:
+            return {}
+        n = self.live
+        norms = self._length_norms()
+        scores = {}
+        for i, term in enumerate(terms):
+            variants = self.expand(term, prefix=i == len(terms) - 1)
+            # With one variant there is no best-of to take: add straight into the scores
+            best = scores if len(variants) == 1 else {}
+            previous = dict(scores) if best is scores else None
+            for variant, factor in variants.items():
+                # Dead postings inflate df; more than n would make idf negative
+                df = min(self._df(variant), n)
+                weight = factor * math.log(1 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1)
+                if weight <= 0:
+                    continue
+                for slot, tf in self._postings(variant):
+                    norm = norms[slot]
+                    if norm is None:
+                        continue
+                    score = weight * tf / (tf + norm)
+                    if previous is not None:
+                        best[slot] = previous.get(slot, 0.0) + score
+                    elif score > best.get(slot, 0.0):
+                        best[slot] = score
+            if best is not scores:
+                for slot, score in best.items():
+                    scores[slot] = scores.get(slot, 0.0) + score
+        ids = self.ids
+        return {ids[slot]: score for slot, score in scores.items()}
+
+
+# ---- snapshots ----------------------------------------------------------------
+#
+#   SNAPSHOT_MAGIC | uint64 header length | JSON header | postings
+#
+# The header holds the live listing ids and lengths (compacted to slots
+# 0..n-1), a term -> [offset, count] table and whatever `extra` the caller
+# stores. Each term's postings are `count` uint32 slots followed by `count`
+# float32 weights, in native byte order (recorded in the header).
+
+def write_snapshot(path: str, index: TextIndex, extra: dict = None):
+    """Write `index` (live listings only) to `path` atomically."""
+    remap = {}
+    ids = []
+    lengths = []
+    for slot, pg_id in enumerate(index.ids):
+        if pg_id is not None:
+            remap[slot] = len(ids)
+            ids.append(pg_id)
+            lengths.append(index.lengths[slot])
+
+    terms = {}
+    blobs = []
+    offset = 0
+    for term in index._vocab():
+        postings = [(remap[slot], weight) for slot, weight in index._postings(term) if slot in remap]
+        if not postings:
+            continue
+        postings.sort()
+        blob = array('I', (slot for slot, _ in postings)).tobytes() + array('f', (w for _, w in postings)).tobytes()
+        terms[term] = [offset, len(postings)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'ids': ids,
+        'lengths': lengths,
+        'terms': terms,
+        'extra': extra or {},
+    }, separators=(',', ':')).encode()
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str):
+    """Map a snapshot written by `write_snapshot`. Returns (TextIndex, extra)."""
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f'{path} is not a search snapshot')
+    start = len(SNAPSHOT_MAGIC) + 8
+    (header_length,) = struct.unpack('<Q', mapped[len(SNAPSHOT_MAGIC):start])
+    header = json.loads(mapped[start:start + header_length])
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError(f'{path} was written on a {header["byteorder"]}-endian machine')
+
+    index = TextIndex()
+    index.ids = header['ids']
+    index.lengths = header['lengths']
+    index.fingerprints = [None] * len(index.ids)
+    index.slot_of = {pg_id: slot for slot, pg_id in enumerate(index.ids)}
+    index.live = len(index.ids)
+    index.total_length = float(sum(index.lengths))
+    index._base = {term: tuple(entry) for term, entry in header['terms'].items()}
+    # Offsets in the header are relative to the start of the postings
+    index._buffer = memoryview(mapped)[start + header_length:]
+    return index, header['extra']
@@ -0,0 +1,280 @@
+"""Lightweight request tracing.
+
+Every Flask request gets a request id (taken from `X-Request-ID` or generated)
+which is echoed back in the response. A sampled subset of requests also
+records a trace: a root span for the route plus child spans for each
+`ai.generate` and outbound HTTP call, so a slow request shows the waterfall
+of where its time went.
+
+Finished traces are handed to a background thread and written either as JSON
+lines to `TRACE_EXPORT_FILE` or as OTLP/HTTP JSON to `TRACE_OTLP_ENDPOINT`
+(e.g. http://localhost:4318/v1/traces). Unsampled requests only pay for a
+contextvar lookup per span.
+"""
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'smartstay-backend')
+
+_current_trace = contextvars.ContextVar('smartstay_trace', default=None)
+_current_span = contextvars.ContextVar('smartstay_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace, name, parent_id=None, kind='internal', attributes=None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+        self.trace.spans.append(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace.trace_id,
+            'request_id': self.trace.request_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class Trace:
+    __slots__ = ('trace_id', 'request_id', 'spans')
+
+    def __init__(self, request_id):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.spans = []
+
+
+class _NullSpan:
+    """Returned for unsampled requests so callers never need to check."""
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def span(name: str, kind: str = 'internal', **attributes):
+    """Record a child span of the current request (no-op when not sampled)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(trace, name, parent.span_id if parent else None, kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.finish(error=e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def traceparent() -> str:
+    """W3C `traceparent` header value for the current span, or None."""
+    current = _current_span.get()
+    if current is None:
+        return None
+    return f'00-{current.trace.trace_id}-{current.span_id}-01'
+
+
+def current_request_id() -> str:
+    try:
+        from flask import g
+        return g.get('request_id')
+    except RuntimeError:
+        return None
+
+
+# ============================================
+# EXPORTERS
+# ============================================
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_payload(spans: list) -> dict:
+    kinds = {'internal': 1, 'server': 2, 'client': 3}
+    otlp_spans = []
+    for s in spans:
+        attributes = {**s.attributes, 'request.id': s.trace.request_id}
+        otlp_spans.append({
+            'traceId': s.trace.trace_id,
+            'spanId': s.span_id,
+            'parentSpanId': s.parent_id or '',
+            'name': s.name,
+            'kind': kinds.get(s.kind, 1),
+            'startTimeUnixNano': str(s.start_ns),
+            'endTimeUnixNano': str(s.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items() if v is not None],
+            'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+        })
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'smartstay.tracing'}, 'spans': otlp_spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    def __init__(self, file_path: str = None, otlp_endpoint: str = None, max_queue: int = 1000):
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.file_path or self.otlp_endpoint)
+
+    def submit(self, trace: Trace):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            # Never let tracing back-pressure requests
+            pass
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _drain(self, first=None) -> list:
+        traces = [first] if first is not None else []
+        while len(traces) < 100:
+            try:
+                traces.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return traces
+
+    def _run(self):
+        while True:
+            self.export(self._drain(self._queue.get()))
+
+    def flush(self):
+        self.export(self._drain())
+
+    def export(self, traces: list):
+        spans = [s for trace in traces for s in trace.spans]
+        if not spans:
+            return
+        try:
+            if self.file_path:
+                with open(self.file_path, 'a', encoding='utf-8') as f:
+                    for s in spans:
+                        f.write(json.dumps(s.to_dict()) + '\n')
+            if self.otlp_endpoint:
+                # Plain requests (not upstream) so exports aren't traced or metered
+                import requests
+                requests.post(self.otlp_endpoint, json=_otlp_payload(spans), timeout=5)
+        except Exception as e:
+            print(f"Error exporting traces: {str(e)}")
+
+
+exporter = TraceExporter(
+    file_path=os.getenv('TRACE_EXPORT_FILE'),
+    otlp_endpoint=os.getenv('TRACE_OTLP_ENDPOINT'),
+)
+sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', 0.1))
+
+
+# ============================================
+# FLASK INTEGRATION
+# ============================================
+
+def init_app(app):
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        if not exporter.enabled or random.random() >= sample_rate:
+            return
+        trace = Trace(g.request_id)
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        root = Span(trace, f'{request.method} {route}', kind='server', attributes={
+            'http.method': request.method,
+            'http.route': route,
+        })
+        g._trace_tokens = (_current_trace.set(trace), _current_span.set(root))
+        g._trace_root = root
+
+    @app.after_request
+    def _tag_response(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        root = g.get('_trace_root')
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_trace(error):
+        root = g.pop('_trace_root', None)
+        if root is None:
+            return
+        trace_token, span_token = g.pop('_trace_tokens')
+        root.finish(error=error)
+        try:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+        except ValueError:
+            # Teardown ran in a different context (e.g. streamed responses)
+            pass
+        exporter.submit(root.trace)
@@ -0,0 +1,96 @@
+"""Shared HTTP client for outbound calls (Supabase, OpenRouteService).
+
+All outbound requests go through one pooled `requests.Session` so connections
+are reused across requests, and every call is timed and labelled by upstream
+service and target (Supabase table, storage bucket, ORS endpoint) in metrics
+and recorded as a child span of the current request trace. Calls to
+OpenRouteService also pass through its rate limiter and circuit breaker
+(see resilience.py) and raise `resilience.UpstreamUnavailable` when rejected.
+Use it like the `requests` module: `upstream.get(url, headers=..., timeout=...)`.
+"""
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import resilience
+import tracing
+
+_STORAGE_ACTIONS = {'object', 'upload', 'sign', 'public', 'authenticated', 'resumable', 'info'}
+
+
+def classify(url: str) -> tuple:
+    """Map a URL to a low-cardinality (service, target) pair for metrics."""
+    parts = urlsplit(url)
+    path = parts.path
+    if '/rest/v1/' in path:
+        rest = path.split('/rest/v1/', 1)[1]
+        if rest.startswith('rpc/'):
+            return 'supabase', 'rpc/' + rest[4:].split('/', 1)[0]
+        return 'supabase', rest.split('/', 1)[0]
+    if '/storage/v1/' in path:
+        # Keep the action words and the bucket, drop the object path:
+        # object/upload/sign/<bucket>/<path...> -> object/upload/sign/<bucket>
+        target = []
+        for segment in path.split('/storage/v1/', 1)[1].split('/'):
+            if not segment:
+                continue
+            target.append(segment)
+            if segment not in _STORAGE_ACTIONS:
+                break
+        return 'supabase_storage', '/'.join(target)
+    if '/geocode/' in path:
+        return 'openrouteservice', 'geocode'
+    if '/v2/directions/' in path:
+        return 'openrouteservice', 'directions'
+    if 'openrouteservice' in parts.netloc:
+        return 'openrouteservice', path.strip('/').split('/', 1)[0]
+    return 'http', parts.netloc
+
+
+class InstrumentedSession(requests.Session):
+    def request(self, method, url, *args, **kwargs):
+        service, target = classify(url)
+        with tracing.span(f'{method} {service}/{target}', kind='client',
+                          **{'http.method': method, 'peer.service': service, 'upstream.target': target}) as span:
+            parent = tracing.traceparent()
+            if parent:
+                kwargs['headers'] = {**(kwargs.get('headers') or {}), 'traceparent': parent}
+            guard = resilience.guard_for(service)
+            if guard:
+                guard.before_call()
+            try:
+                with metrics.upstream_call(service, target):
+                    response = super().request(method, url, *args, **kwargs)
+            except Exception as e:
+                if guard:
+                    guard.record(error=e)
+                raise
+            if guard:
+                guard.record(response.status_code, retry_after=resilience.retry_after_from(response))
+            span.set_attribute('http.status_code', response.status_code)
+        metrics.record_upstream_status(service, target, response.status_code)
+        return response
+
+
+session = InstrumentedSession()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=64)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+
+
+def get(url, **kwargs):
+    return session.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return session.post(url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return session.patch(url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return session.delete(url, **kwargs)
@@ -0,0 +1,9 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`python app.py` still starts the Flask development server for local work.
+"""
+from app import app, shutdown_background_work
+
+__all__ = ['app', 'shutdown_background_work']
@@ -3,8 +3,9 @@ import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
 import { ScrollArea } from "@/components/ui/scroll-area";
-import { MessageCircle, X, Send, Loader2 } from "lucide-react";
+import { MessageCircle, X, Send, Loader2, ThumbsUp, ThumbsDown } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
+import { supabase } from "@/lib/supabase";
 import axios from "axios";
 
 const API_URL = import.meta.env.VITE_API_URL || "http://localhost:5000";
@@ -13,6 +14,8 @@ interface ChatMessage {
   id: number;
   role: "user" | "bot";
   content: string;
+  feedbackToken?: string;
+  rated?: boolean;
 }
 
 export const ChatbotWidget = () => {
@@ -21,6 +24,8 @@ export const ChatbotWidget = () => {
     { id: 1, role: "bot", content: "Hi! I'm your SmartStay assistant. How can I help you today?" },
   ]);
   const [input, setInput] = useState("");
+  // Conversation memory lives on the server; only new messages are sent once we have a session
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
   const { toast } = useToast();
 
@@ -41,7 +46,9 @@ export const ChatbotWidget = () => {
     try {
       const response = await axios.post(`${API_URL}/api/ai/chatbot`, {
         message: textToSend,
-        chat_history: messages.map(m => ({ role: m.role, content: m.content })),
+        ...(sessionId
+          ? { session_id: sessionId }
+          : { chat_history: messages.map(m => ({ role: m.role, content: m.content })) }),
         context: {
           current_page: window.location.pathname,
           user_role: "user"
@@ -51,10 +58,14 @@ export const ChatbotWidget = () => {
       const botMessage: ChatMessage = {
         id: messages.length + 2,
         role: "bot",
-        content: response.data.response || "I'm here to help! You can ask me about PG listings, features, or anything else."
+        content: response.data.response || "I'm here to help! You can ask me about PG listings, features, or anything else.",
+        feedbackToken: response.data.feedback_token
       };
 
       setMessages(prev => [...prev, botMessage]);
+      if (response.data.session_id) {
+        setSessionId(response.data.session_id);
+      }
 
       // Handle suggested actions if any
       if (response.data.suggested_actions && response.data.suggested_actions.length > 0) {
@@ -81,6 +92,26 @@ export const ChatbotWidget = () => {
     }
   };
 
+  const handleFeedback = async (message: ChatMessage, helpful: boolean) => {
+    // Votes are counted once per signed-in user
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session) {
+      toast({ title: "Sign in to rate answers", variant: "default" });
+      return;
+    }
+    setMessages(prev => prev.map(m => (m.id === message.id ? { ...m, rated: true } : m)));
+    try {
+      await axios.post(`${API_URL}/api/ai/chatbot/feedback`, {
+        feedback_token: message.feedbackToken,
+        helpful
+      }, {
+        headers: { Authorization: `Bearer ${session.access_token}` }
+      });
+    } catch (error) {
+      console.error("Chatbot feedback error:", error);
+    }
+  };
+
   const quickReplies = [
     "How do I search for PGs?",
     "What are verified listings?",
@@ -133,6 +164,23 @@ export const ChatbotWidget = () => {
                       }`}
                     >
                       <p className="text-sm whitespace-pre-wrap break-words">{message.content}</p>
+                      {message.feedbackToken && (
+                        <div className="flex items-center gap-1 mt-1 text-xs text-muted-foreground">
+                          {message.rated ? (
+                            <span>Thanks for the feedback!</span>
+                          ) : (
+                            <>
+                              <span>Was this helpful?</span>
+                              <Button variant="ghost" size="icon" className="h-6 w-6" onClick={() => handleFeedback(message, true)}>
+                                <ThumbsUp className="h-3 w-3" />
+                              </Button>
+                              <Button variant="ghost" size="icon" className="h-6 w-6" onClick={() => handleFeedback(message, false)}>
+                                <ThumbsDown className="h-3 w-3" />
+                              </Button>
+                            </>
+                          )}
+                        </div>
+                      )}
                     </div>
                   </div>
                 ))}
@@ -8,7 +8,7 @@ import { useEffect, useState } from "react";
 import { storageService } from "@/lib/supabase";
 
 export const RecentlyViewedList = () => {
-  const { getRecentlyViewed, clearRecentlyViewed } = useRecentlyViewed();
+  const { getRecentlyViewed, fetchRecentlyViewed, clearRecentlyViewed } = useRecentlyViewed();
   const [items, setItems] = useState<RecentlyViewedPG[]>([]);
 
   useEffect(() => {
@@ -19,6 +19,11 @@ export const RecentlyViewedList = () => {
 
     loadRecent();
 
+    // Prefer the account-wide list when logged in
+    fetchRecentlyViewed().then((remote) => {
+      if (remote) setItems(remote);
+    });
+
     // Listen for storage changes
     window.addEventListener('storage', loadRecent);
     return () => window.removeEventListener('storage', loadRecent);
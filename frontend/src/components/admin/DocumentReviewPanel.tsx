@@ -18,6 +18,8 @@ interface VerificationDocument {
   document_type: string;
   file_url: string;
   file_name: string;
+  thumbnail_url?: string;
+  preview_url?: string;
   status: 'pending' | 'approved' | 'rejected';
   created_at: string;
 }
@@ -166,6 +168,16 @@ export function DocumentReviewPanel({ adminId }: { adminId: string }) {
                           </Badge>
                         </div>
 
+                        {doc.preview_url && (
+                          <img
+                            src={doc.preview_url}
+                            alt={doc.file_name}
+                            loading="lazy"
+                            className="w-full max-h-80 object-contain rounded border"
+                            onError={(e) => { e.currentTarget.style.display = 'none'; }}
+                          />
+                        )}
+
                         <div>
                           <p className="text-sm font-medium mb-1">File:</p>
                           <Button
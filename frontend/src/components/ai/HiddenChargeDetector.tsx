@@ -7,6 +7,7 @@ const BACKEND_URL = import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000';
 
 interface HiddenChargeDetectorProps {
   pgData: {
+    pg_id?: string;
     description?: string;
     rent?: number;
     deposit?: number;
@@ -9,6 +9,7 @@ const BACKEND_URL = import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000';
 interface SentimentSummaryProps {
   reviews: any[];
   pgName?: string;
+  pgId?: string;
   className?: string;
 }
 
@@ -27,6 +28,7 @@ interface SentimentData {
 export const SentimentSummary = ({
   reviews = [],
   pgName = "this property",
+  pgId,
   className,
 }: SentimentSummaryProps) => {
   const [loading, setLoading] = useState(true);
@@ -45,7 +47,7 @@ export const SentimentSummary = ({
         const response = await fetch(`${BACKEND_URL}/api/ai/sentiment-analysis`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ reviews, pg_name: pgName }),
+          body: JSON.stringify({ reviews, pg_name: pgName, pg_id: pgId }),
         });
 
         if (!response.ok) throw new Error('Failed to analyze sentiment');
@@ -61,7 +63,7 @@ export const SentimentSummary = ({
     };
 
     fetchSentiment();
-  }, [reviews, pgName]);
+  }, [reviews, pgName, pgId]);
 
   if (loading) {
     return (
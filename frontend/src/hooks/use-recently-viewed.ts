@@ -66,6 +66,34 @@ export const useRecentlyViewed = () => {
     }
   };
 
+  // Server-side list for logged-in users (served from the backend cache)
+  const fetchRecentlyViewed = async (): Promise<RecentlyViewedPG[] | null> => {
+    try {
+      const { data: { session } } = await supabase.auth.getSession();
+      if (!session) return null;
+
+      // The backend only returns the list of the user the access token belongs to
+      const response = await fetch(
+        `${BACKEND_URL}/api/recently-viewed?user_id=${session.user.id}&limit=${MAX_RECENT_ITEMS}`,
+        { headers: { Authorization: `Bearer ${session.access_token}` } }
+      );
+      if (!response.ok) return null;
+
+      const { items } = await response.json();
+      return items.map((item: any) => ({
+        id: item.id,
+        name: item.name,
+        city: item.city || item.area || '',
+        rent: item.rent,
+        image: item.image || undefined,
+        viewedAt: new Date(item.viewed_at).getTime(),
+      }));
+    } catch (error) {
+      console.error('Error fetching recently viewed:', error);
+      return null;
+    }
+  };
+
   const clearRecentlyViewed = () => {
     try {
       localStorage.removeItem(STORAGE_KEY);
@@ -77,6 +105,7 @@ export const useRecentlyViewed = () => {
   return {
     addToRecentlyViewed,
     getRecentlyViewed,
+    fetchRecentlyViewed,
     clearRecentlyViewed
   };
 };
@@ -933,6 +933,7 @@ const PGDetail = () => {
                     <h3 className="font-semibold text-lg mb-4">Hidden Charges Analysis</h3>
                     <HiddenChargeDetector 
                       pgData={{
+                        pg_id: id,
                         description: pgData.description || '',
                         rent: pgData.rent || 0,
                         deposit: pgData.deposit || 0,
@@ -1055,7 +1056,7 @@ const PGDetail = () => {
                 </Dialog>
 
                 {reviews.length > 0 && (
-                  <SentimentSummary reviews={reviews} pgName={pgData?.name} />
+                  <SentimentSummary reviews={reviews} pgName={pgData?.name} pgId={id} />
                 )}
 
                 {reviews.length > 0 ? (